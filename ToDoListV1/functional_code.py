@@ -2,7 +2,9 @@
 Task Management System
 A simple command-line program to manage tasks (to-do items)
 Features: Add, delete, edit, complete, search, and clear tasks
+Tasks are kept between sessions, saved in the background (see persistence.py)
 """
+from persistence import apply_operation, close_session, load_session
 
 # List to store active/incomplete tasks
 tasks = []
@@ -22,7 +24,7 @@ def add_new_task_to_list():
     """
     print('\n ======== Add a new task ======== \n'.title())
     add_task_input = input("Add new task: ")
-    tasks.append(add_task_input)  # Add task to the list
+    apply_operation('add', add_task_input)  # Add task to the list
 
     return "Your task has been added successfully."
 
@@ -58,7 +60,7 @@ def delete_task_from_tasks_list():
             return "\nError: The number is not in the list."
 
         # Delete the task (adjusting for 0-based index)
-        del tasks[task_index-1]
+        apply_operation('delete', task_index-1)
 
         return f"\nTask number {delete_task_input} has been deleted"
     
@@ -112,8 +114,7 @@ def mark_task_as_complete_task():
             return "\nError: The number is not in the list."
         
         # Move task to completed list and remove from active
-        complete_tasks.append(tasks[task_index-1])
-        del tasks[task_index-1]
+        apply_operation('complete', task_index-1)
 
         return "\nTask marked as completed."
 
@@ -152,7 +153,7 @@ def edit_task_in_tasks_list():
 
         # Get and update task text
         new_task_input = input('\nEdit the task: ')
-        tasks[task_index-1] = new_task_input
+        apply_operation('edit', task_index-1, new_task_input)
         
         return "\nTask updated successfully."
     
@@ -204,7 +205,7 @@ def clear_all_tasks_in_tasks_list():
         # Confirm before clearing
         user_input = input("Are you sure (y/n)? ").lower()
         if user_input in ['y', 'yes']:
-            tasks.clear()
+            apply_operation('clear')
             return "\nAll tasks cleared."
         
         return "\nOperation cancelled."
@@ -231,6 +232,9 @@ def display_complete_task_list():
 
 # Main program execution
 if __name__ == "__main__":
+    # Restore the last session; from here on changes are saved in the background
+    load_session(tasks, complete_tasks)
+
     while True:
         # Display menu options
         print("\nTask Manager Menu")
@@ -254,6 +258,7 @@ if __name__ == "__main__":
 
         else:
             if user_input.lower() in ['q', 'quit', 'exit']:
+                close_session()
                 break
             print('\nInvalid input. Please enter a number.')
 
@@ -276,6 +281,7 @@ if __name__ == "__main__":
             case '8':
                 print(display_complete_task_list())
             case '9':
+                close_session()  # Final snapshot
                 print("Goodbye!")
                 break  # Exit program
         
\ No newline at end of file
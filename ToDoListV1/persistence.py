@@ -0,0 +1,206 @@
+"""
+Saving the task lists between sessions, without slowing them down.
+
+The lists stay in memory and every change goes through apply_operation(),
+which changes the lists and queues the operation; nothing is written there.
+A background thread appends the queued operations to the operation log
+every FLUSH_INTERVAL seconds, and writes a snapshot of both lists (then
+empties the log) every SNAPSHOT_INTERVAL seconds or once the log holds
+SNAPSHOT_OPERATIONS operations. close_session() writes a last snapshot on
+exit.
+
+Both files are marshal, Python's fast binary format: loading a session is
+one read of the snapshot plus the few operations logged after it.
+"""
+import atexit
+import marshal
+import os
+import threading
+import time
+
+SNAPSHOT_FILE = 'tasks.snapshot'
+LOG_FILE = 'tasks.oplog'
+SNAPSHOT_VERSION = 1
+
+# Seconds between log writes and between snapshots
+FLUSH_INTERVAL = 1.0
+SNAPSHOT_INTERVAL = 60.0
+# Logged operations that trigger a snapshot before the interval is up
+SNAPSHOT_OPERATIONS = 10000
+
+# The lists of the open session: (tasks, complete_tasks), functional_code's own without one
+_lists = None
+_directory = '.'
+# Guards the lists against a snapshot copying them halfway through a change
+_lock = threading.Lock()
+# Number of the last operation applied, and of the last one in the snapshot file
+_sequence = 0
+_snapshot_sequence = 0
+# (sequence, operation) applied but not in the log yet
+_pending = []
+# Operations in the log file
+_logged = 0
+_last_snapshot = 0.0
+# Snapshot with the next write, e.g. when the log must not be appended to
+_snapshot_due = False
+_stop = threading.Event()
+_writer = None
+
+
+def _apply(operation):
+    # The one place the lists change, for new operations and replayed ones alike
+    tasks, complete_tasks = _lists or _default_lists()
+    match operation:
+        case ('add', text):
+            tasks.append(text)
+        case ('delete', index):
+            del tasks[index]
+        case ('complete', index):
+            complete_tasks.append(tasks.pop(index))
+        case ('edit', index, text):
+            tasks[index] = text
+        case ('clear',):
+            tasks.clear()
+
+
+def _default_lists():
+    # Without load_session() the changes go to functional_code's lists and stay in memory
+    global _lists
+    import functional_code
+    _lists = (functional_code.tasks, functional_code.complete_tasks)
+    return _lists
+
+
+def apply_operation(*operation):
+    """
+    Apply a change to the lists and queue it for the log, e.g.
+    apply_operation('add', 'Buy milk') or apply_operation('delete', 0).
+    Before load_session() the change is made to functional_code's lists only.
+    """
+    global _sequence
+    with _lock:
+        _apply(operation)
+        if _writer is None:
+            return  # No session to save it in
+        _sequence += 1
+        _pending.append((_sequence, operation))
+
+
+def load_session(tasks, complete_tasks, directory='.'):
+    """
+    Fill `tasks` and `complete_tasks` from the last session and start saving
+    their changes in the background. Returns the number of operations
+    replayed from the log.
+    """
+    global _lists, _directory, _sequence, _snapshot_sequence, _logged, _last_snapshot, _snapshot_due, _writer
+    _lists = (tasks, complete_tasks)
+    _directory = directory
+    _sequence = _snapshot_sequence = _logged = 0
+    _pending.clear()
+    _stop.clear()  # Set by the close_session() of an earlier session
+
+    snapshot = _read_snapshot()
+    if snapshot is not None:
+        tasks[:] = snapshot['tasks']
+        complete_tasks[:] = snapshot['complete_tasks']
+        _sequence = _snapshot_sequence = snapshot['sequence']
+
+    # A crash between writing a snapshot and emptying the log leaves operations it already holds
+    replayed = 0
+    for sequence, operation in _read_log():
+        _logged += 1
+        if sequence > _sequence:
+            _apply(operation)
+            _sequence = sequence
+            replayed += 1
+
+    # Records appended after one cut short by a crash would never be read: start a clean log
+    log_path = os.path.join(directory, LOG_FILE)
+    _snapshot_due = os.path.exists(log_path) and os.path.getsize(log_path) > 0
+    _last_snapshot = time.monotonic()
+    _writer = threading.Thread(target=_write_in_background, daemon=True)
+    _writer.start()
+    atexit.register(close_session)
+    return replayed
+
+
+def close_session():
+    """Stop the background writer and write a last snapshot."""
+    global _writer
+    if _writer is None:
+        return
+    _stop.set()
+    _writer.join()
+    _writer = None
+    if _sequence != _snapshot_sequence or _logged or _snapshot_due:
+        _write_snapshot()
+
+
+def _write_snapshot():
+    """Write both lists to the snapshot file and empty the log."""
+    global _snapshot_sequence, _logged, _last_snapshot, _snapshot_due
+    with _lock:
+        # Copies taken under the lock, written outside it; the queued operations are in them
+        data = {'version': SNAPSHOT_VERSION, 'sequence': _sequence,
+                'tasks': list(_lists[0]), 'complete_tasks': list(_lists[1])}
+        _pending.clear()
+
+    path = os.path.join(_directory, SNAPSHOT_FILE)
+    with open(path + '.tmp', 'wb') as file:
+        marshal.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + '.tmp', path)
+
+    # Only emptied once the snapshot holding everything in it is in place
+    open(os.path.join(_directory, LOG_FILE), 'wb').close()
+    _snapshot_sequence, _logged, _last_snapshot, _snapshot_due = data['sequence'], 0, time.monotonic(), False
+
+
+def _write_log():
+    # Append the queued operations to the log
+    global _logged
+    with _lock:
+        records = _pending[:]
+        _pending.clear()
+    if not records:
+        return
+    with open(os.path.join(_directory, LOG_FILE), 'ab') as file:
+        for record in records:
+            marshal.dump(record, file)
+        file.flush()
+        os.fsync(file.fileno())
+    _logged += len(records)
+
+
+def _write_in_background():
+    # The writer thread: the log every FLUSH_INTERVAL seconds, a snapshot now and then
+    while not _stop.wait(FLUSH_INTERVAL):
+        interval_over = time.monotonic() - _last_snapshot >= SNAPSHOT_INTERVAL
+        if (_snapshot_due or (interval_over and _sequence != _snapshot_sequence)
+                or _logged + len(_pending) >= SNAPSHOT_OPERATIONS):
+            _write_snapshot()
+        else:
+            _write_log()
+
+
+def _read_snapshot():
+    path = os.path.join(_directory, SNAPSHOT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        data = marshal.loads(file.read())  # One read: marshal.load() on the file reads it piece by piece
+    return data if data.get('version') == SNAPSHOT_VERSION else None
+
+
+def _read_log():
+    path = os.path.join(_directory, LOG_FILE)
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as file:
+        while True:
+            try:
+                record = marshal.load(file)
+            except (EOFError, ValueError, TypeError):
+                return  # End of the log, or a record cut short by a crash
+            yield record
@@ -0,0 +1,88 @@
+import os
+import sys
+import shutil
+import statistics
+import subprocess
+import time
+
+# Build profiles: (spec file, path of the built executable relative to the dist dir)
+PROFILES = {
+    'onefile (main.spec)': ('main.spec', 'main'),
+    'onedir (main_fast.spec)': ('main_fast.spec', os.path.join('main_fast', 'main')),
+}
+
+BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_build')
+
+
+def build_profile(spec_file, name):
+    """
+    Build one PyInstaller profile into its own dist/work directories.
+
+    Args:
+        spec_file (str): Spec file to build
+        name (str): Directory name used to keep the profiles apart
+
+    Returns:
+        str: Path of the dist directory holding the build
+    """
+    dist_path = os.path.join(BUILD_DIR, name, 'dist')
+    work_path = os.path.join(BUILD_DIR, name, 'build')
+
+    subprocess.run(
+        [sys.executable, '-m', 'PyInstaller', '--noconfirm', '--clean',
+         '--distpath', dist_path, '--workpath', work_path, spec_file],
+        check=True,
+    )
+    return dist_path
+
+
+def time_startup(executable, runs):
+    """
+    Launch the executable `runs` times and measure time to quit from the menu.
+
+    The app is fed 'q' on stdin so each run covers process start, bundle
+    unpacking (one-file only), imports and the first menu draw.
+
+    Returns:
+        list: Wall-clock times in milliseconds
+    """
+    if os.name == 'nt':
+        executable += '.exe'
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([executable], input='q\n', capture_output=True, text=True, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    """
+    Build both profiles and print a cold/warm startup comparison.
+
+    Usage:
+        python bench_build.py [runs]
+    """
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    # Run from the spec directory so relative paths inside the specs resolve
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if shutil.which('upx') is None:
+        print('note: upx not found, the one-file build will not be compressed')
+
+    results = {}
+    for label, (spec_file, executable) in PROFILES.items():
+        dist_path = build_profile(spec_file, os.path.splitext(spec_file)[0])
+        timings = time_startup(os.path.join(dist_path, executable), runs + 1)
+        results[label] = (timings[0], timings[1:])
+
+    print(f'\nStartup time over {runs} runs (first run reported separately as cold start)\n')
+    print(f"{'profile'.ljust(26)}{'cold'.rjust(10)}{'median'.rjust(10)}{'min'.rjust(10)}")
+    for label, (cold, warm) in results.items():
+        print(f'{label.ljust(26)}{cold:>8.1f}ms{statistics.median(warm):>8.1f}ms{min(warm):>8.1f}ms')
+
+
+if __name__ == "__main__":
+    main()
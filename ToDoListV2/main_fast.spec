@@ -0,0 +1,57 @@
+# -*- mode: python ; coding: utf-8 -*-
+#
+# Fast-start build profile: one-dir bundle, -OO bytecode, unused stdlib excluded.
+# Build with `pyinstaller main_fast.spec`; the app lands in dist/main_fast/.
+# Compare against the one-file profile (main.spec) with `python bench_build.py`.
+
+# Standard library packages the app never imports
+excludes = [
+    'asyncio', 'bz2', 'concurrent', 'ctypes', 'curses', 'dbm', 'distutils',
+    'doctest', 'email', 'ftplib', 'html', 'http', 'idlelib', 'lib2to3',
+    'lzma', 'multiprocessing', 'pdb', 'pydoc', 'pydoc_data', 'sqlite3',
+    'ssl', 'tkinter', 'unittest', 'urllib', 'xml', 'xmlrpc',
+]
+
+
+a = Analysis(
+    ['main.py'],
+    pathex=['.'],  # exceptions.py is bundled as a regular import
+    binaries=[],
+    datas=[],  # tasks.txt / completed_tasks.txt are created next to the executable on first run
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=excludes,
+    noarchive=False,
+    optimize=2,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='main',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,  # no decompression on every launch
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main_fast',
+)
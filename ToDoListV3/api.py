@@ -0,0 +1,235 @@
+"""
+Local HTTP/JSON API over the task store.
+
+    GET    /tasks                  active tasks (ETag / If-None-Match)
+    GET    /tasks/completed        completed tasks (ETag / If-None-Match)
+    GET    /search?q=<query>       compound query, see query.py
+    GET    /stats                  statistics
+    GET    /next?count=<n>         most urgent tasks by due date, priority and age
+    GET    /overdue                tasks past their due date
+    GET    /due?within=<3d>        tasks due in the next 90m / 12h / 3d / 2w
+    GET    /changes?since=<seq>    change feed entries after seq (&limit=, &wait=<seconds> to long-poll)
+    GET    /ready                  active tasks nothing is blocking
+    GET    /suggest?prefix=<text>  completions of a task text being typed (&count=<n>)
+    POST   /tasks                  {"text": ..., "priority": ..., "due": ..., "repeat": ...}
+    PATCH  /tasks/<n>              {"text": ..., "priority": ..., "due": ..., "repeat": ...}
+    DELETE /tasks/<n>              delete task number n
+    DELETE /tasks                  clear all active tasks
+    POST   /tasks/<n>/complete     mark task number n as completed
+    POST   /tasks/<n>/subtasks     {"text": ..., "priority": ...} add a subtask to task n
+    POST   /tasks/<n>/blockers     {"blocker": m} task n waits for task m
+    DELETE /tasks/<n>/blockers/<m> task n no longer waits for task m
+    POST   /batch                  {"operations": [{"command": "add", ...}, ...]} in one commit
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from daemon import INTERNAL_ERROR, TaskDaemon
+from exceptions import CommandError, JournaledStoreError
+from store import TaskStore, new_uid
+
+
+TASK_PATH = re.compile(r'^/tasks/(\d+)$')
+COMPLETE_PATH = re.compile(r'^/tasks/(\d+)/complete$')
+SUBTASKS_PATH = re.compile(r'^/tasks/(\d+)/subtasks$')
+BLOCKERS_PATH = re.compile(r'^/tasks/(\d+)/blockers(?:/(\d+))?$')
+
+
+class TaskAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, task_daemon):
+        self.task_daemon = task_daemon
+        # list kind -> (generation, serialized body)
+        self.list_cache = {}
+        self.list_cache_lock = threading.Lock()
+        # Generations restart at every load, so ETags from an earlier process must not match
+        self.boot = new_uid()
+        super().__init__(address, TaskAPIHandler)
+
+    def etag(self, status, generation):
+        return f'W/"{self.boot}-{status}-{generation}"'
+
+    def list_body(self, status):
+        generation = self.task_daemon.current_generation()
+        with self.list_cache_lock:
+            cached = self.list_cache.get(status)
+        if cached and cached[0] == generation:
+            return cached
+
+        generation, tasks = self.task_daemon.list_snapshot(status)
+        cached = (generation, json.dumps(tasks).encode())
+        with self.list_cache_lock:
+            self.list_cache[status] = cached
+        return cached
+
+
+class TaskAPIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ToDoListAPI/1.0'
+    # Headers and body go out as separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass  # Keep the console quiet under load
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+
+        if url.path in ('/tasks', '/tasks/completed'):
+            status = 'completed' if url.path.endswith('completed') else 'active'
+            generation = self.server.task_daemon.current_generation()
+            etag = self.server.etag(status, generation)
+
+            # Unchanged list: no lookup, no serialization
+            if self.headers.get('If-None-Match') == etag:
+                return self._send(HTTPStatus.NOT_MODIFIED, None, etag=etag)
+
+            generation, body = self.server.list_body(status)
+            return self._send(HTTPStatus.OK, body, etag=self.server.etag(status, generation))
+
+        if url.path == '/search':
+            query = parse_qs(url.query).get('q', [''])[0]
+            return self._execute({'command': 'search', 'query': query})
+
+        if url.path == '/stats':
+            return self._execute({'command': 'stats'})
+
+        if url.path in ('/next', '/overdue', '/due', '/changes', '/ready', '/suggest'):
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            return self._execute(dict(params, command=url.path[1:]))
+
+        self._error(HTTPStatus.NOT_FOUND, 'Not found.')
+
+    def do_POST(self):
+        body = self._read_json()
+        if body is None:
+            return
+
+        if self.path == '/tasks':
+            return self._execute(dict(body, command='add'), HTTPStatus.CREATED)
+
+        match = COMPLETE_PATH.match(self.path)
+        if match:
+            return self._execute({'command': 'complete', 'number': match.group(1)})
+
+        match = SUBTASKS_PATH.match(self.path)
+        if match:
+            return self._execute(dict(body, command='subtask', number=match.group(1)), HTTPStatus.CREATED)
+
+        match = BLOCKERS_PATH.match(self.path)
+        if match and not match.group(2):
+            return self._execute(dict(body, command='block', number=match.group(1)))
+
+        if self.path == '/batch':
+            operations = body.get('operations')
+            if not isinstance(operations, list) or not all(isinstance(op, dict) for op in operations):
+                return self._error(HTTPStatus.BAD_REQUEST, "'operations' must be a list of objects.")
+            try:
+                results = self.server.task_daemon.execute_batch(operations)
+            except Exception:
+                return self._error(HTTPStatus.INTERNAL_SERVER_ERROR, INTERNAL_ERROR)
+            return self._send(HTTPStatus.OK, json.dumps({'results': results}).encode())
+
+        self._error(HTTPStatus.NOT_FOUND, 'Not found.')
+
+    def do_PATCH(self):
+        body = self._read_json()
+        if body is None:
+            return
+
+        match = TASK_PATH.match(self.path)
+        if match:
+            return self._execute(dict(body, command='edit', number=match.group(1)))
+
+        self._error(HTTPStatus.NOT_FOUND, 'Not found.')
+
+    def do_DELETE(self):
+        if self.path == '/tasks':
+            return self._execute({'command': 'clear'})
+
+        match = TASK_PATH.match(self.path)
+        if match:
+            return self._execute({'command': 'delete', 'number': match.group(1)})
+
+        match = BLOCKERS_PATH.match(self.path)
+        if match and match.group(2):
+            return self._execute({'command': 'unblock', 'number': match.group(1), 'blocker': match.group(2)})
+
+        self._error(HTTPStatus.NOT_FOUND, 'Not found.')
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            body = None
+
+        if not isinstance(body, dict):
+            self._error(HTTPStatus.BAD_REQUEST, 'Request body must be a JSON object.')
+            return None
+        return body
+
+    def _execute(self, request, status=HTTPStatus.OK):
+        try:
+            result = self.server.task_daemon.execute(request)
+        except CommandError as e:
+            return self._error(HTTPStatus.BAD_REQUEST, e.message)
+        except Exception:
+            # Answered like any other error, the keep-alive connection stays usable
+            return self._error(HTTPStatus.INTERNAL_SERVER_ERROR, INTERNAL_ERROR)
+        self._send(status, json.dumps(result).encode())
+
+    def _error(self, status, message):
+        self._send(status, json.dumps({'error': message}).encode())
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body or b'')))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the task store over HTTP/JSON.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tasks-file', default='tasks.csv')
+    parser.add_argument('--complete-tasks-file', default='complete_tasks.csv')
+    parser.add_argument('--commit-interval', type=float, default=50, help='Group commit interval in ms')
+    args = parser.parse_args(argv)
+
+    try:
+        store = TaskStore(args.tasks_file, args.complete_tasks_file)
+    except JournaledStoreError as e:
+        print(e.message, file=sys.stderr)
+        return 1
+    task_daemon = TaskDaemon(store, commit_interval=args.commit_interval / 1000)
+    server = TaskAPIServer((args.host, args.port), task_daemon)
+    task_daemon.start_committer()
+
+    print(f'Serving {args.tasks_file} on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        task_daemon.stop_committer()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+"""
+Autocomplete of task texts.
+
+Every text added or edited in a store is remembered in a prefix trie, keyed
+by its folded form (see dedupe.normalize_text) and weighted by how often and
+how recently it was used: each use adds 2 ** (age / HALF_LIFE), so a use
+today counts twice as much as one HALF_LIFE ago and scores only ever grow.
+suggest() returns the best completions of a prefix in microseconds whatever
+the number of texts: every inner node of the trie keeps its MAX_SUGGESTIONS
+best texts, and texts are only split into child nodes once more than
+BUCKET_SIZE share a prefix (a burst trie), so a prefix ends either at a node
+with its answer ready or in a small bucket that is filtered.
+
+The trie is kept in `<tasks file stem>.completions` (a marshal snapshot) and
+`<tasks file stem>.completions.log` (the uses since, appended with each
+commit of the store); loading it is one read, not a rebuild. A store without
+them builds the trie once from its lists, with the created dates as uses.
+"""
+import datetime
+import heapq
+import marshal
+import os
+import time
+from contextlib import contextmanager
+
+from dedupe import normalize_text
+
+
+HALF_LIFE = 30 * 86400
+MAX_SUGGESTIONS = 10
+BUCKET_SIZE = 64
+SNAPSHOT_VERSION = 1
+# Log records before a new snapshot, also at least half the texts
+SNAPSHOT_RECORDS = 1000
+# Scores are rescaled once their exponent gets this large
+MAX_EXPONENT = 64
+
+
+def completions_file(tasks_file):
+    return os.path.splitext(tasks_file)[0] + '.completions'
+
+
+def fold_prefix(text):
+    # Like normalize_text(), but 'buy ' keeps its trailing space: the next word is being typed
+    folded = normalize_text(text)
+    return folded + ' ' if folded and text[-1:].isspace() else folded
+
+
+class CompletionTrie:
+    """
+    Folded text -> [text, score], and the burst trie over the folded texts.
+
+    Nodes are lists, so the whole trie goes to marshal as it is:
+    [children, bucket, top] where `children` maps the next character to a
+    node (None for a leaf), `bucket` holds the texts ending at the node (at a
+    leaf: every text below it) and `top` the best MAX_SUGGESTIONS texts
+    below an inner node.
+    """
+
+    __slots__ = ('epoch', 'until', 'entries', '_root')
+
+    def __init__(self, epoch, until=0.0, entries=None, root=None):
+        self.epoch = epoch
+        # Timestamp of the newest use in the trie
+        self.until = until
+        self.entries = {} if entries is None else entries
+        self._root = [None, [], []] if root is None else root
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def build(cls, uses, epoch):
+        """Trie of (timestamp, text) uses in one go, much faster than use() for each."""
+        trie = cls(epoch)
+        entries = trie.entries
+        for timestamp, text in uses:
+            key = normalize_text(text)
+            if not key:
+                continue
+            entry = entries.get(key)
+            if entry is None:
+                entries[key] = [text, trie.weight(timestamp)]
+            else:
+                entry[0], entry[1] = text, entry[1] + trie.weight(timestamp)
+            trie.until = max(trie.until, timestamp)
+        trie._root = trie._node(list(entries), 0)
+        return trie
+
+    def weight(self, timestamp):
+        return 2.0 ** ((timestamp - self.epoch) / HALF_LIFE)
+
+    def use(self, text, timestamp):
+        key = normalize_text(text)
+        if not key:
+            return
+        if (timestamp - self.epoch) / HALF_LIFE > MAX_EXPONENT:
+            self._rebase(timestamp)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [text, 0.0]
+            self._insert(key)
+        entry[0] = text  # The latest spelling is the one suggested
+        entry[1] += self.weight(timestamp)
+        self.until = max(self.until, timestamp)
+
+        # Only scores that grow: the key moves up or into the top of every inner node above it
+        node, depth, score = self._root, 0, entry[1]
+        entries = self.entries
+        while node[0] is not None:
+            top = node[2]
+            if key in top:
+                top.sort(key=lambda name: entries[name][1], reverse=True)
+            elif len(top) < MAX_SUGGESTIONS or score > entries[top[-1]][1]:
+                top.append(key)
+                top.sort(key=lambda name: entries[name][1], reverse=True)
+                del top[MAX_SUGGESTIONS:]
+            if depth == len(key):
+                break
+            node, depth = node[0][key[depth]], depth + 1
+
+    def suggest(self, prefix, count=5):
+        """Best `count` texts starting with `prefix` (compared folded), best first."""
+        prefix = fold_prefix(prefix)
+        node, depth = self._root, 0
+        while depth < len(prefix) and node[0] is not None:
+            node = node[0].get(prefix[depth])
+            if node is None:
+                return []
+            depth += 1
+
+        entries = self.entries
+        if node[0] is not None:
+            keys = node[2][:count]
+        else:
+            keys = heapq.nlargest(count, (key for key in node[1] if key.startswith(prefix)),
+                                  key=lambda key: entries[key][1])
+        return [entries[key][0] for key in keys]
+
+    def snapshot(self):
+        return {'version': SNAPSHOT_VERSION, 'epoch': self.epoch, 'until': self.until, 'entries': self.entries,
+                'root': self._root}
+
+    @classmethod
+    def from_snapshot(cls, data):
+        return cls(data['epoch'], data['until'], data['entries'], data['root'])
+
+    def _node(self, keys, depth):
+        # Node over `keys`, which share their first `depth` characters
+        if len(keys) <= BUCKET_SIZE:
+            return [None, keys, []]
+        children, bucket = {}, []
+        for key in keys:
+            if len(key) == depth:
+                bucket.append(key)
+            else:
+                children.setdefault(key[depth], []).append(key)
+        entries = self.entries
+        top = heapq.nlargest(MAX_SUGGESTIONS, keys, key=lambda key: entries[key][1])
+        return [{char: self._node(child_keys, depth + 1) for char, child_keys in children.items()}, bucket, top]
+
+    def _insert(self, key):
+        node, depth = self._root, 0
+        while node[0] is not None:
+            if depth == len(key):
+                node[1].append(key)
+                return
+            child = node[0].get(key[depth])
+            if child is None:
+                child = node[0][key[depth]] = [None, [], []]
+            node, depth = child, depth + 1
+        node[1].append(key)
+        if len(node[1]) > BUCKET_SIZE:
+            # Burst the leaf into an inner node
+            node[:] = self._node(node[1], depth)
+
+    def _rebase(self, timestamp):
+        # Same order, smaller numbers: divide every score by the weight of the new epoch
+        factor = self.weight(timestamp)
+        for entry in self.entries.values():
+            entry[1] /= factor
+        self.epoch = timestamp
+
+
+class Autocomplete:
+    """
+    The completion trie of one store, see the module docstring.
+
+    Listens to the store's add and edit events. The trie is read on the
+    first suggest(), until then uses are only queued, so a store that never
+    completes anything never reads the files.
+    """
+
+    __slots__ = ('_store', '_path', '_log_path', '_trie', '_pending', '_logged')
+
+    def __init__(self, store):
+        self._store = store
+        self._path = completions_file(store.tasks_file)
+        self._log_path = self._path + '.log'
+        self._trie = None
+        # (timestamp, text) uses not in the log yet
+        self._pending = []
+        # Records in the log, known once the trie is loaded
+        self._logged = 0
+        store.subscribe(self.record)
+
+    def __len__(self):
+        # Texts held, for the memory budget
+        return len(self._trie) if self._trie is not None else 0
+
+    @property
+    def loaded(self):
+        return self._trie is not None
+
+    def record(self, event):
+        match event['op']:
+            case 'batch':
+                for child in event['events']:
+                    self.record(child)
+            case 'add':
+                self._use(event['task']['task'])
+            case 'edit' if event['task']['task'] != event['old']['task']:
+                self._use(event['task']['task'])
+
+    def suggest(self, prefix, count=5):
+        return self.trie().suggest(prefix, min(count, MAX_SUGGESTIONS))
+
+    def trie(self):
+        if self._trie is None:
+            self._trie = self._load()
+        return self._trie
+
+    def flush(self):
+        """Append the queued uses to the log, called by the store's commit; snapshots a loaded trie now and then."""
+        if self._pending:
+            with open(self._log_path, 'ab') as file:
+                for record in self._pending:
+                    marshal.dump(record, file)
+            self._logged += len(self._pending)
+            self._pending.clear()
+        if self._trie is not None and self._logged > max(SNAPSHOT_RECORDS, len(self._trie) // 2):
+            self._snapshot()
+
+    def unload(self):
+        # Page the trie out; the files have everything once flushed
+        self.flush()
+        self._trie = None
+
+    def _use(self, text):
+        record = (time.time(), text)
+        self._pending.append(record)
+        if self._trie is not None:
+            self._trie.use(text, record[0])
+
+    def _load(self):
+        trie = None
+        if os.path.exists(self._path):
+            try:
+                with open(self._path, 'rb') as file:
+                    data = marshal.load(file)
+                if data.get('version') == SNAPSHOT_VERSION:
+                    trie = CompletionTrie.from_snapshot(data)
+            except (EOFError, ValueError, TypeError, AttributeError):
+                trie = None  # Damaged: built again below
+
+        self._logged = 0
+        if trie is None:
+            # Everything in the lists is in the trie, the log only adds uses made since
+            trie = self._build()
+            self._logged = SNAPSHOT_RECORDS + len(trie)  # Snapshot with the next flush
+        for timestamp, text in self._read_log():
+            self._logged += 1
+            if timestamp > trie.until:
+                trie.use(text, timestamp)
+        for timestamp, text in self._pending:
+            trie.use(text, timestamp)
+        return trie
+
+    def _build(self):
+        uses = []
+        for task in self._store.tasks + self._store.complete_tasks:
+            try:
+                timestamp = datetime.datetime.fromisoformat(task.get('created_at') or '').timestamp()
+            except ValueError:
+                timestamp = 0.0
+            uses.append((timestamp, task['task']))
+        uses.sort(key=lambda use: use[0])
+        trie = CompletionTrie.build(uses, epoch=time.time())
+        trie.until = max(trie.until, time.time())
+        return trie
+
+    def _read_log(self):
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, 'rb') as file:
+            while True:
+                try:
+                    record = marshal.load(file)
+                except (EOFError, ValueError, TypeError):
+                    return  # End, or a record torn by a crash
+                yield record
+
+    def _snapshot(self):
+        # The log is only cleared once the snapshot holding it is in place
+        temporary = self._path + '.tmp'
+        with open(temporary, 'wb') as file:
+            marshal.dump(self._trie.snapshot(), file)
+        os.replace(temporary, self._path)
+        open(self._log_path, 'wb').close()
+        self._logged = 0
+
+
+@contextmanager
+def readline_completion(autocomplete, count=MAX_SUGGESTIONS):
+    """Tab-complete whole lines typed by input() from `autocomplete` while inside the block."""
+    try:
+        import readline
+    except ImportError:
+        yield  # No readline (e.g. Windows without pyreadline3): plain input()
+        return
+
+    matches = []
+
+    def complete(text, state):
+        if state == 0:
+            matches[:] = autocomplete.suggest(readline.get_line_buffer(), count)
+        return matches[state] if state < len(matches) else None
+
+    completer, delimiters = readline.get_completer(), readline.get_completer_delims()
+    readline.set_completer(complete)
+    readline.set_completer_delims('')  # The whole line is the prefix
+    readline.parse_and_bind('bind ^I rl_complete' if 'libedit' in (readline.__doc__ or '') else 'tab: complete')
+    try:
+        yield
+    finally:
+        readline.set_completer(completer)
+        readline.set_completer_delims(delimiters)
@@ -0,0 +1,111 @@
+"""
+Load test for the HTTP/JSON API.
+
+Starts the API on a scratch store in-process and drives it from several
+keep-alive client threads, reporting requests per second for:
+
+    add        POST /tasks, one task per request
+    batch      POST /batch, --batch-size adds per request (one commit each)
+    list 200   GET /tasks after every request changed the list
+    list 304   GET /tasks with a matching If-None-Match
+    search     GET /search?q=priority:high
+
+Usage:
+    python bench_api.py [--clients 4] [--requests 500] [--batch-size 100] [--tasks 10000]
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+
+from api import TaskAPIServer
+from daemon import TaskDaemon
+from store import TaskStore
+
+
+def run_clients(port, clients, requests, make_request):
+    # Each thread keeps one connection open for all of its requests
+    def worker(client_id):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        for n in range(requests):
+            method, path, body, headers = make_request(client_id, n)
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            assert response.status < 400, response.status
+        connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return clients * requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per client')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=10000, help='Tasks preloaded before the list/search runs')
+    args = parser.parse_args()
+
+    json_headers = {'Content-Type': 'application/json'}
+    # Bytes bodies are sent in the same packet as the headers by http.client
+    add_body = json.dumps({'text': 'load test task', 'priority': 'low'}).encode()
+    batch_body = json.dumps({'operations': [{'command': 'add', 'text': 'batched task', 'priority': 'medium'}] * args.batch_size}).encode()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = TaskStore(os.path.join(work_dir, 'tasks.csv'), os.path.join(work_dir, 'complete_tasks.csv'))
+        task_daemon = TaskDaemon(store)
+        server = TaskAPIServer(('127.0.0.1', 0), task_daemon)
+        port = server.server_address[1]
+        task_daemon.start_committer()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        results = {}
+        results['add'] = run_clients(port, args.clients, args.requests,
+                                     lambda c, n: ('POST', '/tasks', add_body, json_headers))
+        results['batch'] = run_clients(port, args.clients, max(1, args.requests // 10),
+                                       lambda c, n: ('POST', '/batch', batch_body, json_headers))
+
+        # Preload the list for the read benchmarks
+        task_daemon.execute_batch([{'command': 'add', 'text': f'task {i}', 'priority': ('high', 'medium', 'low')[i % 3]}
+                                   for i in range(args.tasks)])
+
+        def changing_list(client_id, n):
+            task_daemon.execute({'command': 'edit', 'number': 1, 'text': f'edit {client_id}-{n}'})
+            return 'GET', '/tasks', None, {}
+
+        results['list 200'] = run_clients(port, args.clients, max(1, args.requests // 10), changing_list)
+
+        etag = http.client.HTTPConnection('127.0.0.1', port)
+        etag.request('GET', '/tasks')
+        response = etag.getresponse()
+        response.read()
+        current_etag = response.getheader('ETag')
+
+        results['list 304'] = run_clients(port, args.clients, args.requests,
+                                          lambda c, n: ('GET', '/tasks', None, {'If-None-Match': current_etag}))
+        results['search'] = run_clients(port, args.clients, max(1, args.requests // 10),
+                                        lambda c, n: ('GET', '/search?q=priority:high', None, {}))
+
+        server.shutdown()
+        server.server_close()
+        task_daemon.stop_committer()
+        total_tasks = len(store.tasks)
+
+    print(f'clients: {args.clients}, list size: {total_tasks} tasks\n')
+    for name, throughput in results.items():
+        extra = f' ({throughput * args.batch_size:,.0f} tasks/s)' if name == 'batch' else ''
+        print(f'{name.ljust(10)} {throughput:>10,.0f} req/s{extra}')
+
+
+if __name__ == "__main__":
+    main()
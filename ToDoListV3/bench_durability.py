@@ -0,0 +1,85 @@
+"""
+Add throughput and loss window of the durability modes (see durability.py).
+
+Each run starts --writers threads, each adding --adds tasks one at a time to
+its own autocommitting scratch store, like the menu does. In mode 'group' the
+stores share one GroupCommit. The loss window is what a machine crash right
+before the final sync() could lose:
+
+    none    every add since the store was opened
+    flush   whatever the OS has not written back yet (not bounded by the app)
+    fsync   nothing
+    group   at most the longest stretch between two shared fsyncs
+
+Usage:
+    python bench_durability.py [--writers 4] [--adds 300] [--interval 50] [--batch 256] [--journal]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from durability import DURABILITY_MODES, GroupCommit
+from store import TaskStore
+
+
+def run_writers(work_dir, mode, writers, adds, group_commit, journal):
+    stores = []
+    for writer in range(writers):
+        directory = os.path.join(work_dir, f'{mode}-{writer}')
+        os.makedirs(directory)
+        store = TaskStore(os.path.join(directory, 'tasks.csv'), os.path.join(directory, 'complete_tasks.csv'),
+                          journal=journal, durability=mode, group_commit=group_commit)
+        store.bootstrap()
+        stores.append(store)
+
+    def worker(store):
+        for n in range(adds):
+            store.add(f'durability test task {n}', 'low')
+
+    threads = [threading.Thread(target=worker, args=(store,)) for store in stores]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    # Nothing may be lost once the stores are synced
+    for store in stores:
+        store.sync()
+        assert len(TaskStore(store.tasks_file, store.complete_tasks_file, journal=journal).tasks) == adds
+    return writers * adds / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=4, help='Concurrent writers, one store each')
+    parser.add_argument('--adds', type=int, default=300, help='Adds per writer')
+    parser.add_argument('--interval', type=float, default=50, help="Group fsync interval in ms for mode 'group'")
+    parser.add_argument('--batch', type=int, default=256, help="Group fsync batch for mode 'group'")
+    parser.add_argument('--journal', action='store_true', help='Use journaled stores instead of CSV rewrites')
+    args = parser.parse_args()
+
+    print(f"{'mode':<8}{'adds/s':>10}   loss window")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for mode in DURABILITY_MODES:
+            group_commit = GroupCommit(args.interval / 1000, args.batch) if mode == 'group' else None
+            throughput = run_writers(work_dir, mode, args.writers, args.adds, group_commit, args.journal)
+            match mode:
+                case 'none':
+                    window = f'{args.adds} adds per writer (until sync)'
+                case 'flush':
+                    window = 'OS writeback'
+                case 'fsync':
+                    window = '0'
+                case 'group':
+                    stats = group_commit.stats()
+                    window = (f"<= {stats['max_window_ms']} ms / {stats['max_batch']} adds "
+                              f"({stats['syncs']} fsyncs, {stats['ops_per_sync']} adds each)")
+            print(f'{mode:<8}{throughput:>10.0f}   {window}')
+
+
+if __name__ == '__main__':
+    main()
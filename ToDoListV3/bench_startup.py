@@ -0,0 +1,72 @@
+"""
+Startup benchmark for the V3 entry point.
+
+Runs `main` in fresh interpreters with `-X importtime` and reports the
+cumulative import time of the app plus the time spent bootstrapping a
+ToDoList, against a 30 ms budget.
+
+Usage:
+    python bench_startup.py [--runs 20]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+TARGET_MS = 30.0
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Child program: import the app, create the files and load the task count
+CHILD = (
+    "import time; t = time.perf_counter(); import main; "
+    "app = main.ToDoList('tasks.csv', 'complete_tasks.csv'); app.tasks_length; "
+    "print((time.perf_counter() - t) * 1000)"
+)
+
+
+def import_time_ms(stderr, module='main'):
+    # Lines look like: "import time:       123 |       4567 | main"
+    for line in stderr.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    return None
+
+
+def run_once(work_dir):
+    env = dict(os.environ, PYTHONPATH=APP_DIR, NO_COLOR='1')
+    env.pop('PYTHONDONTWRITEBYTECODE', None)  # the warm-up run must leave .pyc files behind
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD],
+        cwd=work_dir, env=env, capture_output=True, text=True, check=True,
+    )
+    return import_time_ms(result.stderr), float(result.stdout.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    imports, totals = [], []
+    with tempfile.TemporaryDirectory() as work_dir:
+        run_once(work_dir)  # warm the bytecode cache
+        for _ in range(args.runs):
+            import_ms, total_ms = run_once(work_dir)
+            imports.append(import_ms)
+            totals.append(total_ms)
+
+    total = statistics.median(totals)
+    print(f"runs:                  {args.runs}")
+    print(f"import main (median):  {statistics.median(imports):.2f} ms")
+    print(f"startup (median):      {total:.2f} ms")
+    print(f"startup (max):         {max(totals):.2f} ms")
+    print(f"target:                {TARGET_MS:.0f} ms -> {'PASS' if total < TARGET_MS else 'FAIL'}")
+
+    return 0 if total < TARGET_MS else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
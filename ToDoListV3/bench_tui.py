@@ -0,0 +1,113 @@
+"""
+Keystroke latency benchmark for the full-screen list (tui.py).
+
+Writes a scratch list of --tasks tasks, then runs the TUI in a child process
+on a pseudo-terminal and replays typing a search, scrolling and clearing
+it. Every keystroke is timed from the key to the screen update (handling,
+search slice, redraw and curses output), against a 16 ms (one 60 Hz frame)
+budget.
+
+Usage:
+    python bench_tui.py [--tasks 1000000] [--rows 40] [--columns 120]
+"""
+import argparse
+import csv
+import curses
+import fcntl
+import json
+import os
+import pty
+import statistics
+import struct
+import sys
+import tempfile
+import termios
+import time
+
+from store import TASK_FIELDS
+
+TARGET_MS = 16.0
+WORDS = ('deploy', 'server', 'write', 'report', 'call', 'alice', 'buy', 'milk', 'review', 'budget', 'fix', 'login',
+         'bug', 'plan', 'sprint', 'clean', 'garage', 'book', 'flight', 'update', 'docs')
+# The replayed session: type a query, narrow and widen it, scroll, clear it, scroll the whole list
+KEYS = (['/'] + list('deploy') + [' '] + list('server') + ['\x7f'] * 7 + list(' report')
+        + ['\n'] + [curses.KEY_NPAGE] * 20 + [curses.KEY_DOWN] * 20 + ['/', '\x1b']
+        + [curses.KEY_NPAGE] * 20 + [curses.KEY_UP] * 20 + ['/'] + list('priority:high fix') + ['\x1b'])
+
+
+def write_tasks(path, count):
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=TASK_FIELDS)
+        writer.writeheader()
+        for n in range(count):
+            writer.writerow({'task_id': n + 1, 'task': f'{WORDS[n % 21]} {WORDS[n * 7 % 19]} {WORDS[n * 3 % 17]} {n}',
+                             'created_at': '2025-01-01 09:00:00', 'priority': ('high', 'medium', 'low')[n % 3],
+                             'uid': f'{n:032x}'})
+
+
+def replay(work_dir, rows, columns):
+    # Child on the pseudo-terminal: load the list, then time every key of KEYS
+    from main import ToDoList
+    from tui import TaskScreen
+
+    fcntl.ioctl(0, termios.TIOCSWINSZ, struct.pack('HHHH', rows, columns, 0, 0))
+    app = ToDoList(os.path.join(work_dir, 'tasks.csv'), os.path.join(work_dir, 'complete_tasks.csv'))
+    app.tasks_length
+
+    timings = []
+
+    def session(window):
+        screen = TaskScreen(app, window)
+        screen.draw()
+        for key in KEYS:
+            start = time.perf_counter()
+            screen.press(key)
+            timings.append((time.perf_counter() - start) * 1000)
+
+    curses.wrapper(session)
+    with open(os.path.join(work_dir, 'timings.json'), 'w') as file:
+        json.dump(timings, file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=1_000_000)
+    parser.add_argument('--rows', type=int, default=40)
+    parser.add_argument('--columns', type=int, default=120)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        write_tasks(os.path.join(work_dir, 'tasks.csv'), args.tasks)
+
+        pid, terminal = pty.fork()
+        if pid == 0:
+            os.environ.setdefault('TERM', 'xterm-256color')
+            try:
+                replay(work_dir, args.rows, args.columns)
+            finally:
+                os._exit(0)
+
+        # Drain the screen output, the child blocks on a full pseudo-terminal otherwise
+        while True:
+            try:
+                if not os.read(terminal, 65536):
+                    break
+            except OSError:
+                break
+        os.waitpid(pid, 0)
+        with open(os.path.join(work_dir, 'timings.json')) as file:
+            timings = sorted(json.load(file))
+
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"tasks:                 {args.tasks}")
+    print(f"keystrokes:            {len(timings)}")
+    print(f"latency (median):      {statistics.median(timings):.2f} ms")
+    print(f"latency (p99):         {p99:.2f} ms")
+    print(f"latency (max):         {timings[-1]:.2f} ms")
+    print(f"target:                {TARGET_MS:.0f} ms -> {'PASS' if timings[-1] < TARGET_MS else 'FAIL'}")
+
+    return 0 if timings[-1] < TARGET_MS else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Append-only change feed of task mutations.
+
+Every change made to a TaskStore is appended to a JSON Lines file as one
+entry per store event, numbered by a sequence number that keeps growing
+across restarts:
+
+    {"seq": 42, "ts": "2025-01-01 10:00:00", "op": "complete", "position": 3, "task": {...}, ...}
+
+Entries carry the store event unchanged (see TaskStore.subscribe), so a
+consumer applying them in order reproduces the lists. A batch gives one
+entry per change in it, its rows tagged with "bulk" for a bulk
+delete/complete/edit; 'clear' and 'restore' are one entry each, listing
+every row in "tasks".
+
+Entries are only appended when the store commits, right after the lists
+are written, and are as durable as the store's `durability` makes them: in
+'none' they wait for sync(). Changes lost before a commit (e.g. in a
+crash) never reach the feed, just as they never reach the lists.
+Consumers remember the last seq they processed and read on from there:
+
+    python changefeed.py --since 41
+    python changefeed.py --checkpoint-file consumer.seq --follow
+"""
+import os
+import sys
+import threading
+import time
+
+from store import now_timestamp
+
+
+DEFAULT_FEED = 'changes.jsonl'
+# Below this many bytes the checkpoint search just scans forward
+_SCAN_BYTES = 64 * 1024
+
+
+def _seq(line):
+    import json
+    return json.loads(line)['seq']
+
+
+def _recover(path):
+    # Drop a half written last entry and return the last sequence number
+    if not os.path.exists(path):
+        return 0
+
+    with open(path, 'r+b') as file:
+        position = file.seek(0, 2)
+        tail = b''
+        while position > 0:
+            step = min(4096, position)
+            position -= step
+            file.seek(position)
+            tail = file.read(step) + tail
+
+            end = tail.rfind(b'\n')
+            if end == -1:
+                continue
+            start = tail.rfind(b'\n', 0, end)
+            if start == -1 and position > 0:
+                continue
+
+            file.truncate(position + end + 1)
+            return _seq(tail[start + 1:end])
+
+        file.truncate(0)
+        return 0
+
+
+def _seek_after(file, since):
+    # Bisect the byte offsets for the first entry after `since`; lines before `low` are all <= since
+    low, high = 0, file.seek(0, 2)
+    while high - low > _SCAN_BYTES:
+        middle = (low + high) // 2
+        file.seek(middle)
+        file.readline()  # Skip to the next line start
+        line_start = file.tell()
+        line = file.readline()
+        if line.endswith(b'\n') and _seq(line) <= since:
+            low = line_start + len(line)
+        else:
+            high = middle
+    file.seek(low)
+
+
+def read_changes(path, since=0, limit=None):
+    """Yield feed entries with seq > `since`, oldest first, without loading the file."""
+    if not os.path.exists(path):
+        return
+
+    import json
+    with open(path, 'rb') as file:
+        _seek_after(file, since)
+        count = 0
+        for line in file:
+            if not line.endswith(b'\n'):
+                return  # Entry still being written
+            entry = json.loads(line)
+            if entry['seq'] <= since:
+                continue
+            yield entry
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+
+class ChangeFeed:
+    """
+    Records a TaskStore's change events to an append-only feed file.
+
+    Readers in the same process can block in `wait()` / `tail()` until new
+    entries are appended instead of polling the file.
+    """
+
+    __slots__ = ('path', 'last_seq', '_store', '_file', '_appended', '_pending')
+
+    def __init__(self, store, path=None):
+        self.path = path or os.path.join(os.path.dirname(store.tasks_file), DEFAULT_FEED)
+        self.last_seq = _recover(self.path)
+        self._store = store
+        self._file = open(self.path, 'ab')
+        self._appended = threading.Condition()
+        # Entries recorded since the store's last commit, encoded without their seq
+        self._pending = []
+        store.subscribe(self._record)
+        store.add_commit_hook(self.flush)
+
+    def read(self, since=0, limit=None):
+        return read_changes(self.path, since, limit)
+
+    def wait(self, since, timeout=None):
+        # True once an entry newer than `since` exists, False on timeout
+        with self._appended:
+            return self._appended.wait_for(lambda: self.last_seq > since, timeout)
+
+    def tail(self, since=0, timeout=None):
+        """Yield entries after `since` forever, sleeping while there are none (until `timeout`)."""
+        while True:
+            for entry in self.read(since):
+                since = entry['seq']
+                yield entry
+            if not self.wait(since, timeout):
+                return
+
+    def close(self):
+        # Changes not committed by now are not in the lists on disk either
+        self._store.unsubscribe(self._record)
+        self._store.remove_commit_hook(self.flush)
+        self._file.close()
+
+    def flush(self):
+        """Append the changes recorded since the last commit, called by the store's commit; returns the files written."""
+        if not self._pending:
+            return []
+
+        with self._appended:
+            lines = []
+            for body in self._pending:
+                self.last_seq += 1
+                lines.append(b'{"seq": %d, ' % self.last_seq + body)
+            self._pending.clear()
+
+            # One write per commit, so a batch lands in the file together
+            self._file.write(b''.join(lines))
+            self._file.flush()
+            self._appended.notify_all()
+        return [self.path]
+
+    def _record(self, event):
+        match event['op']:
+            case 'reload':
+                # Files read from disk, nothing changed through the store (dirty lists are never reloaded)
+                return
+            case 'batch':
+                events, bulk = event['events'], event['bulk']
+            case _:
+                events, bulk = [event], None
+
+        # json is loaded on the first change, not at startup
+        import json
+
+        # Encoded now, later changes to the same rows must not show up in this entry
+        timestamp = now_timestamp()
+        for child in events:
+            entry = {'ts': timestamp, **child}
+            if bulk:
+                entry['bulk'] = bulk
+            self._pending.append(json.dumps(entry, ensure_ascii=False).encode()[1:] + b'\n')
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--feed', default=DEFAULT_FEED, help='Feed file (default: %(default)s)')
+    parser.add_argument('--since', type=int, help='Print entries after this sequence number')
+    parser.add_argument('--checkpoint-file', help='Resume from and save the last printed sequence number here')
+    parser.add_argument('--follow', action='store_true', help='Keep printing new entries as they are appended')
+    parser.add_argument('--interval', type=float, default=0.5, help='Seconds between checks of the file with --follow')
+    args = parser.parse_args(argv)
+
+    since = args.since
+    if since is None and args.checkpoint_file and os.path.exists(args.checkpoint_file):
+        with open(args.checkpoint_file) as file:
+            since = int(file.read().strip() or 0)
+    since = since or 0
+
+    try:
+        while True:
+            for entry in read_changes(args.feed, since):
+                print(json.dumps(entry, ensure_ascii=False), flush=True)
+                since = entry['seq']
+                if args.checkpoint_file:
+                    with open(args.checkpoint_file, 'w') as file:
+                        file.write(f'{since}\n')
+            if not args.follow:
+                return 0
+            # Another process owns the feed, so watch the file
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
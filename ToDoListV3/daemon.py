@@ -0,0 +1,947 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+
+# What the client and its command line need; the server's own modules are imported when it starts serving
+from dedupe import DUPLICATE_POLICIES, describe_duplicate, find_duplicates, normalize_text
+from durability import DURABILITY_MODES, GroupCommit
+from exceptions import CommandError, DependencyCycleError, InvalidDateError, InvalidRecurrenceError, JournaledStoreError, NamespaceError, QuerySyntaxError, TasksInputOutOfRangeError, ZeroUserInput
+from memory import MemoryBudget, format_size, parse_size
+from namespaces import DEFAULT_ROOT, StorePool, namespace_files, parse_namespace
+from store import TaskStore, PRIORITIES
+
+
+DEFAULT_SOCKET = 'todo.sock'
+
+
+# Request fields that hold text; anything but a string (or null) is refused up front
+STRING_FIELDS = ('command', 'text', 'priority', 'due', 'repeat', 'tags', 'project', 'selection', 'query', 'sort',
+                 'within', 'prefix', 'kind', 'tag', 'in_project', 'status', 'action', 'duplicates', 'namespace')
+INTERNAL_ERROR = 'Internal error while running the request.'
+
+
+def check_request(request):
+    # Shapes the commands rely on, so bad input is answered with an error instead of breaking the connection
+    if not isinstance(request, dict):
+        raise CommandError(message='A request must be a JSON object.')
+    for field in STRING_FIELDS:
+        if request.get(field) is not None and not isinstance(request[field], str):
+            raise CommandError(message=f"'{field}' must be a string.")
+
+
+class TaskDaemon:
+    """
+    Keeps a TaskStore warm in memory and serves JSON commands over a Unix socket.
+
+    Each request is one JSON object per line, e.g. {"command": "add", "text": "...",
+    "priority": "high"}, answered with {"ok": true, "result": ...} or
+    {"ok": false, "error": "..."}. Mutations are acknowledged from memory and
+    group-committed to disk by a background thread, at most every
+    `commit_interval` seconds or as soon as `commit_batch` mutations are pending.
+    How durable a commit is depends on the store's `durability`; sync() runs
+    on shutdown and for the flush command. A journaled store
+    (TaskStore(..., journal=True)) is handed to `compactor`,
+    which compacts it in the background. Adds and edits that duplicate a
+    task (see dedupe.py) go ahead, are flagged with 'duplicate_of' or are
+    refused, as `duplicates` or the request's own "duplicates" asks.
+    """
+
+    MUTATIONS = ('add', 'complete', 'delete', 'edit', 'clear', 'bulk', 'subtask', 'block', 'unblock', 'undo', 'redo',
+                 'dedupe')
+    # Undo/redo replay whole changes and cannot run inside another batch
+    BATCH_COMMANDS = ('add', 'complete', 'delete', 'edit', 'clear', 'bulk', 'list', 'search', 'stats',
+                      'next', 'overdue', 'due', 'subtask', 'block', 'unblock', 'ready', 'report', 'suggest')
+    # Served without the store lock, they may block waiting for changes
+    UNLOCKED = ('changes',)
+
+    def __init__(self, store, socket_path=DEFAULT_SOCKET, commit_interval=0.05, commit_batch=256, feed_file=None,
+                 max_memory=None, compactor=None, duplicates='warn'):
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError(f"Unknown duplicates policy '{duplicates}', use one of: {', '.join(DUPLICATE_POLICIES)}.")
+        self.store = store
+        self.socket_path = socket_path
+        self.commit_interval = commit_interval
+        self.commit_batch = commit_batch
+        self.compactor = compactor
+        self.duplicates = duplicates
+        # Folded text -> task added or edited by the running execute_batch(), the index sees them at its end
+        self._batch_texts = None
+        self.commits = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._commit_wanted = threading.Condition(self._lock)
+        self._stopping = threading.Event()
+        self._committer = None
+        self._server = None
+
+        self.store.autocommit = False
+        if max_memory is not None:
+            self.store.budget = MemoryBudget(max_memory)
+        self.store.bootstrap()
+        from changefeed import ChangeFeed
+        from oplog import OperationLog
+        self.oplog = OperationLog(self.store)
+        self.feed = ChangeFeed(self.store, feed_file)
+        if self.compactor is not None and self.store.journal is not None:
+            self.compactor.watch(self.store.journal)
+
+    def execute(self, request):
+        check_request(request)
+        command = request.get('command')
+        handler = getattr(self, f'_command_{command}', None)
+        if handler is None:
+            raise CommandError(message=f"Unknown command '{command}'.")
+        if command in self.UNLOCKED:
+            return handler(request)
+
+        with self._lock:
+            result = handler(request)
+            if command in self.MUTATIONS:
+                self._mutated(1)
+        return result
+
+    def current_generation(self):
+        # Touching the lists picks up edits made to the files by other processes
+        with self._lock:
+            self.store.tasks, self.store.complete_tasks
+            return self.store.generation
+
+    def list_snapshot(self, status):
+        with self._lock:
+            return self.store.generation, self._command_list({'status': status})
+
+    def execute_batch(self, requests):
+        # All requests run under one lock hold, as one store batch, in the same commit
+        results = []
+        with self._lock:
+            self._batch_texts = {}
+            try:
+                with self.store.batch():
+                    for request in requests:
+                        try:
+                            check_request(request)
+                            command = request.get('command')
+                            if command not in self.BATCH_COMMANDS:
+                                raise CommandError(message=f"Unknown batch command '{command}'.")
+                            results.append({'ok': True, 'result': getattr(self, f'_command_{command}')(request)})
+                        except CommandError as e:
+                            results.append({'ok': False, 'error': e.message})
+                        except Exception:
+                            # One broken operation must not cost the others their results
+                            results.append({'ok': False, 'error': INTERNAL_ERROR})
+            finally:
+                self._batch_texts = None
+            self._commit()
+        return results
+
+    def start_committer(self):
+        self._stopping.clear()
+        self._committer = threading.Thread(target=self._commit_loop, name='todo-committer', daemon=True)
+        self._committer.start()
+
+    def stop_committer(self):
+        # Wake the committer for a final commit and wait for it
+        self._stopping.set()
+        with self._lock:
+            self._commit_wanted.notify()
+        self._committer.join()
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Stale socket from a previous run
+
+        self._server = _unix_server(self.socket_path, self)
+        self.start_committer()
+        if self.compactor is not None:
+            self.compactor.start()
+
+        try:
+            self._server.serve_forever()
+        finally:
+            if self.compactor is not None:
+                self.compactor.stop()
+            self.stop_committer()
+            self.store.sync()
+            if self.store.journal is not None:
+                self.store.journal.close()
+            self._server.server_close()
+            os.unlink(self.socket_path)
+
+    def shutdown(self):
+        # serve_forever() must be stopped from another thread
+        threading.Thread(target=self._server.shutdown).start()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        # Final commit of a daemon that is no longer served (see NamespaceDaemon)
+        with self._lock:
+            self._commit()
+            self.store.sync()
+            self.feed.close()
+            self.store.page_out()
+            if self.store.journal is not None:
+                if self.compactor is not None:
+                    self.compactor.unwatch(self.store.journal)
+                self.store.journal.close()
+
+    def _mutated(self, count):
+        # Called with the lock held
+        self._pending += count
+        if self._pending >= self.commit_batch:
+            self._commit_wanted.notify()
+
+    def _commit(self):
+        # Called with the lock held; with durability 'none' only sync() writes
+        if self.store.dirty and self.store.durability != 'none':
+            self.store.commit()
+            self.commits += 1
+            self._pending = 0
+
+    def _commit_loop(self):
+        while True:
+            with self._lock:
+                if not self._stopping.is_set():
+                    self._commit_wanted.wait(timeout=self.commit_interval)
+                self._commit()
+                # Right after a commit nothing is unsaved, so every segment can be paged out
+                if self.store.budget is not None:
+                    self.store.budget.enforce()
+            if self._stopping.is_set():
+                return
+
+    def _position(self, request, key='number'):
+        # Tasks are addressed by their 1-based list number, like in the menu
+        try:
+            number = int(request.get(key))
+        except (TypeError, ValueError):
+            raise CommandError(message='Please enter a valid task number.')
+
+        if not 1 <= number <= len(self.store.tasks):
+            raise CommandError(message=f'Task number must be between 1 and {len(self.store.tasks)}.')
+        return number - 1
+
+    @staticmethod
+    def _priority(request, required=True):
+        priority = (request.get('priority') or '').strip().lower()
+        if priority and priority not in PRIORITIES:
+            raise CommandError(message='Priority must be high, medium or low.')
+        if required and not priority:
+            raise CommandError(message='Priority is required.')
+        return priority
+
+    @staticmethod
+    def _due(request):
+        # None keeps the current due date, '' removes it
+        due = request.get('due')
+        if due is None:
+            return None
+        if not due.strip():
+            return ''
+        try:
+            from scheduler import parse_due
+            return parse_due(due)
+        except InvalidDateError as e:
+            raise CommandError(message=e.message)
+
+    @staticmethod
+    def _repeat(request):
+        # None keeps the current rule, '' stops repeating
+        repeat = request.get('repeat')
+        if repeat is None:
+            return None
+        if not repeat.strip():
+            return ''
+        try:
+            from recurrence import parse_rule
+            return parse_rule(repeat)
+        except InvalidRecurrenceError as e:
+            raise CommandError(message=e.message)
+
+    @staticmethod
+    def _tags(request):
+        # None keeps the current tags / project, '' removes them
+        from query import normalize_tags
+
+        tags, project = request.get('tags'), request.get('project')
+        return {'tags': None if tags is None else normalize_tags(tags),
+                'project': None if project is None else project.strip()}
+
+    def _duplicate(self, request, text, ignore=None):
+        # The task `text` duplicates, None when there is none or duplicates are allowed; raises when they are refused
+        policy = request.get('duplicates') or self.duplicates
+        if policy not in DUPLICATE_POLICIES:
+            raise CommandError(message=f"'duplicates' must be one of: {', '.join(DUPLICATE_POLICIES)}.")
+        if policy == 'allow':
+            return None
+
+        match = self.store.duplicates.check(text, ignore)
+        if match is None and self._batch_texts:
+            task = self._batch_texts.get(normalize_text(text))
+            match = ('active', task) if task is not None and task is not ignore else None
+        if match is not None and policy == 'reject':
+            raise CommandError(message=f'Duplicate of {describe_duplicate(match)}')
+        return match
+
+    def _checked(self, task, match):
+        # Copy of an added or edited task, flagged when it duplicates another
+        if self._batch_texts is not None:
+            self._batch_texts[normalize_text(task['task'])] = task
+        result = dict(task)
+        if match is not None:
+            result['duplicate_of'] = describe_duplicate(match)
+        return result
+
+    def _command_ping(self, request):
+        return 'pong'
+
+    def _command_add(self, request):
+        text = (request.get('text') or '').strip()
+        if not text:
+            raise CommandError(message='Task text cannot be empty.')
+        due_at, recurrence = self._due(request), self._repeat(request)
+        if recurrence and not due_at:
+            try:
+                from recurrence import next_due
+                due_at = next_due(recurrence)
+            except InvalidRecurrenceError as e:
+                raise CommandError(message=e.message)
+        priority = self._priority(request)
+        match = self._duplicate(request, text)
+        task = self.store.add(text, priority, due_at=due_at, recurrence=recurrence, **self._tags(request))
+        return self._checked(task, match)
+
+    def _command_complete(self, request):
+        from recurrence import complete_tasks
+        try:
+            return dict(complete_tasks(self.store, [self._position(request)])[0])
+        except InvalidRecurrenceError as e:
+            raise CommandError(message=e.message)  # A rule stored by an older version
+
+    def _command_delete(self, request):
+        return dict(self.store.delete(self._position(request)))
+
+    def _command_edit(self, request):
+        position = self._position(request)
+        text = (request.get('text') or '').strip()
+        match = self._duplicate(request, text, ignore=self.store.tasks[position]) if text else None
+        task = self.store.edit(position, text=text, priority=self._priority(request, required=False),
+                               due_at=self._due(request), recurrence=self._repeat(request), **self._tags(request))
+        return self._checked(task, match) if text else dict(task)
+
+    def _command_clear(self, request):
+        return len(self.store.clear())
+
+    def _command_bulk(self, request):
+        # {"action": "delete|complete|edit", "selection": "3-40,55" or a query, "text": ..., "priority": ...}
+        action = request.get('action')
+        if action not in ('delete', 'complete', 'edit'):
+            raise CommandError(message='Bulk action must be delete, complete or edit.')
+
+        try:
+            from query import select_tasks
+            positions = select_tasks(self.store.index, request.get('selection') or '')
+        except (QuerySyntaxError, ZeroUserInput) as e:
+            raise CommandError(message=e.message)
+        except TasksInputOutOfRangeError as e:
+            raise CommandError(message=e.message.strip())
+
+        text = (request.get('text') or '').strip()
+        if action == 'edit' and text and (request.get('duplicates') or self.duplicates) == 'reject':
+            # One text for several tasks makes them duplicates of each other
+            if len(set(positions)) > 1:
+                raise CommandError(message=f'Giving {len(set(positions))} tasks the same text makes them duplicates.')
+            if positions:
+                self._duplicate(request, text, ignore=self.store.tasks[positions[0]])
+
+        if action == 'delete':
+            tasks = self.store.delete_many(positions)
+        elif action == 'complete':
+            from recurrence import complete_tasks
+            tasks = complete_tasks(self.store, positions)
+        else:
+            tasks = self.store.edit_many(positions, text=text,
+                                         priority=self._priority(request, required=False), due_at=self._due(request),
+                                         recurrence=self._repeat(request), **self._tags(request))
+        return len(tasks)
+
+    def _command_undo(self, request):
+        entry = self.oplog.undo()
+        if entry is None:
+            raise CommandError(message='Nothing to undo.')
+        return self.oplog.describe(entry)
+
+    def _command_redo(self, request):
+        entry = self.oplog.redo()
+        if entry is None:
+            raise CommandError(message='Nothing to redo.')
+        return self.oplog.describe(entry)
+
+    def _command_list(self, request):
+        # Copies, so the response is serialized outside the lock safely
+        tasks = self.store.complete_tasks if request.get('status') == 'completed' else self.store.tasks
+        if request.get('tag') or request.get('in_project'):
+            # {"tag": "home and not later", "in_project": "house"}, answered from the bitset indexes
+            index = self.store.index
+            try:
+                row_ids = index.tagged(request.get('tag'), request.get('in_project'))
+            except QuerySyntaxError as e:
+                raise CommandError(message=e.message)
+            status = request.get('status') or 'active'
+            tasks = [task for row_status, task in (index.rows[row_id] for row_id in row_ids) if row_status == status]
+        elif request.get('status') != 'completed' and request.get('sort'):
+            # {"sort": "priority,-created", "limit": 20}: the whole active list, cached until it changes
+            from sorting import sort_active
+            return [dict(task) for task in sort_active(self.store, self._sort_spec(request), self._limit(request))]
+
+        if request.get('sort') or request.get('limit') is not None:
+            from sorting import sort_tasks
+            tasks = sort_tasks(tasks, self._sort_spec(request), self._limit(request))
+        return [dict(task) for task in tasks]
+
+    @staticmethod
+    def _sort_spec(request):
+        try:
+            from sorting import parse_sort
+            return parse_sort(request.get('sort') or '')
+        except QuerySyntaxError as e:
+            raise CommandError(message=e.message)
+
+    @staticmethod
+    def _limit(request):
+        if request.get('limit') is None:
+            return None
+        try:
+            return max(int(request['limit']), 0)
+        except (TypeError, ValueError):
+            raise CommandError(message="'limit' must be a number.")
+
+    def _command_search(self, request):
+        from query import split_explain
+        explain, query_text = split_explain(request.get('query') or '')
+        try:
+            plan = self.store.search(query_text)
+        except QuerySyntaxError as e:
+            raise CommandError(message=e.message)
+        return {
+            'results': [dict(task, status=status) for status, task in plan.results],
+            'explain': plan.explain() if explain else None,
+        }
+
+    @staticmethod
+    def _number(request, key, default):
+        try:
+            return int(request.get(key) or default)
+        except (TypeError, ValueError):
+            raise CommandError(message=f"'{key}' must be a number.")
+
+    def _command_next(self, request):
+        return [dict(task) for task in self.store.scheduler.next(self._number(request, 'count', 5))]
+
+    def _command_overdue(self, request):
+        return [dict(task) for task in self.store.scheduler.overdue()]
+
+    def _command_due(self, request):
+        # {"within": "3d"}
+        from scheduler import parse_duration
+        try:
+            duration = parse_duration(request.get('within') or '1d')
+        except InvalidDateError as e:
+            raise CommandError(message=e.message)
+        return [dict(task) for task in self.store.scheduler.due_within(duration)]
+
+    def _command_subtask(self, request):
+        # {"number": 3, "text": "...", "priority": "high"}, priority defaults to the parent's
+        position = self._position(request)
+        text = (request.get('text') or '').strip()
+        if not text:
+            raise CommandError(message='Task text cannot be empty.')
+        priority = self._priority(request, required=False) or self.store.tasks[position]['priority']
+        from dependencies import add_subtask
+        return dict(add_subtask(self.store, position, text, priority, due_at=self._due(request),
+                                **self._tags(request)))
+
+    def _command_block(self, request):
+        # {"number": 3, "blocker": 5}: task 3 waits for task 5
+        from dependencies import add_blocker
+        try:
+            return dict(add_blocker(self.store, self._position(request), self._position(request, 'blocker')))
+        except DependencyCycleError as e:
+            raise CommandError(message=e.message)
+
+    def _command_unblock(self, request):
+        from dependencies import remove_blocker
+        return dict(remove_blocker(self.store, self._position(request), self._position(request, 'blocker')))
+
+    def _command_ready(self, request):
+        # Active tasks nothing is blocking, straight from the dependency graph
+        return [dict(task) for task in self.store.graph.ready()]
+
+    def _command_suggest(self, request):
+        # {"prefix": "buy m", "count": 5}: completions of a task text being typed, best first
+        return self.store.completions.suggest(request.get('prefix') or '', self._number(request, 'count', 5))
+
+    def _command_report(self, request):
+        # {"kind": "daily" | "week" | "month" | "heatmap"}, served from the daily rollups
+        rollups = self.store.rollups
+        match request.get('kind') or 'daily':
+            case 'daily':
+                return rollups.daily(last=self._number(request, 'last', 14))
+            case 'week' | 'month':
+                return rollups.burndown(request['kind'], last=self._number(request, 'last', 12))
+            case 'heatmap':
+                return rollups.heatmap(weeks=self._number(request, 'last', 12))
+        raise CommandError(message="'kind' must be daily, week, month or heatmap.")
+
+    def _command_dedupe(self, request):
+        # {"delete": true} also deletes every active duplicate but the first of its group
+        groups = find_duplicates(self.store.tasks, self.store.complete_tasks)
+        result = {'groups': [[dict(task, status=status) for status, task in group] for group in groups], 'deleted': 0}
+        if request.get('delete'):
+            positions = [int(task['task_id']) - 1 for group in groups
+                         for status, task in [entry for entry in group if entry[0] == 'active'][1:]]
+            result['deleted'] = len(self.store.delete_many(positions))
+        return result
+
+    def _command_stats(self, request):
+        stats = dict(self.store.stats(), commits=self.commits, pending=self._pending, generation=self.store.generation,
+                     durability=self.store.durability, query_cache=self.store.query_cache.stats())
+        if self.store.group_commit is not None:
+            stats['group_commit'] = self.store.group_commit.stats()
+        if self.store.budget is not None:
+            stats['memory'] = self.store.budget.stats()
+        if self.store.journal is not None:
+            stats['journal'] = self.store.journal.stats()
+        if self.compactor is not None:
+            stats['compaction'] = self.compactor.stats()
+        return stats
+
+    def _command_changes(self, request):
+        # {"since": 41, "limit": 1000, "wait": 30}: entries after seq 41, waiting up to 30s for the first one
+        try:
+            since = int(request.get('since') or 0)
+            limit = int(request.get('limit') or 1000)
+            wait = float(request.get('wait') or 0)
+        except (TypeError, ValueError):
+            raise CommandError(message="'since', 'limit' and 'wait' must be numbers.")
+
+        if wait > 0:
+            self.feed.wait(since, timeout=wait)
+        return {'last_seq': self.feed.last_seq, 'changes': list(self.feed.read(since, limit))}
+
+    def _command_flush(self, request):
+        self._commit()
+        self.store.sync()
+        return self.commits
+
+    def _command_shutdown(self, request):
+        self.shutdown()
+        return 'bye'
+
+
+class NamespaceDaemon:
+    """
+    Serves many namespaced lists (see namespaces.py) from one process.
+
+    Requests name their list, {"namespace": "alice/work", "command": ...}, and
+    run on that list's own TaskDaemon, taken from a shared StorePool: lists
+    work in parallel, each under its own lock. One background thread commits
+    every open list each `commit_interval` seconds, closes idle ones and keeps
+    all of them inside the `max_memory` budget. With `journal`, every list is
+    journaled and one shared compactor thread compacts them. In durability
+    'group' all lists share one GroupCommit, so their fsyncs are batched together.
+    """
+
+    # Answered by the daemon itself rather than a list
+    OWN_COMMANDS = ('ping', 'lists', 'shutdown')
+
+    def __init__(self, root, socket_path=DEFAULT_SOCKET, commit_interval=0.05, max_open=64, idle_timeout=None,
+                 max_memory=None, compactor=None, durability='flush', group_commit=None, duplicates='warn',
+                 bloom_archive=False):
+        self.root = root
+        self.socket_path = socket_path
+        self.commit_interval = commit_interval
+        self.budget = None
+        if max_memory is not None:
+            self.budget = MemoryBudget(max_memory)
+        # Lists are journaled when there is a compactor for them
+        self.compactor = compactor
+        self.durability = durability
+        self.group_commit = group_commit
+        if durability == 'group' and group_commit is None:
+            self.group_commit = GroupCommit()
+        self.duplicates = duplicates
+        self.bloom_archive = bloom_archive
+        self.pool = StorePool(self._open_namespace, max_open=max_open, idle_timeout=idle_timeout)
+        self._stopping = threading.Event()
+        self._committer = None
+        self._server = None
+
+    def execute(self, request):
+        check_request(request)
+        command = request.get('command')
+        if command in self.OWN_COMMANDS:
+            return getattr(self, f'_command_{command}')(request)
+
+        if not request.get('namespace'):
+            raise CommandError(message="This daemon serves many lists, name one with 'namespace', e.g. alice/work.")
+        try:
+            namespace = parse_namespace(request['namespace'])
+        except NamespaceError as e:
+            raise CommandError(message=e.message)
+        try:
+            with self.pool.open(namespace) as task_daemon:
+                return task_daemon.execute(request)
+        except JournaledStoreError as e:
+            raise CommandError(message=e.message)
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self._server = _unix_server(self.socket_path, self)
+        self._committer = threading.Thread(target=self._commit_loop, name='todo-committer', daemon=True)
+        self._committer.start()
+        if self.compactor is not None:
+            self.compactor.start()
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stopping.set()
+            self._committer.join()
+            if self.compactor is not None:
+                self.compactor.stop()
+            self.pool.close()
+            self._server.server_close()
+            os.unlink(self.socket_path)
+
+    def shutdown(self):
+        threading.Thread(target=self._server.shutdown).start()
+
+    def _open_namespace(self, namespace):
+        tasks_file, complete_tasks_file = namespace_files(self.root, namespace)
+        store = TaskStore(tasks_file, complete_tasks_file, journal=self.compactor is not None,
+                          durability=self.durability, group_commit=self.group_commit)
+        store.bloom_archive = self.bloom_archive
+        task_daemon = TaskDaemon(store, socket_path=None, commit_interval=self.commit_interval,
+                                 compactor=self.compactor, duplicates=self.duplicates)
+        # One budget across every open list
+        task_daemon.store.budget = self.budget
+        return task_daemon
+
+    def _commit_loop(self):
+        while not self._stopping.wait(self.commit_interval):
+            task_daemons = self.pool.entries()
+            for task_daemon in task_daemons:
+                task_daemon.flush()
+            self.pool.evict_idle()
+            if self.budget is not None:
+                # Lists busy with a request are skipped until the next round
+                locks = {id(task_daemon.store): task_daemon._lock for task_daemon in task_daemons}
+                self.budget.enforce(lock_for=lambda store: locks.get(id(store)))
+
+    def _command_ping(self, request):
+        return 'pong'
+
+    def _command_lists(self, request):
+        stats = dict(self.pool.stats(), namespaces=self.pool.namespaces())
+        if self.budget is not None:
+            stats['memory'] = self.budget.stats()
+        if self.compactor is not None:
+            stats['compaction'] = self.compactor.stats()
+        if self.group_commit is not None:
+            stats['group_commit'] = self.group_commit.stats()
+        return stats
+
+    def _command_shutdown(self, request):
+        self.shutdown()
+        return 'bye'
+
+
+def _unix_server(socket_path, task_daemon):
+    # socketserver is only loaded by a process that serves, clients never need it
+    import socketserver
+
+    class TaskServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self):
+            self.task_daemon = task_daemon
+            super().__init__(socket_path, RequestHandler)
+
+    class RequestHandler(_RequestHandling, socketserver.StreamRequestHandler):
+        pass
+
+    return TaskServer()
+
+
+class _RequestHandling:
+    # Mixed into the socket server's request handler, see _unix_server()
+    def handle(self):
+        # One connection may send any number of newline-delimited requests
+        for line in self.rfile:
+            try:
+                response = {'ok': True, 'result': self.server.task_daemon.execute(json.loads(line))}
+            except CommandError as e:
+                response = {'ok': False, 'error': e.message}
+            except json.JSONDecodeError:
+                response = {'ok': False, 'error': 'Malformed JSON request.'}
+            except Exception:
+                # A bug in one command must not drop the connection
+                response = {'ok': False, 'error': INTERNAL_ERROR}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class TaskClient:
+    """Persistent connection to a running daemon."""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+        self._file = self._socket.makefile('rwb')
+
+    def request(self, command, **arguments):
+        self._file.write(json.dumps(dict(arguments, command=command)).encode() + b'\n')
+        self._file.flush()
+
+        response = json.loads(self._file.readline())
+        if not response['ok']:
+            raise CommandError(message=response['error'])
+        return response['result']
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _print_result(command, result):
+    if command in ('list', 'next', 'overdue', 'due', 'ready'):
+        if not result:
+            print('The list is empty!')
+        for index, task in enumerate(result, start=1):
+            # Active task ids are their list numbers, also in filtered and scheduler views
+            number = task['task_id'] if 'priority' in task else index
+            detail = task.get('priority') or f"completed {task.get('completed_at')}"
+            extra = f" (Due: {task['due_at']})" if task.get('due_at') else ''
+            extra += f" (Repeats: {task['recurrence']})" if task.get('recurrence') else ''
+            extra += ''.join(f' #{tag}' for tag in (task.get('tags') or '').split())
+            extra += f" @{task['project']}" if task.get('project') else ''
+            print(f"{number}. {task['task']} [{detail}] (Created: {task['created_at']}){extra}")
+    elif command == 'search':
+        for task in result['results']:
+            print(f"[{task['status'].title()}] {task['task']} (Created: {task['created_at']})")
+        if result['explain']:
+            print(result['explain'])
+    elif command == 'suggest':
+        for text in result:
+            print(text)
+    elif command == 'dedupe':
+        for group in result['groups']:
+            print(f"{len(group)}x {group[0]['task']}")
+            for task in group:
+                number = task['task_id'] if task['status'] == 'active' else '-'
+                print(f"   {number}. [{task['status'].title()}] {task['task']} (Created: {task['created_at']})")
+        deleted = f", {result['deleted']} tasks deleted" if result['deleted'] else ''
+        print(f"{len(result['groups'])} duplicate groups{deleted}")
+    elif command == 'report' and 'weeks' in result:
+        from rollups import Rollups
+        print(Rollups.format_heatmap(result))
+    elif command == 'changes':
+        for entry in result['changes']:
+            print(json.dumps(entry, ensure_ascii=False))
+    elif isinstance(result, (dict, list)):
+        print(json.dumps(result, indent=2))
+    else:
+        print(result)
+
+
+def _print_compaction(journal, report):
+    print(f"Compacted {report['segments']} segment(s) of {journal.directory}: "
+          f"{format_size(max(report['reclaimed'], 0))} reclaimed in {report['seconds'] * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='todo', description='To-do list daemon and client.')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Unix socket path (default: %(default)s)')
+    parser.add_argument('--namespace', '-n', help='List to use on a daemon serving --root, e.g. alice/work')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='Run the daemon')
+    serve.add_argument('--tasks-file', default='tasks.csv')
+    serve.add_argument('--complete-tasks-file', default='complete_tasks.csv')
+    serve.add_argument('--commit-interval', type=float, default=50, help='Group commit interval in ms')
+    serve.add_argument('--commit-batch', type=int, default=256, help='Commit as soon as this many mutations are pending')
+    serve.add_argument('--feed-file', help='Change feed file (default: changes.jsonl next to the tasks file)')
+    serve.add_argument('--max-memory', type=parse_size, help='Memory budget for loaded lists and indexes, e.g. 256MB')
+    serve.add_argument('--root', help=f'Serve the namespaced lists under this directory (e.g. {DEFAULT_ROOT}) '
+                                      'instead of a single tasks file')
+    serve.add_argument('--max-open', type=int, default=64, help='Lists kept open in memory with --root')
+    serve.add_argument('--idle-timeout', type=float, help='Close lists unused for this many seconds with --root')
+    serve.add_argument('--journal', action='store_true',
+                       help='Append changes to a journal next to the tasks file instead of rewriting the CSV files')
+    serve.add_argument('--compact-garbage', type=float, default=0.5,
+                       help='With --journal, compact once this share of the journal is garbage (default: %(default)s)')
+    serve.add_argument('--compact-segments', type=int, default=8,
+                       help='With --journal, compact once there are more segments than this (default: %(default)s)')
+    serve.add_argument('--durability', default='flush', choices=DURABILITY_MODES,
+                       help="none: write on shutdown/flush only, flush: write every commit, fsync: fsync every "
+                            "commit, group: fsync every --fsync-interval ms or --fsync-batch changes "
+                            "(default: %(default)s)")
+    serve.add_argument('--fsync-interval', type=float, default=50, help='Group fsync interval in ms')
+    serve.add_argument('--fsync-batch', type=int, default=256, help='Group fsync as soon as this many changes wait')
+    serve.add_argument('--duplicates', default='warn', choices=DUPLICATE_POLICIES,
+                       help='Adds and edits duplicating a task: allow, warn (flag them) or reject')
+    serve.add_argument('--bloom-archive', action='store_true',
+                       help='Check completed tasks for duplicates with a Bloom filter instead of their texts')
+
+    add = commands.add_parser('add', help='Add a task')
+    add.add_argument('text')
+    add.add_argument('--priority', default='medium', choices=PRIORITIES)
+    add.add_argument('--due', help='YYYY-MM-DD [HH:MM], today, tomorrow or +3d')
+    add.add_argument('--repeat', help="daily, weekly, 'every 3 days' or 'cron 0 9 * * 1-5'")
+    add.add_argument('--tags', help="Space or comma separated, e.g. 'home urgent'")
+    add.add_argument('--project')
+    add.add_argument('--duplicates', choices=DUPLICATE_POLICIES, help="Override the daemon's duplicates policy")
+
+    for name in ('complete', 'delete'):
+        commands.add_parser(name, help=f'{name.title()} a task by number').add_argument('number', type=int)
+
+    edit = commands.add_parser('edit', help='Edit a task by number')
+    edit.add_argument('number', type=int)
+    edit.add_argument('--text', default='')
+    edit.add_argument('--priority', default='', choices=('',) + PRIORITIES)
+    edit.add_argument('--due', help="New due date, '' removes it")
+    edit.add_argument('--repeat', help="New repeat rule, '' stops repeating")
+    edit.add_argument('--tags', help="Replace the tags, '' removes them")
+    edit.add_argument('--project', help="Move to a project, '' removes it")
+    edit.add_argument('--duplicates', choices=DUPLICATE_POLICIES, help="Override the daemon's duplicates policy")
+
+    bulk = commands.add_parser('bulk', help='Delete, complete or edit many tasks in one commit')
+    bulk.add_argument('action', choices=('delete', 'complete', 'edit'))
+    bulk.add_argument('selection', help='Task numbers and ranges like "3-40,55,70-" or a query like "priority:low"')
+    bulk.add_argument('--text', default='')
+    bulk.add_argument('--priority', default='', choices=('',) + PRIORITIES)
+    bulk.add_argument('--due', help="New due date, '' removes it")
+    bulk.add_argument('--tags', help="Replace the tags, '' removes them")
+    bulk.add_argument('--project', help="Move to a project, '' removes it")
+
+    list_parser = commands.add_parser('list', help='List active or completed tasks')
+    list_parser.add_argument('--completed', action='store_const', const='completed', dest='status', default='active')
+    list_parser.add_argument('--tag', help="Tag expression, e.g. 'home and (urgent or today) and not later'")
+    list_parser.add_argument('--project', dest='in_project')
+    list_parser.add_argument('--sort', help="Sort keys, e.g. 'priority,-created,text' ('-' for descending)")
+    list_parser.add_argument('--limit', type=int, help='Only the first N tasks')
+
+    commands.add_parser('search', help='Run a query, e.g. "priority:high deploy"').add_argument('query')
+
+    commands.add_parser('next', help='Most urgent tasks by due date, priority and age').add_argument(
+        '--count', type=int, default=5)
+    commands.add_parser('overdue', help='Tasks past their due date')
+    commands.add_parser('due', help='Tasks due soon').add_argument('--within', default='1d', help='e.g. 12h, 3d, 2w')
+
+    subtask = commands.add_parser('subtask', help='Add a subtask to a task by number')
+    subtask.add_argument('number', type=int)
+    subtask.add_argument('text')
+    subtask.add_argument('--priority', default='', choices=('',) + PRIORITIES, help="Default: the parent's")
+    subtask.add_argument('--due', help='YYYY-MM-DD [HH:MM], today, tomorrow or +3d')
+    subtask.add_argument('--tags', help="Space or comma separated, e.g. 'home urgent'")
+    subtask.add_argument('--project')
+
+    for name, help_text in (('block', 'Make task NUMBER wait for task BLOCKER'), ('unblock', 'Remove a blocker')):
+        blocking = commands.add_parser(name, help=help_text)
+        blocking.add_argument('number', type=int)
+        blocking.add_argument('blocker', type=int)
+
+    commands.add_parser('ready', help='Active tasks nothing is blocking')
+
+    suggest = commands.add_parser('suggest', help='Complete a task text from the ones used before')
+    suggest.add_argument('prefix')
+    suggest.add_argument('--count', type=int, default=5)
+
+    dedupe = commands.add_parser('dedupe', help='Find groups of duplicate tasks')
+    dedupe.add_argument('--delete', action='store_true', help='Delete all active duplicates but the first of a group')
+
+    report = commands.add_parser('report', help='Trends from the daily rollups')
+    report.add_argument('kind', nargs='?', default='daily', choices=('daily', 'week', 'month', 'heatmap'))
+    report.add_argument('--last', type=int, help='Days, weeks or months to show')
+
+    changes = commands.add_parser('changes', help='Print change feed entries after a sequence number')
+    changes.add_argument('--since', type=int, default=0)
+    changes.add_argument('--limit', type=int, default=1000)
+    changes.add_argument('--wait', type=float, default=0, help='Seconds to wait for a new entry')
+    for name in ('clear', 'undo', 'redo', 'stats', 'flush', 'ping', 'lists', 'shutdown'):
+        commands.add_parser(name)
+
+    args = parser.parse_args(argv)
+
+    compactor = None
+    if args.command == 'serve' and args.journal:
+        from journal import Compactor
+        compactor = Compactor(garbage_ratio=args.compact_garbage, max_segments=args.compact_segments,
+                              on_compacted=_print_compaction)
+
+    group_commit = None
+    if args.command == 'serve' and args.durability == 'group':
+        group_commit = GroupCommit(interval=args.fsync_interval / 1000, max_ops=args.fsync_batch)
+
+    if args.command == 'serve' and args.root:
+        task_daemon = NamespaceDaemon(args.root, args.socket, commit_interval=args.commit_interval / 1000,
+                                      max_open=args.max_open, idle_timeout=args.idle_timeout,
+                                      max_memory=args.max_memory, compactor=compactor,
+                                      durability=args.durability, group_commit=group_commit,
+                                      duplicates=args.duplicates, bloom_archive=args.bloom_archive)
+        print(f'Serving the lists under {args.root} on {args.socket}')
+        try:
+            task_daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.command == 'serve':
+        try:
+            store = TaskStore(args.tasks_file, args.complete_tasks_file, journal=args.journal,
+                              durability=args.durability, group_commit=group_commit)
+        except JournaledStoreError as e:
+            print(e.message, file=sys.stderr)
+            return 1
+        store.bloom_archive = args.bloom_archive
+        task_daemon = TaskDaemon(store, args.socket, commit_interval=args.commit_interval / 1000,
+                                 commit_batch=args.commit_batch, feed_file=args.feed_file,
+                                 max_memory=args.max_memory, compactor=compactor, duplicates=args.duplicates)
+        print(f'Serving {args.tasks_file} on {args.socket}')
+        try:
+            task_daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    arguments = {key: value for key, value in vars(args).items() if key not in ('socket', 'command')}
+    if not args.namespace:
+        del arguments['namespace']
+    try:
+        with TaskClient(args.socket) as client:
+            _print_result(args.command, client.request(args.command, **arguments))
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No daemon is listening on {args.socket}. Start one with 'serve'.", file=sys.stderr)
+        return 1
+    except CommandError as e:
+        print(e.message, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
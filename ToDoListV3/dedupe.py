@@ -0,0 +1,193 @@
+"""
+Duplicate task detection.
+
+Two tasks are duplicates when their text is the same after folding case,
+Unicode forms and whitespace: 'Buy  milk' and 'buy milk' are one task. A
+store's `duplicates` (a DuplicateIndex) keeps the folded text of every task
+in hash tables maintained from the change events, so checking an add or an
+edit costs one lookup whatever the size of the lists. The completed archive
+can instead go into a Bloom filter (TaskStore.bloom_archive), a fixed
+bit array much smaller than the texts; it answers 'probably done before',
+with about 1% false positives and none missed.
+
+What to do with a duplicate is up to the caller, see DUPLICATE_POLICIES.
+find_duplicates() groups the duplicates already in a store in one pass.
+"""
+import math
+import unicodedata
+
+
+# What adds and edits do with a duplicate: go ahead, go ahead and say so, or refuse
+DUPLICATE_POLICIES = ('allow', 'warn', 'reject')
+BLOOM_ERROR_RATE = 0.01
+
+
+def normalize_text(text):
+    # 'Buy  Milk ' -> 'buy milk', the key duplicates share
+    return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+
+def find_duplicates(tasks, complete_tasks):
+    """
+    Groups of duplicate tasks, largest first: [[(status, task), ...], ...]
+    in list order, active tasks before completed ones.
+    """
+    groups = {}
+    for status, rows in (('active', tasks), ('completed', complete_tasks)):
+        for task in rows:
+            groups.setdefault(normalize_text(task['task']), []).append((status, task))
+    return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+
+def describe_duplicate(match):
+    # ('active', task) / ('completed', task) / ('completed', None) from the Bloom filter
+    status, task = match
+    if task is None:
+        return 'probably a completed task'
+    if status == 'active':
+        return f"active task {task['task_id']}: {task['task']}"
+    return f"completed task: {task['task']}"
+
+
+class BloomFilter:
+    """Set membership in `size` bits: no false negatives, about `error_rate` false positives up to `capacity` keys."""
+
+    __slots__ = ('capacity', 'size', 'hashes', 'count', '_bits')
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def __len__(self):
+        return len(self._bits)
+
+    def __contains__(self, key):
+        bits = self._bits
+        return all(bits[bit >> 3] & (1 << (bit & 7)) for bit in self._positions(key))
+
+    def add(self, key):
+        for bit in self._positions(key):
+            self._bits[bit >> 3] |= 1 << (bit & 7)
+        self.count += 1
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        import hashlib  # Loads OpenSSL, kept off the startup path of every store
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+
+class DuplicateIndex:
+    """
+    Folded text -> tasks of one store, kept current from its change events.
+
+    Tasks are kept per key, so a match names the task it duplicates. With
+    `bloom` completed tasks only go into a Bloom filter instead, which
+    cannot forget a task moved back by an undo: it may still warn about
+    it, it never misses one.
+    """
+
+    __slots__ = ('_store', 'bloom', '_active', '_completed')
+
+    def __init__(self, store, bloom=False):
+        self._store = store
+        self.bloom = bloom
+        self._active = {}
+        self._completed = None
+        store.subscribe(self._apply)
+        self._rebuild()
+
+    def __len__(self):
+        # Keys held, for the memory budget
+        return len(self._active) + (0 if self.bloom else len(self._completed))
+
+    @property
+    def bloom_bytes(self):
+        return len(self._completed) if self.bloom else 0
+
+    def check(self, text, ignore=None):
+        """The task `text` would duplicate as (status, task), or None. `ignore` is the task being edited."""
+        key = normalize_text(text)
+        for task in self._active.get(key, {}).values():
+            if task is not ignore:
+                return 'active', task
+        if self.bloom:
+            return ('completed', None) if key in self._completed else None
+        completed = self._completed.get(key)
+        return ('completed', next(iter(completed.values()))) if completed else None
+
+    @staticmethod
+    def _add(rows, task, text=None):
+        # key -> {id(task): task}, in insertion order; a group can hold thousands
+        rows.setdefault(normalize_text(task['task'] if text is None else text), {})[id(task)] = task
+
+    @staticmethod
+    def _remove(rows, task, text=None):
+        key = normalize_text(task['task'] if text is None else text)
+        tasks = rows.get(key)
+        if tasks is not None:
+            tasks.pop(id(task), None)
+            if not tasks:
+                del rows[key]
+
+    def _add_completed(self, task):
+        if not self.bloom:
+            self._add(self._completed, task)
+        elif self._completed.count >= self._completed.capacity:
+            self._completed = self._new_filter()  # Full, false positives would climb: size a new one
+        else:
+            self._completed.add(normalize_text(task['task']))
+
+    def _remove_completed(self, task):
+        # Bloom filter bits are shared, see the class docstring
+        if not self.bloom:
+            self._remove(self._completed, task)
+
+    def _new_filter(self):
+        complete_tasks = self._store.complete_tasks
+        bloom = BloomFilter(max(2 * len(complete_tasks), 1024))
+        for task in complete_tasks:
+            bloom.add(normalize_text(task['task']))
+        return bloom
+
+    def _rebuild(self):
+        tasks, complete_tasks = self._store.tasks, self._store.complete_tasks
+        self._active = {}
+        for task in tasks:
+            self._add(self._active, task)
+        if self.bloom:
+            self._completed = self._new_filter()
+        else:
+            self._completed = {}
+            for task in complete_tasks:
+                self._add(self._completed, task)
+
+    def _apply(self, event):
+        match event['op']:
+            case 'batch':
+                for child in event['events']:
+                    self._apply(child)
+            case 'add':
+                self._add(self._active, event['task'])
+            case 'delete':
+                self._remove(self._active, event['task'])
+            case 'edit':
+                self._remove(self._active, event['task'], event['old']['task'])
+                self._add(self._active, event['task'])
+            case 'complete':
+                self._remove(self._active, event['task'])
+                self._add_completed(event['task'])
+            case 'uncomplete':
+                self._remove_completed(event['task'])
+                self._add(self._active, event['task'])
+            case 'clear':
+                self._active.clear()
+            case 'restore':
+                for task in event['tasks']:
+                    self._add(self._active, task)
+            case 'reload':
+                self._rebuild()
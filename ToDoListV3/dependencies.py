@@ -0,0 +1,242 @@
+"""
+Subtasks and blocked-by dependencies.
+
+Links use the stable `uid` column: a subtask stores its parent's uid in
+`parent`, a blocked task the uids of its blockers in `blocked_by`. Both are
+edges "X must finish before Y": a parent waits for its unfinished subtasks
+just like a task waits for its blockers.
+"""
+from exceptions import DependencyCycleError
+
+
+class TaskGraph:
+    """
+    Dependency graph over the tasks, kept current from store events.
+
+    Every active task carries the number of its unfinished blockers; tasks at
+    zero are kept in `_ready`, so listing them is O(ready). Completing or
+    deleting a task only touches its direct dependents.
+    """
+
+    __slots__ = ('_store', '_tasks', '_links', '_blockers', '_dependents', '_active', '_pending', '_ready')
+
+    def __init__(self, store):
+        self._store = store
+        store.subscribe(self._apply)
+        self._rebuild()
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def ready(self):
+        # Active tasks with no unfinished blocker, in the order they became ready
+        return [self._tasks[uid] for uid in self._ready]
+
+    def blocked(self):
+        return [self._tasks[uid] for uid, count in self._pending.items() if count]
+
+    def pending(self, task):
+        return self._pending.get(task.get('uid'), 0)
+
+    def blockers(self, task):
+        # Unfinished tasks `task` is waiting for
+        return [self._tasks[uid] for uid in self._blockers.get(task.get('uid'), ()) if uid in self._active]
+
+    def subtasks(self, task):
+        uid = task.get('uid')
+        return [self._tasks[child] for child in self._dependents.get(uid, ())
+                if child in self._tasks and self._tasks[child].get('parent') == uid]
+
+    def would_cycle(self, blocker, dependent):
+        # Adding blocker -> dependent closes a cycle if dependent already leads to blocker
+        unseen = {}
+        for event in self._store.batch_events:
+            # Rows linked earlier in the open batch, the graph only hears of them when it ends
+            if event['op'] in ('add', 'edit', 'restore'):
+                for task in event.get('tasks') or [event['task']]:
+                    for edge_blocker, edge_dependent in self._edges(task):
+                        unseen.setdefault(edge_blocker, set()).add(edge_dependent)
+
+        target, stack, seen = blocker['uid'], [dependent['uid']], set()
+        while stack:
+            uid = stack.pop()
+            if uid == target:
+                return True
+            if uid not in seen:
+                seen.add(uid)
+                stack.extend(self._dependents.get(uid, ()))
+                stack.extend(unseen.get(uid, ()))
+        return False
+
+    @staticmethod
+    def _edges(task):
+        # (blocker uid, dependent uid) pairs stored on a task
+        uid = task.get('uid')
+        if not uid:
+            return []
+        edges = [(blocker, uid) for blocker in (task.get('blocked_by') or '').split()]
+        if task.get('parent'):
+            edges.append((uid, task['parent']))
+        return edges
+
+    def _add_edge(self, blocker, dependent):
+        # Both ends can store the same edge (a subtask also listed in its parent's blocked_by)
+        references = self._blockers.setdefault(dependent, {})
+        references[blocker] = references.get(blocker, 0) + 1
+        if references[blocker] > 1:
+            return
+        self._dependents.setdefault(blocker, set()).add(dependent)
+        if blocker in self._active and dependent in self._active:
+            self._pending[dependent] += 1
+            self._ready.pop(dependent, None)
+
+    def _remove_edge(self, blocker, dependent):
+        references = self._blockers.get(dependent, {})
+        if blocker not in references:
+            return
+        references[blocker] -= 1
+        if references[blocker]:
+            return
+        del references[blocker]
+        self._dependents[blocker].discard(dependent)
+        if blocker in self._active and dependent in self._active:
+            self._unblock(dependent)
+
+    def _unblock(self, uid):
+        self._pending[uid] -= 1
+        if not self._pending[uid]:
+            self._ready[uid] = None
+
+    def _activate(self, uid):
+        self._active.add(uid)
+        self._pending[uid] = sum(1 for blocker in self._blockers.get(uid, ()) if blocker in self._active)
+        if not self._pending[uid]:
+            self._ready[uid] = None
+        for dependent in self._dependents.get(uid, ()):
+            if dependent in self._active:
+                self._pending[dependent] += 1
+                self._ready.pop(dependent, None)
+
+    def _deactivate(self, uid):
+        if uid not in self._active:
+            return
+        self._active.discard(uid)
+        self._pending.pop(uid, None)
+        self._ready.pop(uid, None)
+        for dependent in self._dependents.get(uid, ()):
+            if dependent in self._active:
+                self._unblock(dependent)
+
+    def _insert(self, task, active=True):
+        uid = task.get('uid')
+        if not uid:
+            return
+        if uid in self._links:
+            # Linked already, e.g. by an earlier edit of the same batch: events carry the live row
+            self._remove(uid)
+        self._tasks[uid] = task
+        self._links[uid] = self._edges(task)
+        for blocker, dependent in self._links[uid]:
+            self._add_edge(blocker, dependent)
+        if active:
+            self._activate(uid)
+
+    def _remove(self, uid):
+        # Undo exactly the edges _insert() added for `uid`, whatever the row holds by now
+        if not uid:
+            return
+        self._deactivate(uid)
+        for blocker, dependent in self._links.pop(uid, ()):
+            self._remove_edge(blocker, dependent)
+        self._tasks.pop(uid, None)
+
+    def _rebuild(self):
+        self._tasks = {}
+        # uid -> the (blocker uid, dependent uid) edges linked for that task
+        self._links = {}
+        # uid -> {blocker uid: reference count} / uids waiting for it
+        self._blockers = {}
+        self._dependents = {}
+        self._active = set()
+        self._pending = {}
+        # Insertion ordered set of ready uids
+        self._ready = {}
+
+        for task in self._store.complete_tasks:
+            self._insert(task, active=False)
+        for task in self._store.tasks:
+            self._insert(task)
+
+    def _apply(self, event):
+        match event['op']:
+            case 'batch':
+                for child in event['events']:
+                    self._apply(child)
+            case 'add':
+                self._insert(event['task'])
+            case 'uncomplete':
+                if event['task'].get('uid'):
+                    self._activate(event['task']['uid'])
+            case 'complete':
+                if event['task'].get('uid'):
+                    self._deactivate(event['task']['uid'])
+            case 'delete':
+                self._remove(event['task'].get('uid'))
+            case 'edit':
+                old, task = event['old'], event['task']
+                if any(old.get(field, '') != (task.get(field) or '') for field in ('uid', 'parent', 'blocked_by')):
+                    # Unlink the task as the graph knows it, then link it as it is now
+                    self._remove(old.get('uid', task.get('uid')))
+                    self._insert(task)
+            case 'clear':
+                for task in event['tasks']:
+                    self._remove(task.get('uid'))
+            case 'restore':
+                for task in event['tasks']:
+                    self._insert(task)
+            case 'reload':
+                self._rebuild()
+
+
+def _uid(store, position):
+    # Tasks created before uids existed get one when first linked
+    task = store.tasks[position]
+    if not task.get('uid'):
+        from store import new_uid
+        store.edit(position, uid=new_uid())
+    return task['uid']
+
+
+def add_subtask(store, parent_position, text, priority, **optional):
+    """Add a new task as a subtask of the task at `parent_position`."""
+    with store.batch():
+        return store.add(text, priority, parent=_uid(store, parent_position), **optional)
+
+
+def add_blocker(store, position, blocker_position):
+    """Mark the task at `position` as blocked by the one at `blocker_position`."""
+    tasks = store.tasks
+    if position == blocker_position:
+        raise DependencyCycleError(message='A task cannot block itself.')
+
+    with store.batch():
+        uid, blocker_uid = _uid(store, position), _uid(store, blocker_position)
+        if store.graph.would_cycle(tasks[blocker_position], tasks[position]):
+            raise DependencyCycleError(
+                message=f"Task {blocker_position + 1} already waits for task {position + 1}, that would be a cycle.")
+
+        blocked_by = (tasks[position].get('blocked_by') or '').split()
+        if blocker_uid not in blocked_by:
+            store.edit(position, blocked_by=' '.join(blocked_by + [blocker_uid]))
+    return tasks[position]
+
+
+def remove_blocker(store, position, blocker_position):
+    """Drop the task at `blocker_position` from the blockers of the one at `position`."""
+    tasks = store.tasks
+    blocker_uid = tasks[blocker_position].get('uid')
+    blocked_by = (tasks[position].get('blocked_by') or '').split()
+    if blocker_uid in blocked_by:
+        blocked_by.remove(blocker_uid)
+        store.edit(position, blocked_by=' '.join(blocked_by))
+    return tasks[position]
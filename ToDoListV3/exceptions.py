@@ -17,4 +17,39 @@ class ZeroUserInput(Exception):
 
 class NegetiveInputNumber(Exception):
     def __init__(self, message):
-        self.message = message
\ No newline at end of file
+        self.message = message
+
+
+class QuerySyntaxError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class CommandError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class InvalidDateError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class InvalidRecurrenceError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class DependencyCycleError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class NamespaceError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class JournaledStoreError(Exception):
+    def __init__(self, message):
+        self.message = message
@@ -0,0 +1,445 @@
+"""
+Append-only journal mode for a TaskStore (opt-in: TaskStore(..., journal=True)).
+
+Instead of rewriting both CSV files on every commit, a journaled store appends
+the changes made since the last commit to the current journal segment. The
+lists are a base snapshot plus the segments replayed in order:
+
+    tasks.journal/MANIFEST                  {"base": 3, "segments": [4, 5], "next": 6}
+    tasks.journal/base-000003-active.csv
+    tasks.journal/base-000003-completed.csv
+    tasks.journal/segment-000004.jsonl
+    tasks.journal/segment-000005.jsonl      <- commits append here
+
+Journal entries are the store's change events (see TaskStore.subscribe), one
+JSON line each. A segment is sealed once it grows past `segment_bytes`.
+Compaction folds the base and the sealed segments into a new base in the
+background and swaps it in by replacing the MANIFEST, while commits keep
+appending to the open segment.
+
+A journaled store is owned by one process (the daemon). The CSV files it
+started from stop changing, so a store without journal=True refuses to open
+them while the journal exists; `python journal.py release` writes the
+journal back to them and removes it.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+from store import TASK_FIELDS, COMPLETE_TASK_FIELDS, journal_dir, journaled
+
+
+MANIFEST = 'MANIFEST'
+SEGMENT_BYTES = 4 * 1024 * 1024
+
+
+def read_journal(tasks_file):
+    """
+    (tasks, complete_tasks) as of the last commit of a journaled store, read
+    without taking the journal over from the process that owns it.
+    """
+    directory = journal_dir(tasks_file)
+    manifest = None
+    while True:
+        with open(os.path.join(directory, MANIFEST)) as file:
+            latest = json.load(file)
+        try:
+            tasks, complete_tasks, _ = _read_lists(directory, latest['base'], latest['segments'])
+            return tasks, complete_tasks
+        except FileNotFoundError:
+            if latest == manifest:
+                raise
+            manifest = latest  # Compacted away meanwhile, read the new manifest
+
+
+def release(tasks_file, complete_tasks_file):
+    """
+    Write a journaled store back to its CSV files and remove the journal.
+    The process owning the journal must be stopped first. Returns the
+    active and completed row counts.
+    """
+    tasks, complete_tasks = read_journal(tasks_file)
+    _write_rows(tasks_file, tasks, TASK_FIELDS)
+    _write_rows(complete_tasks_file, complete_tasks, COMPLETE_TASK_FIELDS)
+    shutil.rmtree(journal_dir(tasks_file))
+    return len(tasks), len(complete_tasks)
+
+
+def _base_name(number, name):
+    return f'base-{number:06d}-{name}.csv'
+
+
+def _segment_name(number):
+    return f'segment-{number:06d}.jsonl'
+
+
+def _read_lists(directory, base, segments):
+    # The base snapshot plus the segments replayed on it; returns (tasks, complete_tasks, entries replayed)
+    tasks = _read_rows(os.path.join(directory, _base_name(base, 'active')))
+    complete_tasks = _read_rows(os.path.join(directory, _base_name(base, 'completed')))
+    entries = sum(_replay(os.path.join(directory, _segment_name(segment)), tasks, complete_tasks)
+                  for segment in segments)
+    for task_id, task in enumerate(tasks, start=1):
+        task['task_id'] = task_id
+    return tasks, complete_tasks, entries
+
+
+def apply_event(tasks, complete_tasks, event):
+    """Replay one change event on plain lists. Active task ids are renumbered by the caller."""
+    match event['op']:
+        case 'batch':
+            # uncomplete_many() numbers its rows as they were before the batch,
+            # shift them by the ones already moved back in front of them
+            moved = []
+            for child in event['events']:
+                if child['op'] == 'uncomplete':
+                    position = child['complete_position']
+                    child = dict(child, complete_position=position - sum(1 for done in moved if done < position))
+                    moved.append(position)
+                apply_event(tasks, complete_tasks, child)
+        case 'add':
+            tasks.insert(event['position'], event['task'])
+        case 'delete':
+            del tasks[event['position']]
+        case 'complete':
+            del tasks[event['position']]
+            complete_tasks.append(event['task'])
+        case 'uncomplete':
+            del complete_tasks[event['complete_position']]
+            tasks.insert(event['position'], event['task'])
+        case 'edit':
+            tasks[event['position']] = event['task']
+        case 'clear':
+            tasks.clear()
+        case 'restore':
+            tasks.extend(event['tasks'])
+
+
+def _read_rows(path):
+    with open(path, 'r', newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def _write_rows(path, rows, fields):
+    # Written under a temporary name, so a crash never leaves half a file behind
+    temporary = path + '.tmp'
+    with open(temporary, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def _replay(path, tasks, complete_tasks):
+    # Apply a segment's entries; returns how many there were
+    count = 0
+    with open(path, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                break  # Torn write at the end of the open segment
+            apply_event(tasks, complete_tasks, json.loads(line))
+            count += 1
+    return count
+
+
+class Journal:
+    """Base snapshot plus append-only segments of one store, see the module docstring."""
+
+    __slots__ = ('directory', 'segment_bytes', 'entries', 'rows', '_manifest', '_file', '_pending', '_unclaimed',
+                 '_lock', '_compacting')
+
+    def __init__(self, tasks_file, complete_tasks_file, segment_bytes=SEGMENT_BYTES):
+        self.directory = journal_dir(tasks_file)
+        self.segment_bytes = segment_bytes
+        # Entries in the segments and live rows, for the garbage ratio
+        self.entries = 0
+        self.rows = 0
+        self._pending = []
+        # The list a load() left behind for the next one, see load()
+        self._unclaimed = None
+        self._lock = threading.Lock()
+        self._compacting = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self._path(MANIFEST)):
+            # First use: the existing CSV files become the first base
+            for path, fields, name in ((tasks_file, TASK_FIELDS, 'active'),
+                                       (complete_tasks_file, COMPLETE_TASK_FIELDS, 'completed')):
+                rows = _read_rows(path) if os.path.exists(path) else []
+                _write_rows(self._base_path(0, name), rows, fields)
+            self._write_manifest({'base': 0, 'segments': [1], 'next': 2})
+
+        with open(self._path(MANIFEST)) as file:
+            self._manifest = json.load(file)
+        self._file = self._open_segment(self._manifest['segments'][-1])
+
+    @property
+    def segments(self):
+        return len(self._manifest['segments'])
+
+    @property
+    def garbage_ratio(self):
+        # Share of the stored records a fresh base would not need
+        return self.entries / (self.entries + self.rows) if self.entries else 0.0
+
+    def load(self, completed=False):
+        """
+        Active (or completed) rows as of the last commit. Both lists come out
+        of one replay, so loading the other list right after is free.
+        """
+        if self._unclaimed is not None and self._unclaimed[0] == completed:
+            rows, self._unclaimed = self._unclaimed[1], None
+            return rows
+
+        tasks, complete_tasks = self.read()
+        self._unclaimed = (not completed, tasks if completed else complete_tasks)
+        return complete_tasks if completed else tasks
+
+    def read(self):
+        while True:
+            with self._lock:
+                base, segments = self._manifest['base'], list(self._manifest['segments'])
+            try:
+                tasks, complete_tasks, entries = self._read(base, segments)
+            except FileNotFoundError:
+                with self._lock:
+                    if self._manifest['base'] == base and self._manifest['segments'][:len(segments)] == segments:
+                        raise
+                continue  # Compacted away meanwhile, read the new manifest
+            self.entries, self.rows = entries, len(tasks) + len(complete_tasks)
+            return tasks, complete_tasks
+
+    def record(self, event):
+        # Store listener: queue the change for the next commit
+        match event['op']:
+            case 'reload':
+                return
+            case 'batch':
+                events = event['events']
+            case _:
+                events = [event]
+
+        # A batch stays one entry, its positions only make sense together
+        self._pending.append(json.dumps({'op': 'batch', 'events': events} if event['op'] == 'batch' else event,
+                                        ensure_ascii=False).encode() + b'\n')
+        for child in events:
+            match child['op']:
+                case 'add':
+                    self.rows += 1
+                case 'delete':
+                    self.rows -= 1
+                case 'clear':
+                    self.rows -= len(child['tasks'])
+                case 'restore':
+                    self.rows += len(child['tasks'])
+        self.entries += 1
+        # A list left over by load() no longer matches
+        self._unclaimed = None
+
+    def commit(self):
+        """Append the queued changes to the open segment, returns its path (None if nothing was queued)."""
+        with self._lock:
+            if not self._pending:
+                return None
+            path = self._file.name
+            self._file.write(b''.join(self._pending))
+            self._file.flush()
+            self._pending.clear()
+            self._unclaimed = None
+            if self._file.tell() >= self.segment_bytes:
+                self._seal()
+            return path
+
+    def sync(self):
+        # fsync the open segment; sealed ones and bases were fsynced when they were written
+        with self._lock:
+            if not self._file.closed:
+                os.fsync(self._file.fileno())
+
+    def compact(self):
+        """
+        Fold the base and all sealed segments into a new base and swap it in.
+        Commits are only held up while the open segment is sealed and while the
+        manifest is replaced. Returns {'segments', 'reclaimed', 'seconds'}, or
+        None once the journal is closed.
+        """
+        with self._compacting:
+            if self._file.closed:
+                return None
+            started = time.perf_counter()
+            with self._lock:
+                # Seal the open segment, commits go to a fresh one meanwhile
+                self._seal()
+                base, sealed = self._manifest['base'], self._manifest['segments'][:-1]
+                number = self._manifest['next']
+                self._write_manifest(dict(self._manifest, next=number + 1))
+
+            old_paths = [self._base_path(base, 'active'), self._base_path(base, 'completed')]
+            old_paths += [self._segment_path(segment) for segment in sealed]
+            before = sum(os.path.getsize(path) for path in old_paths)
+
+            tasks, complete_tasks, entries = self._read(base, sealed)
+            _write_rows(self._base_path(number, 'active'), tasks, TASK_FIELDS)
+            _write_rows(self._base_path(number, 'completed'), complete_tasks, COMPLETE_TASK_FIELDS)
+
+            with self._lock:
+                self._write_manifest(dict(self._manifest, base=number,
+                                          segments=[segment for segment in self._manifest['segments']
+                                                    if segment not in sealed]))
+                self.entries = max(self.entries - entries, 0)
+
+            for path in old_paths:
+                os.remove(path)
+            after = os.path.getsize(self._base_path(number, 'active')) + \
+                os.path.getsize(self._base_path(number, 'completed'))
+            return {'segments': len(sealed), 'reclaimed': before - after, 'seconds': time.perf_counter() - started}
+
+    def stats(self):
+        return {'segments': self.segments, 'entries': self.entries, 'garbage_ratio': round(self.garbage_ratio, 3)}
+
+    def close(self):
+        # Waits for a running compaction, so the directory is never written by two owners
+        with self._compacting, self._lock:
+            self._file.close()
+
+    def _read(self, base, segments):
+        return _read_lists(self.directory, base, segments)
+
+    def _seal(self):
+        # Called with the lock held: start the next segment
+        number = self._manifest['next']
+        self._write_manifest(dict(self._manifest, segments=self._manifest['segments'] + [number], next=number + 1))
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = self._open_segment(number)
+
+    def _open_segment(self, number):
+        file = open(self._segment_path(number), 'ab')
+        # Drop a torn last entry before appending after it
+        with open(self._segment_path(number), 'rb') as segment:
+            end = segment.read().rfind(b'\n') + 1
+        if end != file.tell():
+            file.truncate(end)
+            file.seek(end)
+        return file
+
+    def _write_manifest(self, manifest):
+        temporary = self._path(MANIFEST + '.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(manifest, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self._path(MANIFEST))
+        self._manifest = manifest
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _base_path(self, number, name):
+        return self._path(_base_name(number, name))
+
+    def _segment_path(self, number):
+        return self._path(_segment_name(number))
+
+
+class Compactor:
+    """
+    Background thread compacting journals once their garbage ratio reaches
+    `garbage_ratio` or they have more than `max_segments` segments. Journals
+    with fewer than `min_entries` entries are left alone.
+    """
+
+    __slots__ = ('garbage_ratio', 'max_segments', 'min_entries', 'interval', 'on_compacted', 'runs', 'reclaimed',
+                 'seconds', 'last', '_journals', '_lock', '_stopping', '_thread')
+
+    def __init__(self, garbage_ratio=0.5, max_segments=8, min_entries=1000, interval=1.0, on_compacted=None):
+        self.garbage_ratio = garbage_ratio
+        self.max_segments = max_segments
+        self.min_entries = min_entries
+        self.interval = interval
+        # on_compacted(journal, report) after every compaction
+        self.on_compacted = on_compacted
+        self.runs = 0
+        self.reclaimed = 0
+        self.seconds = 0.0
+        self.last = None
+        self._journals = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def watch(self, journal):
+        with self._lock:
+            self._journals.append(journal)
+
+    def unwatch(self, journal):
+        with self._lock:
+            self._journals.remove(journal)
+
+    def due(self, journal):
+        if journal.segments > self.max_segments:
+            return True
+        return journal.entries >= self.min_entries and journal.garbage_ratio >= self.garbage_ratio
+
+    def check(self):
+        # Compact every watched journal that is due; returns the reports
+        with self._lock:
+            journals = list(self._journals)
+
+        reports = []
+        for journal in journals:
+            if self.due(journal):
+                report = journal.compact()
+                if report is None:
+                    continue  # Closed since
+                self.runs += 1
+                self.reclaimed += report['reclaimed']
+                self.seconds += report['seconds']
+                self.last = report
+                reports.append(report)
+                if self.on_compacted:
+                    self.on_compacted(journal, report)
+        return reports
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='todo-compactor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        return {'runs': self.runs, 'reclaimed': self.reclaimed, 'seconds': round(self.seconds, 3), 'last': self.last}
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.check()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('release',))
+    parser.add_argument('--tasks-file', default='tasks.csv')
+    parser.add_argument('--complete-tasks-file', default='complete_tasks.csv')
+    args = parser.parse_args(argv)
+
+    if not journaled(args.tasks_file):
+        print(f'{args.tasks_file} is not kept in a journal.', file=sys.stderr)
+        return 1
+    active, completed = release(args.tasks_file, args.complete_tasks_file)
+    print(f'Wrote {active} active and {completed} completed tasks to {args.tasks_file} / {args.complete_tasks_file}')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,42 +1,105 @@
-import csv
 import os
-import datetime
-import colorama
-from colorama import Fore, Style
+import sys
+import time
 
-from exceptions import UserOptionInputError, TasksInputOutOfRangeError, NegetiveInputNumber, ZeroUserInput
+from exceptions import UserOptionInputError, TasksInputOutOfRangeError, NegetiveInputNumber, ZeroUserInput, QuerySyntaxError, InvalidDateError, InvalidRecurrenceError, DependencyCycleError, JournaledStoreError
+from changefeed import ChangeFeed
+from durability import DURABILITY_MODES
+from oplog import OperationLog
+from store import TaskStore, now_timestamp
 
 
-class ToDoList:
-    colorama.init()  # Initialize colorama
-    bold = Style.BRIGHT
-    white = Fore.WHITE + bold
-    red = Fore.RED + bold
-    green = Fore.GREEN + bold
-    magenta = Fore.MAGENTA + bold
-    cyan = Fore.CYAN + bold
+ANSI_CLEAR_SCREEN = '\033[2J\033[H'
+
+
+def _colors_enabled():
+    # Plain output when piped or when the user opts out (https://no-color.org)
+    return sys.stdout.isatty() and 'NO_COLOR' not in os.environ
+
+
+def _init_colorama():
+    # Imported on first use so scripted runs never pay for colorama
+    import colorama
+    colorama.init()
+    return colorama
+
+
+class _Color:
+    """Class attribute resolving to a colorama escape sequence on first access."""
+
+    __slots__ = ('_fore', '_attr')
+
+    def __init__(self, fore=None):
+        self._fore = fore
+        self._attr = None
+
+    def __set_name__(self, owner, name):
+        self._attr = name
+
+    def __get__(self, instance, owner):
+        if _colors_enabled():
+            colorama = _init_colorama()
+            value = colorama.Style.BRIGHT
+            if self._fore:
+                value = getattr(colorama.Fore, self._fore) + value
+        else:
+            value = ''
+
+        # Replace the descriptor with the plain string so later lookups are free
+        setattr(owner, self._attr, value)
+        return value
 
-    __slots__ =('__author', '_TASKS_FILE', '_COMPLETE_TASKS_FILE', '_priority_dict', '_tasks', '_complete_tasks', '_tasks_length', '_complete_tasks_length')
 
-    def __init__(self, tasks_file="tasks.csv", completed_tasks_file="complete_tasks.csv"):
+class ToDoList:
+    bold = _Color()
+    white = _Color('WHITE')
+    red = _Color('RED')
+    green = _Color('GREEN')
+    magenta = _Color('MAGENTA')
+    cyan = _Color('CYAN')
+    yellow = _Color('YELLOW')
+
+    # Extra menu entries selected by letter: key -> (label, method name)
+    letter_commands = {
+        'b': ('Bulk delete / complete / edit', '_bulk_update_tasks'),
+        'u': ('Undo last change', '_undo_last_change'),
+        'r': ('Redo last change', '_redo_last_change'),
+        'n': ("What's next / overdue / due soon", '_display_schedule'),
+        't': ('List tasks by tag / project', '_display_tasks_by_tag'),
+        'd': ('Subtasks & dependencies', '_manage_dependencies'),
+        's': ('Saved searches', '_saved_searches'),
+        'h': ('History & trends', '_display_trends'),
+        'f': ('Find duplicate tasks', '_find_duplicates'),
+        'l': ('Switch list', '_switch_list'),
+    }
+
+    __slots__ =('__author', '_store', '_oplog', '_feed', '_root', '_lists', '_namespace', '_default_list', '_budget', '_durability', '_priority_dict', '_tasks', '_complete_tasks', '_tasks_length', '_complete_tasks_length')
+
+    def __init__(self, tasks_file="tasks.csv", completed_tasks_file="complete_tasks.csv", store=None, root='lists',
+                 max_memory=None, durability='flush'):
         self.__author = "Ehsan"
-        self._TASKS_FILE = tasks_file
-        self._COMPLETE_TASKS_FILE = completed_tasks_file
+        # How durable every change is, see durability.py
+        self._durability = durability
+        self._store = store or TaskStore(tasks_file, completed_tasks_file, durability=durability)
+        # Bytes all open lists and their indexes may use, enforced between commands
+        self._budget = None
+        if max_memory is not None:
+            from memory import MemoryBudget
+            self._budget = self._store.budget = MemoryBudget(max_memory)
+        self._oplog = OperationLog(self._store)
+        self._feed = ChangeFeed(self._store)
+        # Other lists live in per user/list directories under `root`, opened on demand (see namespaces.py)
+        self._root = root
+        self._lists = None
+        self._namespace = None
+        self._default_list = (self._store, self._oplog, self._feed)
         self._tasks = []
         self._complete_tasks = []
         self._tasks_length = 0
         self._complete_tasks_length = 0
-        
+
         # Initialize CSV files with headers if they don't exist
-        if not os.path.exists(self._TASKS_FILE):
-            with open(self._TASKS_FILE, 'w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(['task_id', 'task', 'created_at', 'priority'])
-        
-        if not os.path.exists(self._COMPLETE_TASKS_FILE):
-            with open(self._COMPLETE_TASKS_FILE, 'w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(['task_id', 'task', 'created_at', 'completed_at'])
+        self._store.bootstrap()
 
     @property
     def author(self):
@@ -46,97 +109,121 @@ class ToDoList:
     def author(self, name):
         self.__author = name
 
+    @property
+    def namespace(self):
+        # 'user/list' of the list in use, None for the default one
+        return self._namespace
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def feed(self):
+        return self._feed
+
+    @property
+    def oplog(self):
+        return self._oplog
+
     @property
     def tasks_file(self):
-        return self._TASKS_FILE
+        return self._store.tasks_file
     
     @tasks_file.setter
     def tasks_file(self, filename):
-        self._TASKS_FILE = filename
+        self._store.tasks_file = filename
 
     @property
     def complete_tasks_file(self):
-        return self._COMPLETE_TASKS_FILE
+        return self._store.complete_tasks_file
     
     @complete_tasks_file.setter
     def complete_tasks_file(self, filename):
-        self._COMPLETE_TASKS_FILE = filename
+        self._store.complete_tasks_file = filename
 
     @property
     def tasks(self):
-        self._tasks = self._load_tasks_file(self._TASKS_FILE)
+        self._tasks = self._store.tasks
         return self._tasks
     
     @property
     def complete_tasks(self):
-        self._complete_tasks = self._load_tasks_file(self._COMPLETE_TASKS_FILE)
+        self._complete_tasks = self._store.complete_tasks
         return self._complete_tasks
     
     @property
     def tasks_length(self):
-        self._tasks = self._load_tasks_file(self._TASKS_FILE)
+        self._tasks = self._store.tasks
         self._tasks_length = len(self._tasks)
         return self._tasks_length
     
     @property
     def complete_tasks_length(self):
-        self._complete_tasks = self._load_tasks_file(self._COMPLETE_TASKS_FILE)
+        self._complete_tasks = self._store.complete_tasks
         self._complete_tasks_length = len(self._complete_tasks)
         return self._complete_tasks_length
 
-    def _load_tasks_file(self, filename):
-        if not os.path.exists(filename):
-            return []
-        
-        with open(filename, 'r', newline='') as file:
-            reader = csv.DictReader(file)
-            tasks_list = [row for row in reader] # dictionaries add to my list
-            
-        return tasks_list
-    
-    def _save_tasks_file(self, filename, tasks_list):
-        with open(filename, 'w', newline='') as file:
-            if filename == self._TASKS_FILE:
-                fieldnames = ['task_id', 'task', 'created_at', 'priority']
-            else:
-                fieldnames = ['task_id', 'task', 'created_at', 'completed_at']
-            
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(tasks_list)
-    
+    @staticmethod
+    def _clear_screen():
+        # ANSI escape instead of forking a shell; Windows consoles need colorama to translate it
+        if os.name == 'nt':
+            _init_colorama()
+        print(ANSI_CLEAR_SCREEN, end='', flush=True)
+
     def _add_task_to_tasks_file(self):
         print(self.white + '\n ======== Add a new task ======== \n')
         
-        add_task_input = input(self.white + "Add new task: ").strip()
+        from autocomplete import readline_completion
+        with readline_completion(self._store.completions):
+            add_task_input = input(self.white + "Add new task (Tab completes): ").strip()
         
         if not add_task_input:
             return self.red + '\nYour input was empty!'
+        if not self._confirm_duplicate(add_task_input):
+            return self.magenta + "\nTask not added."
 
         add_task_priority = input(self.white + "choose the priority level (high/medium/low): ").strip().lower()
         if add_task_priority not in ('high', 'medium', 'low'):
             return self.red + "Invalid priority input"
 
-        self._tasks = self._load_tasks_file(self._TASKS_FILE)
-
-        new_task = {
-            'task_id': self._tasks_length + 1,
-            'task': add_task_input,
-            'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'priority': add_task_priority
-        }
-
-        self._tasks.append(new_task)
-        self._save_tasks_file(self._TASKS_FILE,  self._tasks)
+        add_task_due = input(self.white + "Due date (YYYY-MM-DD [HH:MM], today, tomorrow, +3d; Enter for none): ").strip()
+        add_task_repeat = input(self.white + "Repeat (daily, weekly, every N days, cron M H DOM MON DOW; Enter for none): ").strip()
+        from query import normalize_tags
+        add_task_tags = normalize_tags(input(self.white + "Tags (e.g. home urgent; Enter for none): "))
+        add_task_project = input(self.white + "Project (Enter for none): ").strip()
+        try:
+            if add_task_due:
+                from scheduler import parse_due
+                add_task_due = parse_due(add_task_due)
+            if add_task_repeat:
+                # Only the next occurrence is stored, completing it adds the following one
+                from recurrence import parse_rule, next_due
+                add_task_repeat = parse_rule(add_task_repeat)
+                add_task_due = add_task_due or next_due(add_task_repeat)
+        except (InvalidDateError, InvalidRecurrenceError) as e:
+            return self.red + f"\n{e.message}"
+
+        self._store.add(add_task_input, add_task_priority, due_at=add_task_due, recurrence=add_task_repeat,
+                        tags=add_task_tags, project=add_task_project)
 
         return self.green + "\nYour task has been added successfully."
     
+    def _confirm_duplicate(self, text, ignore=None):
+        # One lookup in the duplicate index; a duplicate is saved only if the user says so
+        duplicate = self._store.duplicates.check(text, ignore)
+        if duplicate is None:
+            return True
+        from dedupe import describe_duplicate
+        print(self.yellow + f"\nThis duplicates {describe_duplicate(duplicate)}")
+        return input(self.white + "Save it anyway? (y/n): ").strip().lower() in ('y', 'yes')
+
     def _delete_task_from_tasks_list(self):
         # Display delete task section header
         print(self.white + '\n ======== Delete a task ======== \n')
         
         # Load current tasks and get count
-        self._tasks = self._load_tasks_file(self._TASKS_FILE)
+        self._tasks = self._store.tasks
         self._tasks_length = len(self._tasks)
 
         # Only proceed if tasks exist
@@ -176,23 +263,23 @@ class ToDoList:
             except ZeroUserInput as e:  # Zero entered
                 return self.red + f'\n{e.message}'
 
-            # If validation passed, delete the task
-            deleted_task = self._tasks.pop(delete_task_input-1)  # Adjust for 0-based index
-            
-            # Reassign task IDs to maintain sequence
-            for idx, task in enumerate(self._tasks, start=1):
-                task['task_id'] = idx
-                
-            self._save_tasks_file(self._TASKS_FILE, self._tasks)  # Persist changes
+            # If validation passed, delete the task and persist changes
+            deleted_task = self._store.delete(delete_task_input-1)  # Adjust for 0-based index
 
             return self.green + f"\nTask '{deleted_task['task']}' has been deleted"
         
         else:  # No tasks case
             return self.red + "\nThe tasks list is empty!"
 
-    def _display_tasks_list(self):
-        # Load current tasks from file using helper function
-        self._tasks = self._load_tasks_file(self._TASKS_FILE)
+    @staticmethod
+    def _task_label(task):
+        # Task text followed by its #tags and @project
+        label = task['task'] + ''.join(f' #{tag}' for tag in (task.get('tags') or '').split())
+        return label + (f" @{task['project']}" if task.get('project') else '')
+
+    def _display_tasks_list(self, tasks=None):
+        # Load current tasks from file using helper function, unless a filtered list is given
+        self._tasks = self._store.tasks if tasks is None else tasks
 
         # Check if tasks exist
         if self._tasks:
@@ -200,24 +287,27 @@ class ToDoList:
             print(self.white + '\n======== Your Tasks ======== \n')
             
             # Calculate column widths for nice formatting
-            id_width = len(str(len(self._tasks))) + 2
-            task_width = max(len(task['task']) for task in self._tasks) + 2
+            id_width = len(str(len(self._store.tasks))) + 2
+            task_width = max(len(self._task_label(task)) for task in self._tasks) + 2
             priority_width = 10
+            due_width = 22
             
             # Print column headers
             header = (f"{self.cyan}{'#'.ljust(id_width)}"
                     f"{'Task'.ljust(task_width)}"
                     f"{'Priority'.ljust(priority_width)}"
+                    f"{'Due'.ljust(due_width)}"
                     f"{'Created At'}")
             print(header)
-            print('-' * (id_width + task_width + priority_width + 15))
+            print('-' * (id_width + task_width + priority_width + due_width + 15))
             
-            # Enumerate and display each task with enhanced formatting
-            for index, task in enumerate(self._tasks, start=1):
+            # Display each task with its list number (task ids follow the list order)
+            for task in self._tasks:
                 # Format: "1. Task description [Priority] (creation date)"
-                task_line = (f"{self.white}{str(index).ljust(id_width)}"
-                            f"{task['task'].ljust(task_width)}"
+                task_line = (f"{self.white}{str(task['task_id']).ljust(id_width)}"
+                            f"{self._task_label(task).ljust(task_width)}"
                             f"{self.magenta}{task['priority'].ljust(priority_width)}"
+                            f"{self.yellow}{((task.get('due_at') or '-') + (' ↻' if task.get('recurrence') else '')).ljust(due_width)}"
                             f"{self.cyan}{task['created_at']}")
                 print(task_line)
             
@@ -229,10 +319,28 @@ class ToDoList:
             # Return empty list warning message
             return self.red + "\nYour task list is empty!"
 
+    def _list_active_tasks(self):
+        from sorting import parse_sort, sort_active
+
+        order = input(self.white + "\nSort by, e.g. priority,-created,text (Enter for list order): ").strip()
+        count = input(self.white + "Show top N (Enter for all): ").strip()
+        if not order and not count:
+            return self._display_tasks_list()
+        if count and not count.isdigit():
+            return self.red + "\nThe number of tasks must be a whole number."
+
+        try:
+            spec = parse_sort(order)
+        except QuerySyntaxError as e:
+            return self.red + f"\n{e.message}"
+        # Sorted once per change of the list, the top N without a full sort
+        tasks = sort_active(self._store, spec, int(count) if count else None)
+        return self._display_tasks_list(tasks) if tasks else self.red + "\nYour task list is empty!"
+
     def _mark_task_as_complete_task(self):
         # Load current tasks and completed tasks
-        self._tasks = self._load_tasks_file(self._TASKS_FILE)
-        self._complete_tasks = self._load_tasks_file(self._COMPLETE_TASKS_FILE)
+        self._tasks = self._store.tasks
+        self._complete_tasks = self._store.complete_tasks
         
         # Only proceed if there are tasks to complete
         if self._tasks:
@@ -267,28 +375,12 @@ class ToDoList:
                         len_tasks_list=len(self._tasks)
                     )
                     
-                # Get the task to be completed
-                completed_task = self._tasks[task_index-1]
-                
-                # Add completion timestamp
-                completed_task['completed_at'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                
-                # Remove priority field as it's no longer needed
-                if 'priority' in completed_task:
-                    del completed_task['priority']
-                
-                # Move task from active to completed
-                self._complete_tasks.append(completed_task)
-                self._tasks.pop(task_index-1)
-                
-                # Update task IDs for remaining tasks
-                for idx, task in enumerate(self._tasks, start=1):
-                    task['task_id'] = idx
-                
-                # Persist changes to both files
-                self._save_tasks_file(self._TASKS_FILE, self._tasks)
-                self._save_tasks_file(self._COMPLETE_TASKS_FILE, self._complete_tasks)
+                # Move task from active to completed and persist both files
+                from recurrence import complete_tasks
+                completed_task, = complete_tasks(self._store, [task_index-1])
 
+                if completed_task.get('recurrence'):
+                    return self.green + f"\nTask '{completed_task['task']}' marked as completed, next occurrence added."
                 return self.green + f"\nTask '{completed_task['task']}' marked as completed."
 
             # Handle various error cases
@@ -304,12 +396,15 @@ class ToDoList:
             except ZeroUserInput as e:
                 return self.red + f'\n{e.message}'
 
+            except InvalidRecurrenceError as e:  # A rule stored by an older version
+                return self.red + f'\n{e.message}'
+
         else:  # No tasks case
             return self.red + "\nYour active tasks list is empty!"
     
     def _edit_task_in_tasks_list(self):
         # Load current tasks from file
-        self._tasks = self._load_tasks_file(self._TASKS_FILE)
+        self._tasks = self._store.tasks
         
         # Only proceed if tasks exist
         if self._tasks:
@@ -350,21 +445,51 @@ class ToDoList:
                 # Display current task details
                 print(self.white + f'\nCurrent Task: {task_to_edit["task"]}')
                 print(self.white + f'Current Priority: {task_to_edit["priority"]}')
+                print(self.white + f'Current Due Date: {task_to_edit.get("due_at") or "none"}')
+                print(self.white + f'Current Repeat: {task_to_edit.get("recurrence") or "none"}')
+                print(self.white + f'Current Tags: {task_to_edit.get("tags") or "none"}')
+                print(self.white + f'Current Project: {task_to_edit.get("project") or "none"}')
                 
                 # Get new task details
-                new_task_text = input(self.white + 'Enter new task text (press Enter to keep current): ').strip()
+                from autocomplete import readline_completion
+                with readline_completion(self._store.completions):
+                    new_task_text = input(self.white + 'Enter new task text (press Enter to keep current, Tab completes): ').strip()
                 new_priority = input(self.white + 'Enter new priority (high/medium/low, Enter to keep current): ').strip().lower()
+                new_due = input(self.white + 'Enter new due date ("-" to remove, Enter to keep current): ').strip()
+                new_repeat = input(self.white + 'Enter new repeat rule ("-" to stop repeating, Enter to keep current): ').strip()
+                new_tags = input(self.white + 'Enter new tags ("-" to remove, Enter to keep current): ').strip()
+                new_project = input(self.white + 'Enter new project ("-" to remove, Enter to keep current): ').strip()
                 
-                # Update task if new values provided
-                if new_task_text:
-                    task_to_edit['task'] = new_task_text
-                if new_priority in ('high', 'medium', 'low'):
-                    task_to_edit['priority'] = new_priority
-                elif new_priority:  # Invalid priority entered
+                if new_priority and new_priority not in ('high', 'medium', 'low'):  # Invalid priority entered
                     return self.red + "\nInvalid priority - keeping current value."
-                
-                # Save the updated task list
-                self._save_tasks_file(self._TASKS_FILE, self._tasks)
+
+                if new_task_text and not self._confirm_duplicate(new_task_text, ignore=task_to_edit):
+                    return self.magenta + "\nTask not changed."
+
+                # None keeps the due date, '' removes it
+                if new_due == '-':
+                    new_due = ''
+                elif new_due:
+                    from scheduler import parse_due
+                    new_due = parse_due(new_due)
+                else:
+                    new_due = None
+
+                if new_repeat == '-':
+                    new_repeat = ''
+                elif new_repeat:
+                    from recurrence import parse_rule
+                    new_repeat = parse_rule(new_repeat)
+                else:
+                    new_repeat = None
+
+                from query import normalize_tags
+                new_tags = None if not new_tags else '' if new_tags == '-' else normalize_tags(new_tags)
+                new_project = None if not new_project else '' if new_project == '-' else new_project
+
+                # Update task if new values provided and save the task list
+                self._store.edit(task_index-1, text=new_task_text, priority=new_priority, due_at=new_due,
+                                 recurrence=new_repeat, tags=new_tags, project=new_project)
                 
                 return self.green + f"\nTask {task_index} updated successfully."
 
@@ -381,22 +506,26 @@ class ToDoList:
             except ZeroUserInput as e:
                 return self.red + f'\n{e.message}'
 
+            except (InvalidDateError, InvalidRecurrenceError) as e:
+                return self.red + f'\n{e.message}'
+
         else:  # No tasks case
             return self.red + "\nYour tasks list is empty!"
          
     def _search_task_in_tasks_list(self):
         # Load both active and completed tasks
-        self._tasks = self._load_tasks_file(self._TASKS_FILE)
-        self._complete_tasks = self._load_tasks_file(self._COMPLETE_TASKS_FILE)
+        self._tasks = self._store.tasks
+        self._complete_tasks = self._store.complete_tasks
 
         # Display search header
         print(self.white + '\n======== Search Tasks ======== \n')
         print(self.cyan + "Search options:")
         print(self.cyan + "1. Search by keyword")
         print(self.cyan + "2. Search by priority")
-        print(self.cyan + "3. Search by date range\n")
+        print(self.cyan + "3. Search by date range")
+        print(self.cyan + "4. Query (e.g. priority:high created>=2025-01-01 completed>=-7d text~\"deploy.*prod\" tag:\"home and not later\" status:active)\n")
 
-        search_option = input(self.white + 'Choose search option (1-3): ').strip()
+        search_option = input(self.white + 'Choose search option (1-4): ').strip()
 
         # Initialize search results flag
         found = False
@@ -414,17 +543,18 @@ class ToDoList:
 
                 print(self.white + '\n=== Search Results ===\n')
 
-                # Search active tasks
-                for task in self._tasks:
-                    if search_term in task['task'].lower():
-                        found = True
-                        print(self.green + f"[Active] {task['task']} (Priority: {task['priority']}, Created: {task['created_at']})")
+                # Repeated searches are answered from the store's query cache until the lists change
+                active, completed = self._store.cached(('keyword', search_term), lambda: (
+                    [task for task in self._tasks if search_term in task['task'].lower()],
+                    [task for task in self._complete_tasks if search_term in task['task'].lower()]))
 
-                # Search completed tasks
-                for task in self._complete_tasks:
-                    if search_term in task['task'].lower():
-                        found = True
-                        print(self.magenta + f"[Completed] {task['task']} (Created: {task['created_at']}, Completed: {task['completed_at']})")
+                for task in active:
+                    found = True
+                    print(self.green + f"[Active] {task['task']} (Priority: {task['priority']}, Created: {task['created_at']})")
+
+                for task in completed:
+                    found = True
+                    print(self.magenta + f"[Completed] {task['task']} (Created: {task['created_at']}, Completed: {task['completed_at']})")
 
             elif search_option == '2':
                 # Priority search
@@ -435,10 +565,11 @@ class ToDoList:
                 print(self.white + f'\n=== Tasks with {priority} priority ===\n')
 
                 # Search active tasks by priority
-                for task in self._tasks:
-                    if task['priority'].lower() == priority:
-                        found = True
-                        print(self.green + f"[Active] {task['task']} (Created: {task['created_at']})")
+                matches = self._store.cached(('priority', priority), lambda: [
+                    task for task in self._tasks if task['priority'].lower() == priority])
+                for task in matches:
+                    found = True
+                    print(self.green + f"[Active] {task['task']} (Created: {task['created_at']})")
 
             elif search_option == '3':
                 # Date range search
@@ -447,19 +578,43 @@ class ToDoList:
 
                 print(self.white + '\n=== Tasks in date range ===\n')
 
-                # Search active tasks by date
-                for task in self._tasks:
-                    task_date = task['created_at'].split()[0]  # Get date part only
-                    if (not start_date or task_date >= start_date) and (not end_date or task_date <= end_date):
-                        found = True
-                        print(self.green + f"[Active] {task['task']} (Created: {task['created_at']})")
+                def in_range(timestamp):
+                    task_date = timestamp.split()[0]  # Get date part only
+                    return (not start_date or task_date >= start_date) and (not end_date or task_date <= end_date)
+
+                # Active tasks by creation date, completed ones by completion date
+                active, completed = self._store.cached(('dates', start_date, end_date), lambda: (
+                    [task for task in self._tasks if in_range(task['created_at'])],
+                    [task for task in self._complete_tasks if in_range(task['completed_at'])]))
+
+                for task in active:
+                    found = True
+                    print(self.green + f"[Active] {task['task']} (Created: {task['created_at']})")
+
+                for task in completed:
+                    found = True
+                    print(self.magenta + f"[Completed] {task['task']} (Completed: {task['completed_at']})")
+
+            elif search_option == '4':
+                # Compound query, prefix with EXPLAIN to show the chosen plan
+                from query import split_explain
 
-                # Search completed tasks by date
-                for task in self._complete_tasks:
-                    task_date = task['completed_at'].split()[0]  # Get date part only
-                    if (not start_date or task_date >= start_date) and (not end_date or task_date <= end_date):
-                        found = True
-                        print(self.magenta + f"[Completed] {task['task']} (Completed: {task['completed_at']})")
+                query_text = input(self.white + 'Enter query (prefix with EXPLAIN to show the plan): ').strip()
+                explain, query_text = split_explain(query_text)
+
+                plan = self._store.search(query_text)
+
+                print(self.white + '\n=== Query Results ===\n')
+
+                for status, task in plan.results:
+                    found = True
+                    if status == 'active':
+                        print(self.green + f"[Active] {task['task']} (Priority: {task['priority']}, Created: {task['created_at']})")
+                    else:
+                        print(self.magenta + f"[Completed] {task['task']} (Created: {task['created_at']}, Completed: {task['completed_at']})")
+
+                if explain:
+                    print(self.cyan + '\n' + plan.explain())
 
             else:
                 return self.red + "\nInvalid search option."
@@ -469,12 +624,15 @@ class ToDoList:
 
             return self.green + "\nSearch completed successfully."
 
+        except QuerySyntaxError as e:
+            return self.red + f"\nInvalid query: {e.message}"
+
         except Exception as e:
             return self.red + f"\nError during search: {str(e)}"
     
     def _clear_all_tasks_in_tasks_list(self):
         # Load current tasks from file
-        self._tasks = self._load_tasks_file(self._TASKS_FILE)
+        self._tasks = self._store.tasks
         self._tasks_length = len(self._tasks)
 
         # Display clear tasks header with warning
@@ -493,11 +651,8 @@ class ToDoList:
             if confirm2 not in ['y', 'yes']:
                 return self.magenta + "\nSecond confirmation failed - operation cancelled."
 
-            # Clear the task list in memory
-            self._tasks.clear()
-            
-            # Save the empty list to file
-            self._save_tasks_file(self._TASKS_FILE, self._tasks)
+            # Clear the task list and save the empty list to file
+            self._store.clear()
             
             return (self.green + "\nAll tasks cleared successfully.")
 
@@ -507,7 +662,7 @@ class ToDoList:
 
     def _display_complete_task_list(self):
         # Load completed tasks from persistent storage
-        self._complete_tasks = self._load_tasks_file(self._COMPLETE_TASKS_FILE)
+        self._complete_tasks = self._store.complete_tasks
         
         # Display section header for completed tasks
         print(self.white + '\n======== Completed Tasks ======== \n')
@@ -537,19 +692,11 @@ class ToDoList:
             # Display statistics
             print(self.green + f"\nTotal completed tasks: {len(self._complete_tasks)}")
             
-            # Calculate completion time statistics if available
-            try:
-                completion_times = []
-                for task in self._complete_tasks:
-                    created = datetime.datetime.strptime(task['created_at'], '%Y-%m-%d %H:%M:%S')
-                    completed = datetime.datetime.strptime(task['completed_at'], '%Y-%m-%d %H:%M:%S')
-                    completion_times.append((completed - created).days)
-                
-                if completion_times:
-                    avg_days = sum(completion_times) / len(completion_times)
-                    print(self.green + f"Average completion time: {avg_days:.1f} days")
-            except:
-                pass  # Skip statistics if date parsing fails
+            # Completion time statistics come from the daily rollups, not a rescan of the archive
+            summary = self._store.rollups.summary()
+            if summary['mean_days'] is not None:
+                print(self.green + f"Average completion time: {summary['mean_days']:.1f} days "
+                                   f"(median {summary['p50_days']:.1f}, 90% within {summary['p90_days']:.1f})")
 
             return ""
 
@@ -557,25 +704,397 @@ class ToDoList:
             # Return message when no completed tasks exist
             return self.red + "\nNo tasks have been completed yet."
     
-    @staticmethod
-    def _display_statistics():
-        pass
+    def _display_statistics(self):
+        stats = self._store.stats()
 
-    def start(self):
-        # Initialize files with CSV headers if they don't exist
-        for file, fields in \
-        [
-            (self._TASKS_FILE, ['task_id', 'task', 'created_at', 'priority']),
-            (self._COMPLETE_TASKS_FILE, ['task_id', 'task', 'created_at', 'completed_at'])
-        ]:
-            if not os.path.exists(file):
-                with open(file, 'w', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=fields)
-                    writer.writeheader()
+        print(self.white + '\n======== Statistics ======== \n')
+        print(self.cyan + f"Active tasks:    {stats['active']}")
+        for priority, count in stats['by_priority'].items():
+            print(self.magenta + f"  {priority.ljust(8)} {count}")
+        print(self.cyan + f"Completed tasks: {stats['completed']}")
+
+        if stats['average_completion_days'] is not None:
+            print(self.green + f"Average completion time: {stats['average_completion_days']:.1f} days")
 
+        cache = self._store.query_cache.stats()
+        if cache['hit_ratio'] is not None:
+            print(self.white + f"\nSearch cache: {cache['hits']} hits, {cache['misses']} misses "
+                               f"(hit ratio {cache['hit_ratio']:.0%}), {cache['entries']} cached")
+
+        if self._budget is not None:
+            from memory import format_size
+            memory = self._budget.stats()
+            print(self.white + f"\nMemory: {format_size(memory['used'])} of {format_size(memory['max'])} "
+                               f"in {memory['segments']} segments")
+            print(self.white + f"  hits {memory['hits']}, misses {memory['misses']}, "
+                               f"paged in {memory['page_ins']}, evicted {memory['evictions']}")
+
+        return ""
+
+    def _bulk_update_tasks(self):
+        from query import select_tasks
+
+        print(self.white + '\n======== Bulk Update ======== \n')
+
+        self._tasks = self._store.tasks
+        if not self._tasks:
+            return self.red + "\nYour tasks list is empty!"
+
+        action = input(self.white + 'Action (delete/complete/edit): ').strip().lower()
+        if action not in ('delete', 'complete', 'edit'):
+            return self.red + "\nInvalid action."
+
+        print(self.cyan + "Select tasks by number and range (3-40,55,70-) or by query (priority:low created<2024-01-01)")
+        selection = input(self.white + 'Selection: ').strip()
+
+        try:
+            positions = select_tasks(self._store.index, selection)
+        except QuerySyntaxError as e:
+            return self.red + f"\nInvalid selection: {e.message}"
+        except TasksInputOutOfRangeError as e:
+            return self.red + f'{e.message}'
+        except ZeroUserInput as e:
+            return self.red + f'\n{e.message}'
+
+        if not positions:
+            return self.red + "\nNo tasks match the selection."
+
+        for position in positions[:10]:
+            task = self._tasks[position]
+            print(self.cyan + f'{position + 1}. {task["task"]} [Priority: {task["priority"]}]')
+        if len(positions) > 10:
+            print(self.cyan + f'... and {len(positions) - 10} more')
+
+        if action == 'edit':
+            new_task_text = input(self.white + 'Enter new task text (press Enter to keep current): ').strip()
+            new_priority = input(self.white + 'Enter new priority (high/medium/low, Enter to keep current): ').strip().lower()
+            if new_priority and new_priority not in ('high', 'medium', 'low'):
+                return self.red + "\nInvalid priority - nothing changed."
+            if new_task_text and len(positions) > 1:
+                print(self.yellow + f"\nAll {len(positions)} tasks will have the same text, i.e. be duplicates.")
+            elif new_task_text and not self._confirm_duplicate(new_task_text, ignore=self._tasks[positions[0]]):
+                return self.magenta + "\nOperation cancelled."
+
+        confirm = input(self.white + f"\n{action.title()} {len(positions)} tasks? (y/n): ").strip().lower()
+        if confirm not in ['y', 'yes']:
+            return self.magenta + "\nOperation cancelled."
+
+        # One pass over the list and one write for the whole selection
+        match action:
+            case 'delete':
+                self._store.delete_many(positions)
+            case 'complete':
+                from recurrence import complete_tasks
+                complete_tasks(self._store, positions)
+            case 'edit':
+                self._store.edit_many(positions, text=new_task_text, priority=new_priority)
+
+        return self.green + f"\n{len(positions)} tasks updated ({action})."
+
+    def _display_tasks_by_tag(self):
+        index = self._store.index
+        print(self.white + '\n======== Tasks by Tag / Project ======== \n')
+        if index.tags:
+            print(self.cyan + 'Tags:     ' + ', '.join(f'#{tag} ({count})' for tag, count in sorted(index.tags.items())))
+        if index.projects:
+            print(self.cyan + 'Projects: ' + ', '.join(f'@{name} ({count})' for name, count in sorted(index.projects.items())))
+
+        expression = input(self.white + '\nTag expression, e.g. home and (urgent or today) and not later (Enter for any): ').strip()
+        project = input(self.white + 'Project (Enter for any): ').strip().lstrip('@')
+
+        try:
+            # Bitwise over the tag bitsets; active tasks are the first rows
+            positions = index.tagged(expression, project, active_only=True)
+        except QuerySyntaxError as e:
+            return self.red + f"\n{e.message}"
+
+        if not positions:
+            return self.red + "\nNo active tasks match."
+        return self._display_tasks_list([self._store.tasks[position] for position in positions])
+
+    def _select_task(self, prompt):
+        # 1-based task number -> position, None when it is not in the list
+        number = input(self.white + prompt).strip()
+        if not number.isdigit() or not 1 <= int(number) <= len(self._store.tasks):
+            return None
+        return int(number) - 1
+
+    def _display_trends(self):
+        rollups = self._store.rollups
+
+        print(self.white + '\n======== History & Trends ======== \n')
+        print(self.cyan + "1. Last 14 days")
+        print(self.cyan + "2. Weekly burndown")
+        print(self.cyan + "3. Monthly burndown")
+        print(self.cyan + "4. Completions by weekday (last 12 weeks)")
+        option = input(self.white + "\nSelect an option (1-4): ").strip()
+
+        match option:
+            case '1':
+                days = rollups.daily()
+                if not days:
+                    return self.red + "\nNo history yet."
+                print(self.cyan + f"\n{'Day'.ljust(12)}{'Created'.rjust(8)}{'Done'.rjust(6)}{'Avg days'.rjust(10)}{'p90'.rjust(7)}  high/medium/low")
+                for day in days:
+                    mean = f"{day['mean_days']:.1f}" if day['mean_days'] is not None else '-'
+                    p90 = f"{day['p90_days']:.1f}" if day['p90_days'] is not None else '-'
+                    priorities = '/'.join(str(day['by_priority'][priority]) for priority in ('high', 'medium', 'low'))
+                    print(self.white + f"{day['date'].ljust(12)}{day['created']:>8}{day['completed']:>6}{mean:>10}{p90:>7}  {priorities}")
+            case '2' | '3':
+                periods = rollups.burndown('week' if option == '2' else 'month')
+                if not periods:
+                    return self.red + "\nNo history yet."
+                widest = max(period['open'] for period in periods) or 1
+                print(self.cyan + f"\n{'From'.ljust(12)}{'Created'.rjust(8)}{'Done'.rjust(6)}{'Open'.rjust(6)}")
+                for period in periods:
+                    bar = '#' * round(30 * max(period['open'], 0) / widest)
+                    print(self.white + f"{period['period'].ljust(12)}{period['created']:>8}{period['completed']:>6}{period['open']:>6}  " + self.magenta + bar)
+            case '4':
+                print(self.white + '\n' + rollups.format_heatmap(rollups.heatmap()))
+            case _:
+                return self.red + "\nInvalid option."
+        return ""
+
+    def _saved_searches(self):
+        views = self._store.views
+
+        print(self.white + '\n======== Saved Searches ======== \n')
+        names = views.names()
+        if not names:
+            print(self.magenta + "No saved searches yet.")
+        # Counts come from the maintained views, nothing is scanned here
+        for number, (name, (query, count)) in enumerate(views.counts().items(), start=1):
+            print(self.cyan + f"{number}. {name} ({count}): {query}")
+
+        print(self.cyan + "\n1. Open a saved search")
+        print(self.cyan + "2. Save a search (e.g. priority:high status:active created<-7d)")
+        print(self.cyan + "3. Delete a saved search")
+        option = input(self.white + "\nSelect an option (1-3): ").strip()
+
+        if option == '2':
+            name = input(self.white + "Name: ").strip()
+            query_text = input(self.white + "Query: ").strip()
+            try:
+                view = views.save(name, query_text)
+            except QuerySyntaxError as e:
+                return self.red + f"\nInvalid saved search: {e.message}"
+            return self.green + f"\nSaved '{name}' ({len(view)} tasks)."
+        if option not in ('1', '3'):
+            return self.red + "\nInvalid option."
+        if not names:
+            return self.red + "\nNo saved searches yet."
+
+        choice = input(self.white + "Saved search (number or name): ").strip()
+        if choice.isdigit() and 1 <= int(choice) <= len(names):
+            choice = names[int(choice) - 1]
+        if choice not in views:
+            return self.red + "\nNo such saved search."
+
+        if option == '3':
+            views.remove(choice)
+            return self.green + f"\nDeleted '{choice}'."
+
+        results = views.open(choice)
+        print(self.white + f'\n=== {choice} ===\n')
+        for status, task in results:
+            if status == 'active':
+                print(self.green + f"[Active] {task['task_id']}. {task['task']} (Priority: {task['priority']}, Created: {task['created_at']})")
+            else:
+                print(self.magenta + f"[Completed] {task['task']} (Created: {task['created_at']}, Completed: {task['completed_at']})")
+        if not results:
+            return self.magenta + "\nNo tasks match right now."
+        return self.green + f"\n{len(results)} tasks."
+
+    def _find_duplicates(self):
+        from dedupe import find_duplicates
+
+        print(self.white + '\n======== Duplicate Tasks ======== \n')
+        # One hashing pass over both lists
+        groups = find_duplicates(self._store.tasks, self._store.complete_tasks)
+        if not groups:
+            return self.green + "\nNo duplicate tasks."
+
+        for group in groups[:20]:
+            print(self.cyan + f"{len(group)}x {group[0][1]['task']}")
+            for status, task in group[:5]:
+                if status == 'active':
+                    print(self.white + f"   {task['task_id']}. {task['task']} (Priority: {task['priority']}, Created: {task['created_at']})")
+                else:
+                    print(self.magenta + f"   [Completed] {task['task']} (Completed: {task['completed_at']})")
+            if len(group) > 5:
+                print(self.white + f"   ... and {len(group) - 5} more")
+        if len(groups) > 20:
+            print(self.cyan + f"... and {len(groups) - 20} more groups")
+
+        # Every active copy but the first of its group
+        positions = [int(task['task_id']) - 1 for group in groups
+                     for status, task in [entry for entry in group if entry[0] == 'active'][1:]]
+        if not positions:
+            return self.magenta + f"\n{len(groups)} duplicate groups, only one active copy in each."
+        confirm = input(self.white + f"\nDelete the {len(positions)} extra active copies? (y/n): ").strip().lower()
+        if confirm not in ['y', 'yes']:
+            return self.magenta + f"\n{len(groups)} duplicate groups, nothing deleted."
+        self._store.delete_many(positions)
+        return self.green + f"\n{len(positions)} duplicate tasks deleted (U undoes it)."
+
+    def _manage_dependencies(self):
+        import dependencies
+
+        print(self.white + '\n======== Subtasks & Dependencies ======== \n')
+        print(self.cyan + "1. Add a subtask")
+        print(self.cyan + "2. Mark a task as blocked by another")
+        print(self.cyan + "3. Remove a blocker")
+        print(self.cyan + "4. List ready tasks (nothing blocking them)")
+        print(self.cyan + "5. Show what blocks a task")
+        option = input(self.white + "\nSelect an option (1-5): ").strip()
+
+        graph = self._store.graph
+        if option == '4':
+            ready = graph.ready()
+            if not ready:
+                return self.magenta + "\nEvery active task is waiting for another one."
+            return self._display_tasks_list(ready)
+        if option not in ('1', '2', '3', '5'):
+            return self.red + "\nInvalid option."
+        if not self._store.tasks:
+            return self.red + "\nYour task list is empty!"
+
+        for task in self._store.tasks:
+            waiting = graph.pending(task)
+            print(self.cyan + f"{task['task_id']}. {self._task_label(task)}" + (f" (waiting for {waiting})" if waiting else ''))
+
+        position = self._select_task("\nSelect the task number: ")
+        if position is None:
+            return self.red + "\nInvalid task number."
+        task = self._store.tasks[position]
+
+        match option:
+            case '1':
+                text = input(self.white + "Subtask: ").strip()
+                if not text:
+                    return self.red + '\nYour input was empty!'
+                priority = input(self.white + "choose the priority level (high/medium/low; Enter to keep the parent's): ").strip().lower()
+                if priority not in ('high', 'medium', 'low', ''):
+                    return self.red + "Invalid priority input"
+                dependencies.add_subtask(self._store, position, text, priority or task['priority'])
+                return self.green + f"\nSubtask added, '{task['task']}' now waits for it."
+            case '2' | '3':
+                blocker_position = self._select_task("Blocked by task number: ")
+                if blocker_position is None:
+                    return self.red + "\nInvalid task number."
+                if option == '3':
+                    dependencies.remove_blocker(self._store, position, blocker_position)
+                    return self.green + "\nBlocker removed."
+                try:
+                    dependencies.add_blocker(self._store, position, blocker_position)
+                except DependencyCycleError as e:
+                    return self.red + f"\n{e.message}"
+                return self.green + f"\n'{task['task']}' is now blocked by '{self._store.tasks[blocker_position]['task']}'."
+            case '5':
+                blockers = graph.blockers(task)
+                if not blockers:
+                    return self.green + f"\n'{task['task']}' is ready."
+                print(self.white + f"\n'{task['task']}' waits for:")
+                for blocker in blockers:
+                    print(self.yellow + f"  {blocker['task_id']}. {self._task_label(blocker)}")
+                return self.magenta + f"\n{len(blockers)} unfinished tasks."
+
+    def _display_schedule(self):
+        from scheduler import parse_duration
+
+        print(self.white + "\n======== What's Next ======== \n")
+        print(self.cyan + "1. Next tasks (by due date, priority and age)")
+        print(self.cyan + "2. Overdue tasks")
+        print(self.cyan + "3. Tasks due within...")
+        view = input(self.white + "\nSelect a view (1-3): ").strip()
+
+        scheduler = self._store.scheduler
+        match view:
+            case '1':
+                count = input(self.white + "How many tasks? (Enter for 5): ").strip()
+                if count and not count.isdigit():
+                    return self.red + "\nInvalid input. Please enter a number."
+                tasks = scheduler.next(int(count or 5))
+            case '2':
+                tasks = scheduler.overdue()
+            case '3':
+                within = input(self.white + "Due within (e.g. 12h, 3d, 2w): ").strip()
+                try:
+                    tasks = scheduler.due_within(parse_duration(within))
+                except InvalidDateError as e:
+                    return self.red + f"\n{e.message}"
+            case _:
+                return self.red + "\nInvalid option."
+
+        if not tasks:
+            return self.magenta + "\nNothing to show."
+
+        print()
+        now = now_timestamp()
+        for task in tasks:
+            due = task.get('due_at')
+            color = self.red if due and due < now else self.yellow
+            print(color + f"{task['task_id']}. {task['task']} [Priority: {task['priority']}] (Due: {due or 'none'})")
+        return self.green + f"\n{len(tasks)} tasks."
+
+    def _switch_list(self):
+        from exceptions import NamespaceError
+        from namespaces import OpenList, StorePool, namespace_files, parse_namespace
+
+        print(self.white + '\n======== Switch List ======== \n')
+        print(self.cyan + f"Current list: {self._namespace or 'default'}")
+        if self._lists is not None and len(self._lists):
+            print(self.cyan + 'Open lists:   ' + ', '.join(self._lists.namespaces()))
+
+        name = input(self.white + f"\nList to open (name for {self.author.lower()}'s list, user/name, Enter for the default list): ").strip()
+        try:
+            namespace = parse_namespace(name, user=self.author) if name else None
+        except NamespaceError as e:
+            return self.red + f"\n{e.message}"
+        if namespace == self._namespace:
+            return self.magenta + "\nThat list is already open."
+
+        if self._lists is None:
+            # Recently used lists stay loaded, so switching back is instant
+            self._lists = StorePool(lambda namespace: OpenList(TaskStore(*namespace_files(self._root, namespace),
+                                                                         durability=self._durability),
+                                                               budget=self._budget),
+                                    max_open=8)
+        if namespace is None:
+            self._store, self._oplog, self._feed = self._default_list
+        else:
+            try:
+                opened = self._lists.acquire(namespace)
+            except JournaledStoreError as e:
+                return self.red + f"\n{e.message}"
+            self._store, self._oplog, self._feed = opened.store, opened.oplog, opened.feed
+        if self._namespace is not None:
+            # The list we leave may now be evicted
+            self._lists.release(self._namespace)
+        self._namespace = namespace
+
+        return self.green + f"\nSwitched to list '{namespace or 'default'}' ({len(self._store.tasks)} active tasks)."
+
+    def _undo_last_change(self):
+        entry = self._oplog.undo()
+        if entry is None:
+            return self.red + "\nNothing to undo."
+        return self.green + f"\nUndone: {self._oplog.describe(entry)}"
+
+    def _redo_last_change(self):
+        entry = self._oplog.redo()
+        if entry is None:
+            return self.red + "\nNothing to redo."
+        return self.green + f"\nRedone: {self._oplog.describe(entry)}"
+
+    def start(self):
         while True:
+            # Between commands nothing holds on to the rows, page out what is over budget
+            if self._budget is not None:
+                self._budget.enforce()
+
             # Clear screen for better UX (works on both Windows and Unix)
-            os.system('cls' if os.name == 'nt' else 'clear')
+            self._clear_screen()
             
             # Display menu options with consistent formatting
             print(self.white + "\n" + "═"*40)
@@ -590,17 +1109,30 @@ class ToDoList:
             print(self.red + "7. Clear all active tasks")
             print(self.magenta + "8. List completed tasks")
             print(self.white + "9. View statistics")
+            for key, (label, _) in self.letter_commands.items():
+                print(self.cyan + f"{key.upper()}. {label}")
             print(self.red + "0. Quit")
             print(self.white + "═"*40)
 
             # Get user input with timeout for auto-exit
             try:
-                user_option_input = input(self.white + "\nEnter your choice (0-9): ").strip().lower()
+                user_option_input = input(self.white + "\nEnter your choice (0-9 or a letter): ").strip().lower()
                 
                 # Allow alternate quit commands
                 if user_option_input in ['q', 'quit', 'exit', '0']:
+                    # With durability 'none' or 'group' the last changes may not be on disk yet
+                    self._default_list[0].sync()
+                    if self._lists is not None:
+                        self._lists.close()
                     print(self.magenta + "\nGoodbye! 👋")
                     break
+
+                # Letter commands
+                if user_option_input in self.letter_commands:
+                    self._clear_screen()
+                    print(getattr(self, self.letter_commands[user_option_input][1])())
+                    input(self.white + "\nPress Enter to continue...")
+                    continue
                     
                 # Convert to integer and validate
                 user_option_input = int(user_option_input)
@@ -611,7 +1143,7 @@ class ToDoList:
                     )
                 
                 # Process user choice
-                os.system('cls' if os.name == 'nt' else 'clear')  # Clear screen before action
+                self._clear_screen()  # Clear screen before action
                 
                 match user_option_input:
                     case 1:
@@ -619,7 +1151,7 @@ class ToDoList:
                     case 2:
                         print(self._delete_task_from_tasks_list())
                     case 3:
-                        print(self._display_tasks_list())
+                        print(self._list_active_tasks())
                     case 4:
                         print(self._mark_task_as_complete_task())
                     case 5:
@@ -631,19 +1163,53 @@ class ToDoList:
                     case 8:
                         print(self._display_complete_task_list())
                     case 9:
-                        self._display_statistics()
+                        print(self._display_statistics())
                     
                 input(self.white + "\nPress Enter to continue...")  # Pause before returning to menu
                 
             except ValueError:
                 print(self.red + '\nInvalid input. Please enter a number.')
-                datetime.sleep(1)  # Brief pause before showing menu again
+                time.sleep(1)  # Brief pause before showing menu again
                 
             except UserOptionInputError as e:
                 print(self.red + f"{e.message}{e.num_input}")
-                datetime.sleep(1)
+                time.sleep(1)
 
 
 if __name__ == "__main__":
-    app = ToDoList()
-    app.start()
\ No newline at end of file
+    # --max-memory, --durability and --tui are the menu's only options (argparse would cost more
+    # startup time than the whole app), any other arguments select the daemon / client command line
+    options, arguments = {}, sys.argv[1:]
+    while arguments and arguments[0].partition('=')[0] in ('--max-memory', '--durability', '--tui'):
+        name, _, value = arguments.pop(0).partition('=')
+        options[name] = value or (arguments.pop(0) if arguments and name != '--tui' else '')
+    if arguments:
+        from daemon import main as daemon_main
+        sys.exit(daemon_main(arguments))
+
+    max_memory = None
+    if '--max-memory' in options:
+        from memory import parse_size
+        try:
+            max_memory = parse_size(options['--max-memory'])
+        except ValueError as e:
+            print(ToDoList.red + str(e))
+            sys.exit(2)
+
+    durability = options.get('--durability', 'flush')
+    if durability not in DURABILITY_MODES:
+        print(ToDoList.red + f"usage: main.py [--max-memory SIZE] [--durability {{{','.join(DURABILITY_MODES)}}}] [--tui]\n"
+                             f"Unknown durability '{durability}'.")
+        sys.exit(2)
+
+    try:
+        app = ToDoList(max_memory=max_memory, durability=durability)
+    except JournaledStoreError as e:
+        print(ToDoList.red + e.message)
+        sys.exit(1)
+    if '--tui' in options:
+        # Full-screen list instead of the menu, see tui.py
+        from tui import run
+        run(app)
+    else:
+        app.start()
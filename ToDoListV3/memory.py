@@ -0,0 +1,154 @@
+"""
+Memory budget for loaded task lists and the structures built from them.
+
+A store charges every segment it holds in memory - the active list, the
+completed archive, the query index, the scheduler heap, the dependency
+graph, the saved search views, the duplicate index and the autocomplete
+trie - to a MemoryBudget shared by all stores of the process. When the
+total goes over `max_bytes`, enforce() pages out the least recently used
+segments: lists are dropped and read back from disk on their next use,
+derived structures are rebuilt. Unsaved lists are never paged out.
+
+Sizes are estimates (sampled rows times the row count), good enough to keep
+a long-running process inside its budget, not exact accounting.
+"""
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+
+SIZE_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)\s*([kmg]?)i?b?$')
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+# Rows sampled to estimate the size of a list
+SAMPLE_ROWS = 32
+# Rough bytes per row of the derived structures
+INDEX_ROW_BYTES = 400
+SCHEDULER_ROW_BYTES = 200
+GRAPH_ROW_BYTES = 350
+VIEW_ROW_BYTES = 120
+DUPLICATE_ROW_BYTES = 150
+COMPLETION_ROW_BYTES = 250
+
+
+def parse_size(text):
+    # '256MB', '1.5g', '65536' -> bytes
+    match = SIZE_PATTERN.match(str(text).strip().lower())
+    if not match:
+        raise ValueError(f"Invalid size '{text}', use e.g. 512KB, 256MB or 2GB.")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
+
+
+def estimate_rows(rows):
+    """Approximate bytes held by a list of task dicts."""
+    if not rows:
+        return sys.getsizeof(rows)
+    step = max(1, len(rows) // SAMPLE_ROWS)
+    sample = rows[::step][:SAMPLE_ROWS]
+    per_row = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+                  for row in sample) / len(sample)
+    return sys.getsizeof(rows) + int(per_row * len(rows))
+
+
+class MemoryBudget:
+    """
+    LRU accounting of the segments held by one or more TaskStores.
+
+    Stores report loads and builds with charge() and every later use with
+    touch(), which keeps the recency order and counts hits (segment in memory)
+    and misses (segment loaded or built). Paging out only happens in
+    enforce(), which callers run between commands, when no store operation is
+    holding on to the rows.
+    """
+
+    __slots__ = ('max_bytes', 'used', 'hits', 'misses', 'evictions', 'page_ins', '_segments', '_lock')
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.page_ins = 0
+        # (id(owner), segment) -> [owner, segment, size], least recently used first
+        self._segments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._segments)
+
+    def charge(self, owner, segment, size, page_in=False):
+        with self._lock:
+            key = (id(owner), segment)
+            entry = self._segments.pop(key, None)
+            if entry is not None:
+                self.used -= entry[2]
+            self._segments[key] = [owner, segment, size]
+            self.used += size
+            self.misses += 1
+            self.page_ins += page_in
+
+    def touch(self, owner, segment):
+        with self._lock:
+            key = (id(owner), segment)
+            if key in self._segments:
+                self._segments.move_to_end(key)
+                self.hits += 1
+
+    def release(self, owner, segment, evicted=False):
+        # Forget a segment the owner dropped; returns the bytes it was charged
+        with self._lock:
+            entry = self._segments.pop((id(owner), segment), None)
+            if entry is None:
+                return 0
+            self.used -= entry[2]
+            self.evictions += evicted
+            return entry[2]
+
+    def enforce(self, lock_for=None):
+        """
+        Page out least recently used segments until the budget holds.
+        With `lock_for`, an owner is only touched while holding the lock
+        `lock_for(owner)` returns; owners without one or whose lock is busy are
+        skipped. Returns the bytes freed.
+        """
+        with self._lock:
+            entries = list(self._segments.values())
+        # Lists grow after they are charged, measure again before deciding
+        for entry in entries:
+            size = entry[0].segment_size(entry[1])
+            with self._lock:
+                if self._segments.get((id(entry[0]), entry[1])) is entry:
+                    self.used += size - entry[2]
+                    entry[2] = size
+
+        freed = 0
+        for owner, segment, _ in entries:
+            if self.used <= self.max_bytes:
+                break
+            if (id(owner), segment) not in self._segments:
+                continue  # Already dropped along with another segment
+            lock = lock_for(owner) if lock_for else None
+            if lock_for and (lock is None or not lock.acquire(blocking=False)):
+                continue
+            try:
+                freed += owner.page_out(segment)
+            finally:
+                if lock is not None:
+                    lock.release()
+        return freed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'used': self.used, 'max': self.max_bytes, 'segments': len(self._segments),
+                    'hits': self.hits, 'misses': self.misses, 'page_ins': self.page_ins,
+                    'evictions': self.evictions, 'hit_ratio': round(self.hits / lookups, 3) if lookups else None}
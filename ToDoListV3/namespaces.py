@@ -0,0 +1,173 @@
+"""
+Namespaced task lists.
+
+Every user/list pair gets its own directory under a root, with its own task
+files and change feed, so lists never share files or locks:
+
+    lists/alice/work/tasks.csv
+    lists/alice/home/tasks.csv
+
+One process serves any number of them through a StorePool: an LRU of open
+lists bounded by count. A list is opened on first use, stays warm while it is
+used and is closed - committed and dropped together with its indexes - when
+it falls out of the LRU or sits idle.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from exceptions import NamespaceError
+
+
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+DEFAULT_ROOT = 'lists'
+
+
+def parse_namespace(name, user=None):
+    """'alice/work', or 'work' for `user`'s list -> normalized 'alice/work'."""
+    parts = (name or '').strip().strip('/').split('/')
+    if len(parts) == 1 and user:
+        parts = [user.lower(), parts[0]]
+    if len(parts) != 2 or not all(NAME_PATTERN.match(part) for part in parts):
+        raise NamespaceError(message=f"Invalid list name '{name}', use user/list with letters, digits, '.', '_' or '-'.")
+    return '/'.join(parts)
+
+
+def namespace_files(root, namespace):
+    # (tasks file, completed tasks file) of a namespace, creating its directory
+    directory = os.path.join(root, *namespace.split('/'))
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, 'tasks.csv'), os.path.join(directory, 'complete_tasks.csv')
+
+
+class OpenList:
+    """A namespace's store with its undo history and change feed, as the menu uses them."""
+
+    __slots__ = ('store', 'oplog', 'feed')
+
+    def __init__(self, store, budget=None):
+        from changefeed import ChangeFeed
+        from oplog import OperationLog
+
+        self.store = store
+        self.store.budget = budget
+        self.store.bootstrap()
+        self.oplog = OperationLog(store)
+        self.feed = ChangeFeed(store)
+
+    def close(self):
+        self.store.sync()
+        self.feed.close()
+        self.store.page_out()
+
+
+class StorePool:
+    """
+    LRU of open namespaces, shared by everything in the process.
+
+    `open_entry(namespace)` creates an entry (anything with a close() method)
+    on a miss. Entries in use are pinned and never evicted, so the pool may
+    briefly hold more than `max_open` of them; the least recently used unpinned
+    ones are closed as soon as it can shrink again.
+    """
+
+    __slots__ = ('max_open', 'idle_timeout', 'hits', 'misses', 'evictions', '_open_entry', '_entries', '_pins',
+                 '_last_used', '_lock')
+
+    def __init__(self, open_entry, max_open=64, idle_timeout=None):
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._open_entry = open_entry
+        # namespace -> entry, least recently used first
+        self._entries = OrderedDict()
+        self._pins = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, namespace):
+        return namespace in self._entries
+
+    def namespaces(self):
+        with self._lock:
+            return list(self._entries)
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    @contextmanager
+    def open(self, namespace):
+        entry = self.acquire(namespace)
+        try:
+            yield entry
+        finally:
+            self.release(namespace)
+
+    def acquire(self, namespace):
+        # The entry stays pinned until release()
+        with self._lock:
+            entry = self._entries.get(namespace)
+            if entry is None:
+                self.misses += 1
+                entry = self._entries[namespace] = self._open_entry(namespace)
+            else:
+                self.hits += 1
+                self._entries.move_to_end(namespace)
+            self._pins[namespace] = self._pins.get(namespace, 0) + 1
+            self._last_used[namespace] = time.monotonic()
+            self._shrink()
+            return entry
+
+    def release(self, namespace):
+        with self._lock:
+            self._pins[namespace] -= 1
+            if not self._pins[namespace]:
+                del self._pins[namespace]
+            self._last_used[namespace] = time.monotonic()
+            self._shrink()
+
+    def evict_idle(self, now=None):
+        # Close unpinned namespaces unused for idle_timeout seconds; returns how many
+        if self.idle_timeout is None:
+            return 0
+        now = now or time.monotonic()
+        with self._lock:
+            idle = [namespace for namespace in self._entries
+                    if namespace not in self._pins and now - self._last_used[namespace] >= self.idle_timeout]
+            for namespace in idle:
+                self._evict(namespace)
+            return len(idle)
+
+    def close(self):
+        with self._lock:
+            for namespace in list(self._entries):
+                self._evict(namespace)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'open': len(self._entries), 'max_open': self.max_open, 'pinned': len(self._pins),
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'hit_ratio': round(self.hits / lookups, 3) if lookups else None}
+
+    def _shrink(self):
+        # Called with the lock held. Closing happens under the lock too, so a
+        # namespace is never reopened while its last changes are being written.
+        excess = len(self._entries) - self.max_open
+        for namespace in [namespace for namespace in self._entries if namespace not in self._pins][:max(excess, 0)]:
+            self._evict(namespace)
+
+    def _evict(self, namespace):
+        entry = self._entries.pop(namespace)
+        self._last_used.pop(namespace, None)
+        self.evictions += 1
+        entry.close()
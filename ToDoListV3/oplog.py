@@ -0,0 +1,213 @@
+from collections import deque
+
+
+def _weight(entry):
+    # Rows held by an entry, the unit of the memory bound
+    if entry['op'] == 'batch':
+        return sum(_weight(event) for event in entry['events'])
+    return len(entry['tasks']) if 'tasks' in entry else 1
+
+
+class _SpillStack:
+    """
+    LIFO stack of log entries holding at most `max_rows` rows in memory.
+
+    When the bound is exceeded the oldest in-memory entries are pickled to an
+    anonymous temp file; since they are older than everything still in memory
+    the file itself behaves as a stack and is truncated as entries come back.
+    """
+
+    __slots__ = ('max_rows', '_memory', '_memory_rows', '_spill', '_offsets')
+
+    def __init__(self, max_rows):
+        self.max_rows = max_rows
+        self._memory = deque()
+        self._memory_rows = 0
+        self._spill = None
+        self._offsets = []
+
+    def __len__(self):
+        return len(self._memory) + len(self._offsets)
+
+    @property
+    def spilled(self):
+        return len(self._offsets)
+
+    def push(self, entry):
+        self._memory.append(entry)
+        self._memory_rows += _weight(entry)
+
+        while self._memory_rows > self.max_rows and self._memory:
+            oldest = self._memory.popleft()
+            self._memory_rows -= _weight(oldest)
+            self._spill_entry(oldest)
+
+    def pop(self):
+        if self._memory:
+            entry = self._memory.pop()
+            self._memory_rows -= _weight(entry)
+            return entry
+
+        if self._offsets:
+            import pickle
+            offset = self._offsets.pop()
+            self._spill.seek(offset)
+            entry = pickle.load(self._spill)
+            self._spill.truncate(offset)
+            return entry
+
+        return None
+
+    def clear(self):
+        self._memory.clear()
+        self._memory_rows = 0
+        self._offsets.clear()
+        if self._spill is not None:
+            self._spill.truncate(0)
+
+    def _spill_entry(self, entry):
+        # Imported on first spill, most sessions never get here
+        import pickle
+        import tempfile
+
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile()
+        self._spill.seek(0, 2)
+        self._offsets.append(self._spill.tell())
+        pickle.dump(entry, self._spill, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class OperationLog:
+    """
+    Undo/redo history for a TaskStore built from its change events.
+
+    Each entry is the store event itself (the deleted row, the old text and
+    priority of an edit, the positions of a completed task, the rows removed by
+    a clear), so undoing or redoing touches only the rows the change touched.
+    """
+
+    __slots__ = ('_store', '_undo', '_redo', '_replaying')
+
+    def __init__(self, store, max_rows=10000):
+        self._store = store
+        self._undo = _SpillStack(max_rows)
+        self._redo = _SpillStack(max_rows)
+        self._replaying = False
+        store.subscribe(self._record)
+
+    @property
+    def can_undo(self):
+        return len(self._undo) > 0
+
+    @property
+    def can_redo(self):
+        return len(self._redo) > 0
+
+    def undo(self):
+        entry = self._undo.pop()
+        if entry is not None:
+            self._replay(self._apply_inverse, entry)
+            self._redo.push(entry)
+        return entry
+
+    def redo(self):
+        entry = self._redo.pop()
+        if entry is not None:
+            # The replayed event carries fresh rows, keep it for the next undo
+            self._undo.push(self._snapshot(self._replay(self._apply, entry)))
+        return entry
+
+    @staticmethod
+    def describe(entry):
+        if entry['op'] == 'batch':
+            return f"{entry['bulk'] or 'batch'} of {len(entry['events'])} tasks"
+        if entry['op'] in ('clear', 'restore'):
+            return f"{entry['op']} of {len(entry['tasks'])} tasks"
+        return f"{entry['op']} of '{entry['task']['task']}'"
+
+    def _record(self, event):
+        if self._replaying:
+            return
+
+        if event['op'] == 'reload':
+            # Positions in the history no longer match the reloaded file
+            self._undo.clear()
+            self._redo.clear()
+            return
+
+        self._undo.push(self._snapshot(event))
+        self._redo.clear()
+
+    @classmethod
+    def _snapshot(cls, event):
+        # Single rows are live dicts that keep changing, copy them
+        if event['op'] == 'batch':
+            return dict(event, events=[cls._snapshot(child) for child in event['events']])
+        if 'task' in event:
+            return dict(event, task=dict(event['task']))
+        return dict(event)
+
+    @staticmethod
+    def _original_positions(entry):
+        # Bulk events are shifted by the rows removed before them
+        return [event['position'] + shift for shift, event in enumerate(entry['events'])]
+
+    def _replay(self, apply, entry):
+        captured = []
+        self._replaying = True
+        self._store.subscribe(captured.append)
+        try:
+            apply(entry)
+        finally:
+            self._store.unsubscribe(captured.append)
+            self._replaying = False
+        return captured[-1]
+
+    def _apply(self, entry):
+        store = self._store
+        match entry['op']:
+            case 'batch' if entry['bulk'] == 'delete':
+                store.delete_many(self._original_positions(entry))
+            case 'batch' if entry['bulk'] == 'complete':
+                store.complete_many(self._original_positions(entry),
+                                    completed_at=entry['events'][0]['task']['completed_at'])
+            case 'batch':
+                with store.batch():
+                    for event in entry['events']:
+                        self._apply(event)
+            case 'add':
+                store.insert(entry['position'], dict(entry['task']))
+            case 'delete':
+                store.delete(entry['position'])
+            case 'complete':
+                store.complete(entry['position'], completed_at=entry['task']['completed_at'])
+            case 'edit':
+                store.edit(entry['position'], text=entry['task']['task'], priority=entry['task']['priority'],
+                           **{field: entry['task'].get(field) or '' for field in store.OPTIONAL_FIELDS})
+            case 'clear':
+                store.clear()
+
+    def _apply_inverse(self, entry):
+        store = self._store
+        match entry['op']:
+            case 'batch' if entry['bulk'] == 'delete':
+                store.insert_many([(position, dict(event['task']))
+                                   for position, event in zip(self._original_positions(entry), entry['events'])])
+            case 'batch' if entry['bulk'] == 'complete':
+                store.uncomplete_many([(position, event['priority'])
+                                       for position, event in zip(self._original_positions(entry), entry['events'])])
+            case 'batch':
+                with store.batch():
+                    for event in reversed(entry['events']):
+                        self._apply_inverse(event)
+            case 'add':
+                store.delete(entry['position'])
+            case 'delete':
+                store.insert(entry['position'], dict(entry['task']))
+            case 'complete':
+                store.uncomplete(entry['complete_position'], entry['position'], entry['priority'])
+            case 'edit':
+                store.edit(entry['position'], text=entry['old']['task'], priority=entry['old']['priority'],
+                           **{field: entry['old'].get(field) or '' for field in store.OPTIONAL_FIELDS})
+            case 'clear':
+                store.restore(entry['tasks'])
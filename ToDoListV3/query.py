@@ -0,0 +1,560 @@
+import datetime
+import re
+import shlex
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from exceptions import QuerySyntaxError, TasksInputOutOfRangeError, ZeroUserInput
+
+
+# Query fields and the operators each one understands
+FIELDS = {
+    'priority': (':', '='),
+    'status': (':', '='),
+    'created': (':', '=', '>=', '<=', '>', '<'),
+    'completed': (':', '=', '>=', '<=', '>', '<'),
+    'due': (':', '=', '>=', '<=', '>', '<'),
+    'text': (':', '=', '~'),
+    'tag': (':', '='),
+    'project': (':', '='),
+}
+
+TERM_PATTERN = re.compile(r'^([a-z_]+)(>=|<=|>|<|~|:|=)(.*)$')
+SELECTION_PATTERN = re.compile(r'^[\d\s,\-]+$')
+RANGE_PATTERN = re.compile(r'^(\d*)\s*-\s*(\d*)$')
+WORD_PATTERN = re.compile(r'\w+')
+DATE_COLUMNS = {'created': 'created_at', 'completed': 'completed_at', 'due': 'due_at'}
+TAG_TOKEN_PATTERN = re.compile(r'\s*([()&|!,]|[^\s()&|!,]+)')
+TAG_OPERATORS = {'and': '&', 'or': '|', 'not': '!', ',': '|'}
+RELATIVE_DATE_PATTERN = re.compile(r'^-(\d+)([dw])$')
+
+
+def _date_part(timestamp):
+    # 'YYYY-MM-DD HH:MM:SS' -> 'YYYY-MM-DD'
+    return timestamp.split()[0] if timestamp else ''
+
+
+def resolve_date(value, today=None):
+    """
+    Relative dates for the date fields: 'today', 'yesterday', 'week' (this
+    week's Monday), 'month' (the 1st of this month), '-7d' or '-2w' become
+    'YYYY-MM-DD'. Anything else is returned as it was.
+    """
+    today = today or datetime.date.today()
+    match value:
+        case 'today':
+            return str(today)
+        case 'yesterday':
+            return str(today - datetime.timedelta(days=1))
+        case 'week':
+            return str(today - datetime.timedelta(days=today.weekday()))
+        case 'month':
+            return str(today.replace(day=1))
+    match = RELATIVE_DATE_PATTERN.match(value)
+    if match:
+        days = int(match.group(1)) * (7 if match.group(2) == 'w' else 1)
+        return str(today - datetime.timedelta(days=days))
+    return value
+
+
+def normalize_tags(text):
+    # '#Home, urgent home' -> 'home urgent', the form stored in the tags column
+    tags = (tag.strip('#').lower() for tag in re.split(r'[\s,]+', text or ''))
+    return ' '.join(dict.fromkeys(tag for tag in tags if tag))
+
+
+def parse_tag_expression(text):
+    """
+    Parse a boolean tag expression into a tree of tuples:
+    ('tag', name), ('not', x), ('and', x, y), ('or', x, y).
+
+    Operators are and/or/not or &, |, !; a comma also means or and adjacent
+    tags are and-ed, so `home urgent` == `home and urgent`.
+    """
+    tokens = [TAG_OPERATORS.get(token.lower(), token) for token in TAG_TOKEN_PATTERN.findall(text)]
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        tree = parse_and()
+        while peek() == '|':
+            take()
+            tree = ('or', tree, parse_and())
+        return tree
+
+    def parse_and():
+        tree = parse_not()
+        while peek() not in (None, '|', ')'):
+            if peek() == '&':
+                take()
+            tree = ('and', tree, parse_not())
+        return tree
+
+    def parse_not():
+        token = peek()
+        if token is None:
+            raise QuerySyntaxError(message=f"Incomplete tag expression '{text}'.")
+        take()
+        if token == '!':
+            return ('not', parse_not())
+        if token == '(':
+            tree = parse_or()
+            if peek() != ')':
+                raise QuerySyntaxError(message=f"Missing ')' in tag expression '{text}'.")
+            take()
+            return tree
+        if token in ('&', '|', ')'):
+            raise QuerySyntaxError(message=f"Unexpected '{token}' in tag expression '{text}'.")
+        return ('tag', token.strip('#').lower())
+
+    tree = parse_or()
+    if peek() is not None:
+        raise QuerySyntaxError(message=f"Unexpected '{peek()}' in tag expression '{text}'.")
+    return tree
+
+
+def _eval_tags(tree, leaf, invert):
+    # Evaluate a tag tree over booleans or bitsets: leaf(name) gives the operand, invert(x) its complement
+    match tree[0]:
+        case 'tag':
+            return leaf(tree[1])
+        case 'not':
+            return invert(_eval_tags(tree[1], leaf, invert))
+        case 'and':
+            return _eval_tags(tree[1], leaf, invert) & _eval_tags(tree[2], leaf, invert)
+        case 'or':
+            return _eval_tags(tree[1], leaf, invert) | _eval_tags(tree[2], leaf, invert)
+
+
+def _bitset(row_ids, size):
+    # One pass over a bytearray instead of an O(n) big-int OR per row
+    bits = bytearray((size + 7) // 8)
+    for row_id in row_ids:
+        bits[row_id >> 3] |= 1 << (row_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _bit_positions(bits):
+    # Set bits of a bitset, lowest first
+    digits = bin(bits)[:1:-1]
+    positions = []
+    position = digits.find('1')
+    while position != -1:
+        positions.append(position)
+        position = digits.find('1', position + 1)
+    return positions
+
+
+class Predicate:
+    """A single `field op value` condition of a query."""
+
+    __slots__ = ('field', 'op', 'value', '_regex', 'tag_tree', 'relative')
+
+    def __init__(self, field, op, value):
+        self.field = field
+        self.op = '=' if op == ':' else op
+        self.value = value
+        self._regex = None
+        self.tag_tree = None
+        # Relative dates ('-7d', 'week') are resolved against today
+        self.relative = False
+
+        if self.field in DATE_COLUMNS:
+            self.value = resolve_date(value.lower())
+            self.relative = self.value != value.lower()
+        elif self.field == 'tag':
+            self.tag_tree = parse_tag_expression(value)
+        elif self.field == 'text' and self.op == '~':
+            try:
+                self._regex = re.compile(value, re.IGNORECASE)
+            except re.error as e:
+                raise QuerySyntaxError(message=f"Invalid regular expression '{value}': {e}")
+        elif self.field in ('priority', 'status', 'text', 'project'):
+            self.value = value.lower()
+
+    def __str__(self):
+        return f'{self.field}{self.op}{self.value}'
+
+    def matches(self, status, task):
+        if self.field == 'status':
+            return self.value in ('all', status)
+
+        if self.field == 'priority':
+            return task.get('priority', '').lower() == self.value
+
+        if self.field == 'tag':
+            tags = set((task.get('tags') or '').split())
+            return _eval_tags(self.tag_tree, lambda tag: tag in tags, lambda result: not result)
+
+        if self.field == 'project':
+            return (task.get('project') or '').lower() == self.value
+
+        if self.field == 'text':
+            if self._regex is not None:
+                return self._regex.search(task['task']) is not None
+            return self.value in task['task'].lower()
+
+        # Date fields compare on the date part only, like the date range search
+        task_date = _date_part(task.get(DATE_COLUMNS[self.field]))
+        if not task_date:
+            return False
+
+        match self.op:
+            case '=':
+                return task_date == self.value
+            case '>=':
+                return task_date >= self.value
+            case '<=':
+                return task_date <= self.value
+            case '>':
+                return task_date > self.value
+            case '<':
+                return task_date < self.value
+
+
+def split_explain(query_text):
+    # 'EXPLAIN <query>' asks for the chosen plan alongside the results
+    if query_text[:8].upper() == 'EXPLAIN ':
+        return True, query_text[8:].strip()
+    return False, query_text
+
+
+def parse_query(query_text):
+    # Split on whitespace while honouring quotes: text~"deploy .* prod"
+    try:
+        terms = shlex.split(query_text)
+    except ValueError as e:
+        raise QuerySyntaxError(message=f'Could not parse query: {e}')
+
+    if not terms:
+        raise QuerySyntaxError(message='Query is empty.')
+
+    predicates = []
+    for term in terms:
+        match = TERM_PATTERN.match(term)
+
+        # Bare words are keyword searches over the task text
+        if not match or match.group(1) not in FIELDS:
+            predicates.append(Predicate('text', ':', term))
+            continue
+
+        field, op, value = match.groups()
+        if op not in FIELDS[field]:
+            raise QuerySyntaxError(message=f"Operator '{op}' is not supported for '{field}'.")
+        if not value:
+            raise QuerySyntaxError(message=f"Missing value for '{field}'.")
+
+        if field == 'priority' and value.lower() not in ('high', 'medium', 'low'):
+            raise QuerySyntaxError(message=f"Invalid priority '{value}'.")
+        if field == 'status' and value.lower() not in ('active', 'completed', 'all'):
+            raise QuerySyntaxError(message=f"Invalid status '{value}'.")
+
+        predicates.append(Predicate(field, op, value))
+
+    return predicates
+
+
+class TaskIndex:
+    """
+    In-memory indexes over the active and completed task lists.
+
+    Every task gets a row id (active tasks first, then completed tasks) and the
+    indexes map priorities, dates and keywords to sets of row ids. Tags and
+    projects map to bitsets (ints with bit `row id` set), so tag expressions
+    are answered with &, | and ~ instead of a scan.
+    """
+
+    __slots__ = ('rows', 'active_count', '_priority', '_created', '_completed', '_keywords', '_tags',
+                 '_projects', '_all')
+
+    def __init__(self, tasks, complete_tasks):
+        self.rows = [('active', task) for task in tasks] + [('completed', task) for task in complete_tasks]
+        self.active_count = len(tasks)
+
+        # priority -> row ids (only active tasks carry a priority)
+        self._priority = {}
+        # sorted (date, row id) pairs for range lookups
+        self._created = []
+        self._completed = []
+        # lowercase word -> row ids
+        self._keywords = {}
+        # tag / project -> row ids, turned into bitsets below
+        tag_rows = {}
+        project_rows = {}
+
+        for row_id, (status, task) in enumerate(self.rows):
+            priority = task.get('priority')
+            if priority:
+                self._priority.setdefault(priority.lower(), []).append(row_id)
+
+            self._created.append((_date_part(task.get('created_at')), row_id))
+            if status == 'completed':
+                self._completed.append((_date_part(task.get('completed_at')), row_id))
+
+            for word in set(WORD_PATTERN.findall(task['task'].lower())):
+                self._keywords.setdefault(word, set()).add(row_id)
+
+            for tag in (task.get('tags') or '').split():
+                tag_rows.setdefault(tag, []).append(row_id)
+            if task.get('project'):
+                project_rows.setdefault(task['project'].lower(), []).append(row_id)
+
+        self._created.sort()
+        self._completed.sort()
+
+        size = len(self.rows)
+        self._tags = {tag: _bitset(row_ids, size) for tag, row_ids in tag_rows.items()}
+        self._projects = {project: _bitset(row_ids, size) for project, row_ids in project_rows.items()}
+        self._all = (1 << size) - 1
+
+    @property
+    def tags(self):
+        # tag -> number of tasks carrying it
+        return {tag: bits.bit_count() for tag, bits in self._tags.items()}
+
+    @property
+    def projects(self):
+        return {project: bits.bit_count() for project, bits in self._projects.items()}
+
+    def tag_bits(self, tree):
+        # Bitset of the rows matching a parsed tag expression
+        return _eval_tags(tree, lambda tag: self._tags.get(tag, 0), lambda bits: self._all & ~bits)
+
+    def tagged(self, expression=None, project=None, active_only=False):
+        """Row ids matching a tag expression and/or a project, in row order."""
+        bits = (1 << self.active_count) - 1 if active_only else self._all
+        if expression:
+            bits &= self.tag_bits(parse_tag_expression(expression))
+        if project:
+            bits &= self._projects.get(project.lower(), 0)
+        return _bit_positions(bits)
+
+    def lookup(self, predicate):
+        """
+        Return the row ids exactly matching `predicate` using an index,
+        or None when no index can answer it.
+        """
+        if predicate.field == 'priority':
+            return self._priority.get(predicate.value, [])
+
+        if predicate.field == 'status':
+            if predicate.value == 'active':
+                return range(0, self.active_count)
+            if predicate.value == 'completed':
+                return range(self.active_count, len(self.rows))
+            return range(0, len(self.rows))
+
+        if predicate.field in ('created', 'completed'):
+            return self._date_range(predicate)
+
+        if predicate.field == 'tag':
+            return _bit_positions(self.tag_bits(predicate.tag_tree))
+
+        if predicate.field == 'project':
+            return _bit_positions(self._projects.get(predicate.value, 0))
+
+        # Single-word keywords can be answered from the vocabulary: every row
+        # containing the keyword as a substring has a word containing it.
+        if predicate.field == 'text' and predicate.op == '=' and WORD_PATTERN.fullmatch(predicate.value):
+            row_ids = set()
+            for word, postings in self._keywords.items():
+                if predicate.value in word:
+                    row_ids |= postings
+            return row_ids
+
+        return None
+
+    def estimate(self, predicate):
+        # Cheap cardinality estimate used by the planner
+        if predicate.field == 'text':
+            if predicate.op != '=' or not WORD_PATTERN.fullmatch(predicate.value):
+                return None
+            return sum(len(postings) for word, postings in self._keywords.items() if predicate.value in word)
+        if predicate.field == 'tag':
+            return self.tag_bits(predicate.tag_tree).bit_count()
+        if predicate.field == 'project':
+            return self._projects.get(predicate.value, 0).bit_count()
+        row_ids = self.lookup(predicate)
+        return None if row_ids is None else len(row_ids)
+
+    def _date_range(self, predicate):
+        entries = self._created if predicate.field == 'created' else self._completed
+        value = predicate.value
+
+        # (value,) sorts before and (value, inf) after every row id of that date
+        match predicate.op:
+            case '=':
+                start, end = bisect_left(entries, (value,)), bisect_right(entries, (value, float('inf')))
+            case '>=':
+                start, end = bisect_left(entries, (value,)), len(entries)
+            case '>':
+                start, end = bisect_right(entries, (value, float('inf'))), len(entries)
+            case '<=':
+                start, end = 0, bisect_right(entries, (value, float('inf')))
+            case '<':
+                start, end = 0, bisect_left(entries, (value,))
+
+        # Rows without a date sort first and never match
+        first_dated = bisect_right(entries, ('', float('inf')))
+        return [row_id for _, row_id in entries[max(start, first_dated):end]]
+
+
+class QueryPlan:
+    """The access path chosen for a query and the result of running it."""
+
+    __slots__ = ('predicates', 'access', 'estimated', 'filters', 'rows_examined', 'results', 'row_ids')
+
+    def __init__(self, predicates, access, estimated, filters):
+        self.predicates = predicates
+        self.access = access
+        self.estimated = estimated
+        self.filters = filters
+        self.rows_examined = 0
+        self.results = []
+        self.row_ids = []
+
+    def explain(self):
+        lines = ['QUERY PLAN']
+        if self.access is None:
+            lines.append(f'  access:   full scan ({self.estimated} rows)')
+        else:
+            lines.append(f'  access:   index on {self.access.field} [{self.access}] (estimated {self.estimated} rows)')
+        lines.append('  filter:   ' + (', '.join(str(p) for p in self.filters) or 'none'))
+        lines.append(f'  examined: {self.rows_examined} rows')
+        lines.append(f'  matched:  {len(self.results)} rows')
+        return '\n'.join(lines)
+
+
+def plan_query(index, predicates):
+    # Pick the most selective predicate that an index can answer
+    best, best_estimate = None, len(index.rows)
+    for predicate in predicates:
+        estimate = index.estimate(predicate)
+        if estimate is not None and (best is None or estimate < best_estimate):
+            best, best_estimate = predicate, estimate
+
+    filters = [p for p in predicates if p is not best]
+    return QueryPlan(predicates, best, best_estimate, filters)
+
+
+def run_query(index, query_text):
+    predicates = parse_query(query_text)
+    plan = plan_query(index, predicates)
+
+    candidates = range(len(index.rows)) if plan.access is None else index.lookup(plan.access)
+
+    # Evaluate the remaining predicates on the narrowed set, keeping file order
+    for row_id in sorted(candidates):
+        plan.rows_examined += 1
+        status, task = index.rows[row_id]
+        if all(p.matches(status, task) for p in plan.filters):
+            plan.results.append((status, task))
+            plan.row_ids.append(row_id)
+
+    return plan
+
+
+def normalize_query(query_text):
+    # Predicates sorted into one canonical string: results keep file order, so term order never matters
+    return ' '.join(sorted(str(predicate) for predicate in parse_query(query_text)))
+
+
+class QueryCache:
+    """
+    LRU of query results keyed by (normalized query, store generation).
+
+    Every change to the store bumps its generation, so a result is never
+    served for lists it was not computed from. Entries of older generations
+    can no longer be hit and are dropped as soon as the generation moves.
+    """
+
+    __slots__ = ('max_entries', 'hits', 'misses', '_entries', '_generation')
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # (query, generation) -> result, least recently used first
+        self._entries = OrderedDict()
+        self._generation = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, query, generation, compute):
+        # The cached result for `query`, or compute() and remember it
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+        key = (query, generation)
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        self.misses += 1
+        result = self._entries[key] = compute()
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self._entries), 'max_entries': self.max_entries, 'hits': self.hits,
+                'misses': self.misses, 'hit_ratio': round(self.hits / lookups, 3) if lookups else None}
+
+
+def select_tasks(index, selection):
+    """
+    Resolve a selection to 0-based positions in the active task list.
+
+    Selections are either task numbers and ranges such as `3-40,55,70-`
+    (an open end runs to the first/last task) or a query such as
+    `priority:low created<2024-01-01`, which is limited to active tasks.
+    """
+    selection = selection.strip()
+    if not selection:
+        raise QuerySyntaxError(message='Selection is empty.')
+
+    if not SELECTION_PATTERN.match(selection):
+        # Active tasks are the first rows of the index, so row ids are positions
+        plan = run_query(index, selection + ' status:active')
+        return plan.row_ids
+
+    count = index.active_count
+    positions = set()
+    for item in selection.split(','):
+        item = item.strip()
+        if not item:
+            continue
+
+        match = RANGE_PATTERN.match(item)
+        if match:
+            first = int(match.group(1)) if match.group(1) else 1
+            last = int(match.group(2)) if match.group(2) else count
+        elif item.isdigit():
+            first = last = int(item)
+        else:
+            raise QuerySyntaxError(message=f"Invalid selection '{item}'.")
+
+        if first == 0 or last == 0:
+            raise ZeroUserInput(message='Task numbering starts at 1.')
+        if last > count or first > last:
+            raise TasksInputOutOfRangeError(
+                message=f"\nError: '{item}' is outside the list. Maximum task number is {count}.",
+                len_tasks_list=count
+            )
+        positions.update(range(first - 1, last))
+
+    return sorted(positions)
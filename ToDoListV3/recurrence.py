@@ -0,0 +1,150 @@
+"""
+Recurring tasks.
+
+A recurring task is a single active row carrying its rule in `recurrence`;
+only its next occurrence ever exists. Completing it through complete_tasks()
+adds the following occurrence in the same store batch, so undo removes both.
+
+Rules are stored normalized:
+
+    daily / weekly / every 3 days / every 2 weeks  ->  'every N days'
+    cron 0 9 * * 1-5                               ->  'cron 0 9 * * 1-5'
+"""
+import datetime
+import re
+
+from exceptions import InvalidRecurrenceError
+from store import TIMESTAMP_FORMAT, now_timestamp
+
+
+INTERVAL_PATTERN = re.compile(r'^every\s+(\d+)\s+(day|week)s?$')
+NAMED_RULES = {'daily': 'every 1 days', 'weekly': 'every 7 days'}
+# Field ranges of a cron expression: minute, hour, day of month, month, day of week
+CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+# Give up looking for a matching day after this many days (rules like 'cron 0 0 31 2 *' never match)
+CRON_SEARCH_DAYS = 366 * 5
+
+
+def _parse_cron_field(field, low, high):
+    # '*', '5', '1-5', '*/15', '1-30/2' and comma separated lists of them
+    values = set()
+    for part in field.split(','):
+        part, _, step = part.partition('/')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = end = int(part)
+        if not low <= start <= end <= high:
+            raise ValueError(part)
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return sorted(values)
+
+
+def _parse_cron(expression):
+    fields = expression.split()
+    if len(fields) != 5:
+        raise InvalidRecurrenceError(message='A cron rule needs 5 fields: minute hour day month weekday.')
+    try:
+        parsed = [_parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_RANGES)]
+    except ValueError:
+        raise InvalidRecurrenceError(message=f"Invalid cron rule '{expression}'.")
+    # Cron matches either day field when both are restricted
+    parsed.append((fields[2] != '*', fields[4] != '*'))
+    return parsed
+
+
+def parse_rule(text):
+    """Validate a recurrence rule and return its normalized form."""
+    text = ' '.join(text.strip().lower().split())
+    text = NAMED_RULES.get(text, text)
+
+    match = INTERVAL_PATTERN.match(text)
+    if match:
+        days = int(match.group(1)) * (7 if match.group(2) == 'week' else 1)
+        if days < 1:
+            raise InvalidRecurrenceError(message='The interval must be at least one day.')
+        return f'every {days} days'
+
+    if text.startswith('cron '):
+        # Also rejects rules no date matches, e.g. 'cron 0 0 31 2 *'
+        _next_cron(text[5:], datetime.datetime.now())
+        return text
+
+    raise InvalidRecurrenceError(
+        message=f"Invalid repeat rule '{text}', use daily, weekly, every N days/weeks or cron M H DOM MON DOW.")
+
+
+def _next_cron(expression, after):
+    minutes, hours, days, months, weekdays, (restrict_day, restrict_weekday) = _parse_cron(expression)
+    start = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+
+    day = start.date()
+    for _ in range(CRON_SEARCH_DAYS):
+        day_match = day.day in days
+        # cron weekdays count from Sunday
+        weekday_match = (day.weekday() + 1) % 7 in weekdays
+        if restrict_day and restrict_weekday:
+            matches = day_match or weekday_match
+        else:
+            matches = day_match and weekday_match
+
+        if day.month in months and matches:
+            earliest = (start.hour, start.minute) if day == start.date() else (0, 0)
+            for hour in hours:
+                for minute in minutes:
+                    if (hour, minute) >= earliest:
+                        return datetime.datetime.combine(day, datetime.time(hour, minute))
+        day += datetime.timedelta(days=1)
+
+    raise InvalidRecurrenceError(message=f"The rule 'cron {expression}' never matches.")
+
+
+def next_due(rule, due=None, now=None):
+    """
+    Due date of the occurrence following one due at `due`, never in the past:
+    an interval rule completed late skips the occurrences it missed.
+    """
+    now = now or datetime.datetime.now()
+
+    if rule.startswith('cron '):
+        previous = datetime.datetime.strptime(due, TIMESTAMP_FORMAT) if due else now
+        return _next_cron(rule[5:], max(previous, now)).strftime(TIMESTAMP_FORMAT)
+
+    interval = datetime.timedelta(days=int(rule.split()[1]))
+    if not due:
+        # First occurrence of a new interval rule: the end of today
+        return now.strftime('%Y-%m-%d') + ' 23:59:59'
+
+    previous = datetime.datetime.strptime(due, TIMESTAMP_FORMAT)
+    steps = 1 if now < previous else (now - previous) // interval + 1
+    return (previous + steps * interval).strftime(TIMESTAMP_FORMAT)
+
+
+def complete_tasks(store, positions, completed_at=None):
+    """
+    Complete the tasks at `positions`, adding the next occurrence of every
+    recurring one. Returns the completed tasks.
+    """
+    tasks = store.tasks
+    positions = sorted(set(positions))
+    completed_at = completed_at or now_timestamp()
+    now = datetime.datetime.strptime(completed_at, TIMESTAMP_FORMAT)
+
+    # The next occurrence keeps the rule, tags, project and parent task
+    following = [(task['task'], task.get('priority'),
+                  {'due_at': next_due(task['recurrence'], task.get('due_at'), now), 'recurrence': task['recurrence'],
+                   'tags': task.get('tags'), 'project': task.get('project'), 'parent': task.get('parent')})
+                 for task in (tasks[position] for position in positions) if task.get('recurrence')]
+
+    if not following:
+        if len(positions) == 1:
+            return [store.complete(positions[0], completed_at=completed_at)]
+        return store.complete_many(positions, completed_at=completed_at)
+
+    with store.batch():
+        completed = store.complete_many(positions, completed_at=completed_at)
+        for text, priority, fields in following:
+            store.add(text, priority, **fields)
+    return completed
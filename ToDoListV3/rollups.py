@@ -0,0 +1,330 @@
+"""
+Daily rollups of the task history, for trend reports.
+
+One row per day in `<tasks file stem>.rollups.csv`: tasks created that day,
+how many of them were deleted since, tasks completed, completions per
+priority, a histogram of their time-to-complete and the fastest and slowest
+of them. The store hands every
+change to Rollups.record(), which turns it into deltas on the spot; they are
+applied and written with the store's next commit, so the table stays current
+without rescanning the archive. Reports (daily, burndown, weekday heatmap)
+only read the rollups: a few hundred rows, whatever the size of the archive.
+The mean is exact; percentiles are approximate, read off the histogram.
+
+Priorities are not kept with completed tasks, so completions rolled up from
+an existing archive (first use, or files changed by an older version) are
+counted as 'unknown'.
+"""
+import csv
+import datetime
+import os
+
+from store import PRIORITIES
+
+
+# Upper bounds of the time-to-complete histogram, in hours
+BUCKET_HOURS = (1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 240, 336, 504, 720, 1080, 1440, 2160, 2880, 4320, 8760,
+                float('inf'))
+PRIORITY_COLUMNS = PRIORITIES + ('unknown',)
+FIELDS = ['date', 'created', 'deleted', 'completed', 'seconds', 'fastest', 'slowest', *PRIORITY_COLUMNS, 'histogram']
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+# Shades of the heatmap cells, from no completions to the busiest day
+HEAT = ' .:-=+*#%@'
+
+
+def rollups_file(tasks_file):
+    return os.path.splitext(tasks_file)[0] + '.rollups.csv'
+
+
+def _parse(timestamp):
+    try:
+        return datetime.datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+
+
+def _bucket(seconds):
+    hours = seconds / 3600
+    for bucket, bound in enumerate(BUCKET_HOURS):
+        if hours <= bound:
+            return bucket
+
+
+def percentile(histogram, fraction, fastest=None, slowest=None):
+    """
+    Time-to-complete in days below which `fraction` of the completions fall.
+    Approximate: interpolated within a histogram bucket, then kept between
+    the fastest and slowest completion (in seconds) when they are known.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    rank, seen, hours = fraction * total, 0, BUCKET_HOURS[-2]
+    for bucket, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            low = BUCKET_HOURS[bucket - 1] if bucket else 0
+            high = BUCKET_HOURS[bucket]
+            hours = low if high == float('inf') else low + (high - low) * (rank - seen) / count
+            break
+        seen += count
+    if fastest is not None:
+        hours = min(max(hours, fastest / 3600), slowest / 3600)
+    return hours / 24
+
+
+class DayRollup:
+    """Counts of one day."""
+
+    __slots__ = ('created', 'deleted', 'completed', 'seconds', 'fastest', 'slowest', 'priorities', 'histogram')
+
+    def __init__(self):
+        self.created = 0
+        # Tasks created that day and deleted since (undoing a delete takes it back)
+        self.deleted = 0
+        self.completed = 0
+        # Time-to-complete of the completions that have one
+        self.seconds = 0
+        # Bounds of the time-to-complete seen, None before the first one; not narrowed by an uncomplete
+        self.fastest = self.slowest = None
+        self.priorities = dict.fromkeys(PRIORITY_COLUMNS, 0)
+        self.histogram = [0] * len(BUCKET_HOURS)
+
+    @property
+    def mean_days(self):
+        timed = sum(self.histogram)
+        return self.seconds / timed / 86400 if timed else None
+
+    def percentile(self, fraction):
+        return percentile(self.histogram, fraction, self.fastest, self.slowest)
+
+    def bound(self, seconds):
+        # Widen fastest/slowest to include `seconds`
+        self.fastest = seconds if self.fastest is None else min(self.fastest, seconds)
+        self.slowest = seconds if self.slowest is None else max(self.slowest, seconds)
+
+    def merge(self, other):
+        self.created += other.created
+        self.deleted += other.deleted
+        self.completed += other.completed
+        self.seconds += other.seconds
+        if other.fastest is not None:
+            self.bound(other.fastest)
+            self.bound(other.slowest)
+        for priority, count in other.priorities.items():
+            self.priorities[priority] += count
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        return self
+
+
+class Rollups:
+    """The rollup table of one store, see the module docstring."""
+
+    __slots__ = ('_store', '_path', '_days', '_pending', '_unsaved')
+
+    def __init__(self, store):
+        self._store = store
+        self._path = rollups_file(store.tasks_file)
+        # date -> DayRollup, read on first use; rows without a valid date count under ''
+        self._days = None
+        # Deltas not applied yet: ('created' | 'deleted', date, sign) / ('completed', date, seconds, priority, sign)
+        self._pending = []
+        # Deltas applied to _days but not written yet
+        self._unsaved = False
+        store.subscribe(self.record)
+
+    def record(self, event):
+        # Store listener: the tasks change after the event, so take what is needed now
+        match event['op']:
+            case 'batch':
+                for child in event['events']:
+                    self.record(child)
+            case 'add' if event.get('restored'):
+                self._pending.append(self._created(event['task'], -1, 'deleted'))
+            case 'add':
+                self._pending.append(self._created(event['task'], 1))
+            case 'delete':
+                self._pending.append(self._created(event['task'], 1, 'deleted'))
+            case 'clear' | 'restore':
+                sign = 1 if event['op'] == 'clear' else -1
+                self._pending.extend(self._created(task, sign, 'deleted') for task in event['tasks'])
+            case 'complete':
+                self._pending.append(self._completed(event['task'], event['task'].get('completed_at'),
+                                                     event.get('priority'), 1))
+            case 'uncomplete':
+                self._pending.append(self._completed(event['task'], event.get('completed_at'),
+                                                     event['task'].get('priority'), -1))
+            case 'reload':
+                # Maybe changed by someone else: read the table again and check it against the lists
+                if self._unsaved:
+                    self._write()
+                self._days, self._unsaved = None, False
+
+    def flush(self):
+        """Apply the recorded changes and write the table, called by the store's commit."""
+        if self._pending or self._unsaved:
+            self.table()
+            self._write()
+
+    def table(self):
+        # date -> DayRollup, current with the store's lists
+        if self._days is None:
+            # Loaded first: loading a list resets the table (see record())
+            self._store.tasks, self._store.complete_tasks
+            self._days = self._read()
+            if self._days is not None:
+                self._apply(self._pending)
+                self._unsaved = bool(self._pending)
+            if self._days is None or not self._consistent():
+                self._days = self._rebuild()
+                self._unsaved = True
+            self._pending.clear()
+        elif self._pending:
+            self._apply(self._pending)
+            self._unsaved = True
+            self._pending.clear()
+        return self._days
+
+    def days(self):
+        # (date, DayRollup) in date order, without the undated rows
+        return sorted((date, day) for date, day in self.table().items() if date)
+
+    def summary(self):
+        total = DayRollup()
+        for day in self.table().values():
+            total.merge(day)
+        return {'created': total.created, 'deleted': total.deleted, 'completed': total.completed, 'mean_days': total.mean_days,
+                'p50_days': total.percentile(0.5), 'p90_days': total.percentile(0.9),
+                'by_priority': dict(total.priorities)}
+
+    def daily(self, last=14):
+        """The last `last` days with any activity, newest last."""
+        return [dict(date=date, created=day.created, deleted=day.deleted, completed=day.completed, mean_days=day.mean_days,
+                     p50_days=day.percentile(0.5), p90_days=day.percentile(0.9),
+                     by_priority=dict(day.priorities))
+                for date, day in self.days()[-last:]]
+
+    def burndown(self, period='week', last=12):
+        """
+        Created and completed per week (starting Monday) or month, and the
+        tasks still open at the end of it. Deleted tasks are taken off the
+        period they were created in, so the open count of the last period is
+        the active list.
+        """
+        periods, open_tasks = {}, 0
+        for date, day in self.days():
+            start = datetime.date.fromisoformat(date)
+            start = start - datetime.timedelta(days=start.weekday()) if period == 'week' else start.replace(day=1)
+            periods.setdefault(str(start), DayRollup()).merge(day)
+
+        rows = []
+        for start, total in sorted(periods.items()):
+            open_tasks += total.created - total.deleted - total.completed
+            rows.append({'period': start, 'created': total.created, 'deleted': total.deleted,
+                         'completed': total.completed, 'open': open_tasks, 'mean_days': total.mean_days})
+        return rows[-last:]
+
+    def heatmap(self, weeks=12, today=None):
+        """Completions per weekday over the last `weeks` weeks: {'weeks': [monday, ...], 'rows': {weekday: [count, ...]}}."""
+        today = today or datetime.date.today()
+        first = today - datetime.timedelta(days=today.weekday(), weeks=weeks - 1)
+        mondays = [str(first + datetime.timedelta(weeks=week)) for week in range(weeks)]
+        rows = {weekday: [0] * weeks for weekday in WEEKDAYS}
+
+        table = self.table()
+        for offset in range(weeks * 7):
+            day = table.get(str(first + datetime.timedelta(days=offset)))
+            if day is not None:
+                rows[WEEKDAYS[offset % 7]][offset // 7] = day.completed
+        return {'weeks': mondays, 'rows': rows}
+
+    @staticmethod
+    def format_heatmap(heatmap):
+        # One line per weekday, one shaded cell per week
+        busiest = max((max(counts) for counts in heatmap['rows'].values()), default=0) or 1
+        lines = [f"     {heatmap['weeks'][0]} .. {heatmap['weeks'][-1]}"]
+        for weekday, counts in heatmap['rows'].items():
+            cells = ''.join(HEAT[min(len(HEAT) - 1, -(-count * (len(HEAT) - 1) // busiest))] for count in counts)
+            lines.append(f'{weekday}  {cells}  {sum(counts)}')
+        return '\n'.join(lines)
+
+    def _created(self, task, sign, column='created'):
+        # Counted on the day the task was created, also when it is deleted
+        created = _parse(task.get('created_at'))
+        return (column, str(created.date()) if created else '', sign)
+
+    def _completed(self, task, completed_at, priority, sign):
+        created, completed = _parse(task.get('created_at')), _parse(completed_at)
+        seconds = max((completed - created).total_seconds(), 0) if created and completed else None
+        return ('completed', str(completed.date()) if completed else '', seconds,
+                priority if priority in PRIORITIES else 'unknown', sign)
+
+    def _apply(self, deltas):
+        days = self._days
+        for delta in deltas:
+            day = days.get(delta[1])
+            if day is None:
+                day = days[delta[1]] = DayRollup()
+            if delta[0] == 'created':
+                day.created += delta[2]
+                continue
+            if delta[0] == 'deleted':
+                day.deleted += delta[2]
+                continue
+            _, _, seconds, priority, sign = delta
+            day.completed += sign
+            day.priorities[priority] += sign
+            if seconds is not None:
+                day.seconds += sign * seconds
+                day.histogram[_bucket(seconds)] += sign
+                if sign > 0:
+                    day.bound(seconds)
+
+    def _consistent(self):
+        # Totals must match the lists, otherwise the files changed behind our back
+        store = self._store
+        created = sum(day.created for day in self._days.values())
+        completed = sum(day.completed for day in self._days.values())
+        deleted = sum(day.deleted for day in self._days.values())
+        return completed == len(store.complete_tasks) and created - deleted == len(store.tasks) + completed
+
+    def _rebuild(self):
+        tasks, complete_tasks = self._store.tasks, self._store.complete_tasks
+        self._days = {}
+        self._apply([self._created(task, 1) for task in tasks])
+        for task in complete_tasks:
+            self._apply([self._created(task, 1), self._completed(task, task.get('completed_at'), None, 1)])
+        return self._days
+
+    def _read(self):
+        if not os.path.exists(self._path):
+            return None
+        days = {}
+        with open(self._path, newline='') as file:
+            reader = csv.DictReader(file)
+            if reader.fieldnames != FIELDS:
+                return None  # Written by an older version: rebuilt from the lists
+            for row in reader:
+                day = days[row['date']] = DayRollup()
+                day.created, day.deleted = int(row['created']), int(row['deleted'])
+                day.completed = int(row['completed'])
+                day.seconds = float(row['seconds'])
+                if row['fastest']:
+                    day.fastest, day.slowest = float(row['fastest']), float(row['slowest'])
+                day.priorities = {priority: int(row[priority]) for priority in PRIORITY_COLUMNS}
+                day.histogram = [int(count) for count in row['histogram'].split()]
+        return days
+
+    def _write(self):
+        temporary = self._path + '.tmp'
+        with open(temporary, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(FIELDS)
+            for date, day in sorted(self._days.items()):
+                if day.created or day.deleted or day.completed:
+                    writer.writerow([date, day.created, day.deleted, day.completed, round(day.seconds),
+                                     '' if day.fastest is None else round(day.fastest),
+                                     '' if day.slowest is None else round(day.slowest),
+                                     *(day.priorities[priority] for priority in PRIORITY_COLUMNS),
+                                     ' '.join(map(str, day.histogram))])
+        os.replace(temporary, self._path)
+        self._unsaved = False
@@ -0,0 +1,170 @@
+import datetime
+import heapq
+import re
+
+from exceptions import InvalidDateError
+from store import PRIORITIES, TIMESTAMP_FORMAT
+
+
+# Tasks without a due date sort after every dated task
+NO_DUE = '~'
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+
+DUE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+DURATION_PATTERN = re.compile(r'^(\d+)\s*([mhdw])$')
+DURATION_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_duration(text):
+    # '90m', '12h', '3d', '2w' -> timedelta
+    match = DURATION_PATTERN.match(text.strip().lower())
+    if not match:
+        raise InvalidDateError(message=f"Invalid duration '{text}', use e.g. 90m, 12h, 3d or 2w.")
+    return datetime.timedelta(**{DURATION_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def parse_due(text, now=None):
+    """
+    Normalize a due date to 'YYYY-MM-DD HH:MM:SS'.
+
+    Accepts full or partial timestamps, 'today', 'tomorrow' and offsets such
+    as '+3d'. A date without a time means the end of that day.
+    """
+    text = text.strip().lower()
+    now = now or datetime.datetime.now()
+
+    if text in ('today', 'tomorrow'):
+        day = now.date() + datetime.timedelta(days=text == 'tomorrow')
+        return f'{day} 23:59:59'
+
+    if text.startswith('+'):
+        return (now + parse_duration(text[1:])).strftime(TIMESTAMP_FORMAT)
+
+    for due_format in DUE_FORMATS:
+        try:
+            due = datetime.datetime.strptime(text, due_format)
+        except ValueError:
+            continue
+        if due_format == '%Y-%m-%d':
+            due = due.replace(hour=23, minute=59, second=59)
+        return due.strftime(TIMESTAMP_FORMAT)
+
+    raise InvalidDateError(message=f"Invalid due date '{text}', use YYYY-MM-DD [HH:MM], today, tomorrow or +3d.")
+
+
+def schedule_key(task):
+    return (task.get('due_at') or NO_DUE, PRIORITY_RANK.get(task.get('priority'), len(PRIORITIES)),
+            task.get('created_at') or '')
+
+
+class TaskScheduler:
+    """
+    Min-heap of the active tasks ordered by (due, priority, created_at).
+
+    Kept up to date from the store's change events: new and edited tasks push
+    a fresh entry, removed ones are dropped from `_live` and their heap entries
+    skipped as stale until the heap is compacted. Queries walk the heap from
+    the root without popping, so reading k tasks costs O(k log k).
+    """
+
+    __slots__ = ('_store', '_heap', '_live', '_counter', '_stale')
+
+    def __init__(self, store):
+        self._store = store
+        self._heap = []
+        # id(task) -> the task's current heap entry
+        self._live = {}
+        self._counter = 0
+        self._stale = 0
+        store.subscribe(self._apply)
+        self._rebuild()
+
+    def __len__(self):
+        return len(self._live)
+
+    def next(self, count):
+        # The `count` most urgent tasks, overdue ones first
+        return self._smallest(count=count)
+
+    def overdue(self, now=None):
+        now = now or datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+        return [task for task in self._smallest(before=now) if task['due_at'] < now]
+
+    def due_within(self, duration, now=None):
+        # Tasks due between now and now + duration, not counting overdue ones
+        now = now or datetime.datetime.now()
+        start = now.strftime(TIMESTAMP_FORMAT)
+        end = (now + duration).strftime(TIMESTAMP_FORMAT)
+        return [task for task in self._smallest(before=end) if task['due_at'] >= start]
+
+    def _smallest(self, count=None, before=None):
+        # Best-first walk of the heap: a node is only visited after its parent
+        heap, results = self._heap, []
+        frontier = [(heap[0], 0)] if heap else []
+
+        while frontier and (count is None or len(results) < count):
+            entry, node = heapq.heappop(frontier)
+            if before is not None and entry[0] > before:
+                break
+            task = entry[-1]
+            if self._live.get(id(task)) is entry:
+                results.append(task)
+            for child in (2 * node + 1, 2 * node + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+        return results
+
+    def _push(self, task):
+        if id(task) in self._live:
+            self._stale += 1
+        # The counter breaks ties so tasks themselves are never compared
+        self._counter += 1
+        entry = [*schedule_key(task), self._counter, task]
+        self._live[id(task)] = entry
+        heapq.heappush(self._heap, entry)
+        self._compact_if_stale()
+
+    def _remove(self, task):
+        if self._live.pop(id(task), None) is not None:
+            self._stale += 1
+        self._compact_if_stale()
+
+    def _compact_if_stale(self):
+        # Stale entries only slow the walks down, drop them once they outnumber live ones
+        if self._stale > len(self._live) + 64:
+            self._compact()
+
+    def _compact(self):
+        self._heap = list(self._live.values())
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def _rebuild(self):
+        self._live = {}
+        for task in self._store.tasks:
+            self._counter += 1
+            self._live[id(task)] = [*schedule_key(task), self._counter, task]
+        self._compact()
+
+    def _apply(self, event):
+        match event['op']:
+            case 'batch':
+                for child in event['events']:
+                    self._apply(child)
+            case 'add' | 'uncomplete':
+                self._push(event['task'])
+            case 'delete' | 'complete':
+                self._remove(event['task'])
+            case 'edit':
+                entry = self._live.get(id(event['task']))
+                if entry is None or entry[:3] != list(schedule_key(event['task'])):
+                    self._push(event['task'])
+            case 'clear':
+                self._live.clear()
+                self._compact()
+            case 'restore':
+                for task in event['tasks']:
+                    self._push(task)
+            case 'reload' if event['file'] == self._store.tasks_file:
+                self._rebuild()
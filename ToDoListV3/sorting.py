@@ -0,0 +1,142 @@
+"""
+Multi-key sorting of task lists, e.g. 'priority,-created,text': by priority
+(high first), then newest first, then by text. A '-' prefix or a ':desc'
+suffix sorts a key descending.
+
+Sort keys are computed once per row into one column per key, and rows are
+sorted by the first column only: rows left tied are sorted by the next one,
+run by run. A listing that only needs the first N rows (sort_tasks(...,
+count=N)) never sorts the whole list: heapq picks the N-th best value of
+the first key, rows better than it are sorted (fewer than N of them) and
+the top of the tied ones is picked the same way by the next key.
+"""
+import heapq
+from itertools import chain, compress, islice
+from operator import eq, not_
+
+from exceptions import QuerySyntaxError
+from store import PRIORITIES
+
+
+# Tasks without a due date sort after every dated task (before them descending)
+NO_DUE = '~'
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+
+# Key -> the column of its sort keys for a task list
+SORT_COLUMNS = {
+    'priority': lambda tasks: [PRIORITY_RANK.get(task.get('priority'), len(PRIORITIES)) for task in tasks],
+    'created': lambda tasks: [task.get('created_at') or '' for task in tasks],
+    'due': lambda tasks: [task.get('due_at') or NO_DUE for task in tasks],
+    'completed': lambda tasks: [task.get('completed_at') or '' for task in tasks],
+    'text': lambda tasks: [task['task'].casefold() for task in tasks],
+    'id': lambda tasks: [int(task['task_id']) for task in tasks],
+}
+# Tied runs up to this long are sorted key by key rather than split further
+SMALL_RUN = 32
+SORT_ALIASES = {'created_at': 'created', 'due_at': 'due', 'completed_at': 'completed', 'task': 'text',
+                'task_id': 'id'}
+# The scheduler's heap order (see scheduler.schedule_key), its top N needs no sort at all
+SCHEDULE_ORDER = (('due', False), ('priority', False), ('created', False))
+
+
+def parse_sort(text):
+    """'priority,-created,text' -> (('priority', False), ('created', True), ('text', False))"""
+    spec = []
+    for part in text.replace(' ', ',').split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        descending = part.startswith('-')
+        field, _, direction = part.lstrip('-+').partition(':')
+        field = SORT_ALIASES.get(field, field)
+        if field not in SORT_COLUMNS or direction not in ('', 'asc', 'desc'):
+            raise QuerySyntaxError(message=f"Invalid sort key '{part}', use {', '.join(SORT_COLUMNS)} "
+                                           f"with '-' or ':desc' for descending.")
+        spec.append((field, descending or direction == 'desc'))
+    return tuple(spec)
+
+
+def sort_tasks(tasks, spec, count=None):
+    """`tasks` ordered by `spec` (see parse_sort()), only the first `count` of them when given."""
+    if not spec:
+        return list(tasks[:count] if count is not None else tasks)
+    columns = [SORT_COLUMNS[field](tasks) for field, _ in spec]
+    descending = [descending for _, descending in spec]
+    rows = list(range(len(tasks)))
+    if count is not None and count < len(rows):
+        rows = _top(rows, columns, descending, count)
+    else:
+        rows = _sort(rows, columns, descending)
+    return [tasks[row] for row in rows]
+
+
+def sort_active(store, spec, count=None):
+    # The active list of a store sorted, cached until it changes; the top N of the scheduler order comes from its heap
+    if count is not None and spec == SCHEDULE_ORDER:
+        return store.scheduler.next(count)
+    return store.cached(('sort', spec, count), lambda: sort_tasks(store.tasks, spec, count))
+
+
+def _sort(rows, columns, descending):
+    # Stable sort of row numbers by the first column, tied runs by the following ones
+    if len(rows) <= SMALL_RUN:
+        # Least significant key first, every sort keeps the order of the ties
+        for column, reverse in reversed(list(zip(columns, descending))):
+            rows.sort(key=column.__getitem__, reverse=reverse)
+        return rows
+
+    column = columns[0]
+    rows.sort(key=column.__getitem__, reverse=descending[0])
+    if len(columns) == 1:
+        return rows
+
+    keys = list(map(column.__getitem__, rows))
+    # equal[i]: row i ties with row i + 1
+    equal = list(map(eq, keys, islice(keys, 1, None)))
+    ties = sum(equal)
+    if not ties:
+        return rows
+
+    if ties * 2 > len(rows):
+        # Few distinct keys (e.g. priorities): walk the boundaries between runs
+        start = 0
+        for position in chain(compress(range(len(rows) - 1), map(not_, equal)), (len(rows) - 1,)):
+            if position > start:
+                rows[start:position + 1] = _sort(rows[start:position + 1], columns[1:], descending[1:])
+            start = position + 1
+        return rows
+
+    # Mostly distinct keys: walk the ties
+    start = end = None
+    for position in compress(range(len(rows) - 1), equal):
+        if position != end:
+            if start is not None:
+                rows[start:end + 1] = _sort(rows[start:end + 1], columns[1:], descending[1:])
+            start = position
+        end = position + 1
+    rows[start:end + 1] = _sort(rows[start:end + 1], columns[1:], descending[1:])
+    return rows
+
+
+def _top(rows, columns, descending, count):
+    # First `count` rows of _sort(rows, ...) without sorting all of them
+    if count <= 0:
+        return []
+    if len(rows) <= count:
+        return _sort(rows, columns, descending)
+
+    column = columns[0]
+    values = map(column.__getitem__, rows)
+    threshold = (heapq.nlargest if descending[0] else heapq.nsmallest)(count, values)[-1]
+    if descending[0]:
+        better = [row for row in rows if column[row] > threshold]
+    else:
+        better = [row for row in rows if column[row] < threshold]
+    tied = [row for row in rows if column[row] == threshold]
+
+    wanted = count - len(better)
+    if len(columns) == 1:
+        tied = tied[:wanted]  # Equal on every key: list order
+    else:
+        tied = _top(tied, columns[1:], descending[1:], wanted)
+    return _sort(better, columns, descending) + tied
@@ -0,0 +1,716 @@
+import csv
+import os
+import datetime
+from contextlib import contextmanager
+
+from durability import DURABILITY_MODES
+
+
+TASK_FIELDS = ['task_id', 'task', 'created_at', 'priority', 'due_at', 'recurrence', 'tags', 'project', 'uid', 'parent',
+               'blocked_by', 'updated_at']
+COMPLETE_TASK_FIELDS = ['task_id', 'task', 'created_at', 'completed_at', 'due_at', 'recurrence', 'tags', 'project',
+                        'uid', 'parent', 'blocked_by', 'updated_at']
+PRIORITIES = ('high', 'medium', 'low')
+# What a store can hold in memory, see page_out()
+SEGMENTS = ('tasks', 'archive', 'index', 'scheduler', 'graph', 'views', 'duplicates', 'completions')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def now_timestamp():
+    return datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+def journal_dir(tasks_file):
+    # Where a store opened with journal=True keeps its lists, see journal.py
+    return os.path.splitext(tasks_file)[0] + '.journal'
+
+
+def journaled(tasks_file):
+    # True once the journal holds the lists: the CSV files stopped changing then
+    return os.path.exists(os.path.join(journal_dir(tasks_file), 'MANIFEST'))
+
+
+def new_uid():
+    # Stable task identity; task_id is the list position and changes
+    return os.urandom(6).hex()
+
+
+class TaskStore:
+    """
+    In-memory copy of the active and completed task CSV files.
+
+    Lists are loaded once and reloaded only when a file changes on disk.
+    Mutations bump `generation`, mark the touched files dirty and notify the
+    subscribed listeners; with `autocommit` they are written straight away,
+    otherwise `commit()` writes every dirty file in one go, as durably as
+    `durability` asks (see durability.py).
+    """
+
+    # Columns add() and edit() set verbatim, '' clearing them
+    OPTIONAL_FIELDS = ('due_at', 'recurrence', 'tags', 'project', 'uid', 'parent', 'blocked_by')
+
+    __slots__ = ('_tasks_file', '_complete_tasks_file', '_tasks', '_complete_tasks', '_file_states',
+                 '_dirty', 'autocommit', 'generation', '_index', '_index_generation', '_stats', '_stats_generation', '_listeners',
+                 '_batch_events', '_scheduler', '_graph', '_views', 'budget', '_paged_out', '_journal', 'durability', 'group_commit',
+                 '_uncommitted', '_query_cache', '_rollups', '_duplicates', 'bloom_archive', '_completions',
+                 '_commit_hooks')
+
+    def __init__(self, tasks_file="tasks.csv", completed_tasks_file="complete_tasks.csv", autocommit=True,
+                 journal=False, durability='flush', group_commit=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability '{durability}', use one of: {', '.join(DURABILITY_MODES)}.")
+        self._tasks_file = tasks_file
+        self._complete_tasks_file = completed_tasks_file
+        self._tasks = None
+        self._complete_tasks = None
+        self._file_states = {}
+        self._dirty = set()
+        self.autocommit = autocommit
+        self.generation = 0
+        self._index = None
+        self._index_generation = -1
+        self._stats = None
+        self._stats_generation = -1
+        self._listeners = []
+        # Called after every write of the lists, see add_commit_hook()
+        self._commit_hooks = []
+        self._batch_events = None
+        self._scheduler = None
+        self._graph = None
+        self._views = None
+        self._duplicates = None
+        # Completed texts go into a Bloom filter rather than the duplicate index, see dedupe.py
+        self.bloom_archive = False
+        # Results of search() and cached(), see query.QueryCache
+        self._query_cache = None
+        # Optional memory.MemoryBudget the lists and indexes are charged to
+        self.budget = None
+        self._paged_out = set()
+        # Append-only journal instead of rewriting the CSV files, see journal.py
+        self._journal = None
+        if not journal and journaled(tasks_file):
+            from exceptions import JournaledStoreError
+            raise JournaledStoreError(
+                message=f"{tasks_file} is kept in the journal {journal_dir(tasks_file)}: serve it with --journal, "
+                        f"or stop the daemon and run 'python journal.py release' to go back to the CSV files.")
+        if journal:
+            from journal import Journal
+            self._journal = Journal(tasks_file, completed_tasks_file)
+            self.subscribe(self._journal.record)
+        self.durability = durability
+        # Shared durability.GroupCommit of the 'group' mode
+        self.group_commit = group_commit
+        if durability == 'group' and group_commit is None:
+            from durability import GroupCommit
+            self.group_commit = GroupCommit()
+        # Changes since the last write, a group commit counts them
+        self._uncommitted = 0
+        # Per-day history written with every commit, see rollups.py
+        from rollups import Rollups
+        self._rollups = Rollups(self)
+        # Texts typed so far, for autocomplete (see autocomplete.py)
+        from autocomplete import Autocomplete
+        self._completions = Autocomplete(self)
+
+    @property
+    def tasks_file(self):
+        return self._tasks_file
+
+    @tasks_file.setter
+    def tasks_file(self, filename):
+        self._tasks_file = filename
+        self._tasks = None
+
+    @property
+    def complete_tasks_file(self):
+        return self._complete_tasks_file
+
+    @complete_tasks_file.setter
+    def complete_tasks_file(self, filename):
+        self._complete_tasks_file = filename
+        self._complete_tasks = None
+
+    @property
+    def journal(self):
+        return self._journal
+
+    @property
+    def rollups(self):
+        return self._rollups
+
+    @property
+    def dirty(self):
+        return bool(self._dirty)
+
+    @property
+    def batch_events(self):
+        # Changes made inside the open batch(), listeners hear of them when it ends
+        return self._batch_events or ()
+
+    def bootstrap(self):
+        # Create the CSV files with headers if they don't exist
+        for filename, fields in ((self._tasks_file, TASK_FIELDS), (self._complete_tasks_file, COMPLETE_TASK_FIELDS)):
+            if not os.path.exists(filename):
+                with open(filename, 'w', newline='') as file:
+                    writer = csv.DictWriter(file, fieldnames=fields)
+                    writer.writeheader()
+
+    @property
+    def tasks(self):
+        if self._tasks is None or self._changed_on_disk(self._tasks_file):
+            page_in = self._paging_in(self._tasks_file)
+            self._tasks = self._load(self._tasks_file)
+            self._loaded('tasks', self._tasks_file, page_in)
+        elif self.budget is not None:
+            self.budget.touch(self, 'tasks')
+        return self._tasks
+
+    @property
+    def complete_tasks(self):
+        if self._complete_tasks is None or self._changed_on_disk(self._complete_tasks_file):
+            page_in = self._paging_in(self._complete_tasks_file)
+            self._complete_tasks = self._load(self._complete_tasks_file)
+            self._loaded('archive', self._complete_tasks_file, page_in)
+        elif self.budget is not None:
+            self.budget.touch(self, 'archive')
+        return self._complete_tasks
+
+    @property
+    def index(self):
+        # Query indexes are rebuilt lazily, at most once per generation
+        tasks, complete_tasks = self.tasks, self.complete_tasks
+        if self._index_generation != self.generation:
+            from query import TaskIndex
+            self._index = TaskIndex(tasks, complete_tasks)
+            self._index_generation = self.generation
+            self._charge('index')
+        elif self.budget is not None:
+            self.budget.touch(self, 'index')
+        return self._index
+
+    @property
+    def indexed(self):
+        # True while `index` is current, i.e. reading it costs nothing
+        return self._index is not None and self._index_generation == self.generation
+
+    @property
+    def query_cache(self):
+        if self._query_cache is None:
+            from query import QueryCache
+            self._query_cache = QueryCache()
+        return self._query_cache
+
+    @property
+    def scheduler(self):
+        # Built on first use, then kept current from change events
+        if self._scheduler is None:
+            from scheduler import TaskScheduler
+            self._scheduler = TaskScheduler(self)
+            self._charge('scheduler')
+        elif self.budget is not None:
+            self.budget.touch(self, 'scheduler')
+        return self._scheduler
+
+    @property
+    def graph(self):
+        # Subtask / blocked-by links, built on first use like the scheduler
+        if self._graph is None:
+            from dependencies import TaskGraph
+            self._graph = TaskGraph(self)
+            self._charge('graph')
+        elif self.budget is not None:
+            self.budget.touch(self, 'graph')
+        return self._graph
+
+    @property
+    def views(self):
+        # Saved searches kept materialized, see views.py
+        if self._views is None:
+            from views import SavedSearches
+            self._views = SavedSearches(self)
+            self._charge('views')
+        elif self.budget is not None:
+            self.budget.touch(self, 'views')
+        return self._views
+
+    @property
+    def duplicates(self):
+        # Folded task texts for duplicate checks, see dedupe.py
+        if self._duplicates is None:
+            from dedupe import DuplicateIndex
+            self._duplicates = DuplicateIndex(self, bloom=self.bloom_archive)
+            self._charge('duplicates')
+        elif self.budget is not None:
+            self.budget.touch(self, 'duplicates')
+        return self._duplicates
+
+    @property
+    def completions(self):
+        # The trie is read from disk on first use
+        if not self._completions.loaded:
+            self._completions.trie()
+            self._charge('completions')
+        elif self.budget is not None:
+            self.budget.touch(self, 'completions')
+        return self._completions
+
+    def segment_size(self, segment):
+        # Estimated bytes of a segment held in memory, 0 when it is not
+        from memory import (COMPLETION_ROW_BYTES, DUPLICATE_ROW_BYTES, GRAPH_ROW_BYTES, INDEX_ROW_BYTES,
+                            SCHEDULER_ROW_BYTES, VIEW_ROW_BYTES, estimate_rows)
+        match segment:
+            case 'tasks':
+                return estimate_rows(self._tasks) if self._tasks is not None else 0
+            case 'archive':
+                return estimate_rows(self._complete_tasks) if self._complete_tasks is not None else 0
+            case 'index':
+                return len(self._index.rows) * INDEX_ROW_BYTES if self._index is not None else 0
+            case 'scheduler':
+                return len(self._scheduler) * SCHEDULER_ROW_BYTES if self._scheduler is not None else 0
+            case 'graph':
+                return len(self._graph) * GRAPH_ROW_BYTES if self._graph is not None else 0
+            case 'views':
+                return len(self._views) * VIEW_ROW_BYTES if self._views is not None else 0
+            case 'duplicates':
+                if self._duplicates is None:
+                    return 0
+                return len(self._duplicates) * DUPLICATE_ROW_BYTES + self._duplicates.bloom_bytes
+            case 'completions':
+                return len(self._completions) * COMPLETION_ROW_BYTES
+        raise ValueError(segment)
+
+    def page_out(self, segment=None):
+        """
+        Drop a segment from memory (all of them when None); returns the bytes
+        released from the budget. Lists come back from disk on their next use,
+        so lists with unsaved changes stay. Structures built from a list are
+        dropped with it.
+        """
+        if segment is None:
+            return sum(self.page_out(name) for name in SEGMENTS)
+
+        freed = 0
+        match segment:
+            case 'tasks' | 'archive':
+                filename = self._tasks_file if segment == 'tasks' else self._complete_tasks_file
+                attribute = '_tasks' if segment == 'tasks' else '_complete_tasks'
+                if getattr(self, attribute) is None or filename in self._dirty:
+                    return 0
+                freed += (self.page_out('index') + self.page_out('graph') + self.page_out('views')
+                          + self.page_out('duplicates'))
+                if segment == 'tasks':
+                    freed += self.page_out('scheduler')
+                setattr(self, attribute, None)
+                self._paged_out.add(filename)
+            case 'index':
+                if self._query_cache is not None:
+                    self._query_cache.clear()  # Results hold on to the rows too
+                if self._index is None:
+                    return 0
+                self._index, self._index_generation = None, -1
+            case 'completions':
+                # Not built from the lists: kept in its own files, paged out on its own
+                if not self._completions.loaded:
+                    return 0
+                self._completions.unload()
+            case 'scheduler' | 'graph' | 'views' | 'duplicates':
+                attribute = f'_{segment}'
+                listener = getattr(self, attribute)
+                if listener is None:
+                    return 0
+                self.unsubscribe(listener._apply)
+                setattr(self, attribute, None)
+
+        if self.budget is not None:
+            freed += self.budget.release(self, segment, evicted=True)
+        return freed
+
+    def stats(self):
+        tasks, complete_tasks = self.tasks, self.complete_tasks
+        if self._stats_generation == self.generation:
+            return self._stats
+
+        by_priority = {priority: 0 for priority in PRIORITIES}
+        for task in tasks:
+            if task.get('priority') in by_priority:
+                by_priority[task['priority']] += 1
+
+        self._stats = {
+            'active': len(tasks),
+            'completed': len(complete_tasks),
+            'by_priority': by_priority,
+            # From the daily rollups, not a rescan of the archive
+            'average_completion_days': self._rollups.summary()['mean_days'],
+        }
+        self._stats_generation = self.generation
+        return self._stats
+
+    def search(self, query_text):
+        from query import normalize_query, run_query
+        return self.cached(('query', normalize_query(query_text)), lambda: run_query(self.index, query_text))
+
+    def cached(self, key, compute):
+        # compute() once per key until the lists change, in memory or on disk
+        self.tasks, self.complete_tasks
+        return self.query_cache.get(key, self.generation, compute)
+
+    def add(self, text, priority, created_at=None, **optional):
+        self._check_optional(optional)
+        task = {
+            'task_id': len(self.tasks) + 1,
+            'task': text,
+            'created_at': created_at or now_timestamp(),
+            'priority': priority,
+        }
+        task.update({field: optional.get(field) or '' for field in self.OPTIONAL_FIELDS})
+        task['uid'] = task['uid'] or new_uid()
+        return self.insert(len(self.tasks), task, restored=False)
+
+    def insert(self, position, task, restored=True):
+        # Put a task at `position`, appending when it is the list length; restored: a deleted task put back (undo/redo)
+        tasks = self.tasks
+        tasks.insert(position, task)
+        self._renumber(tasks, position)
+        event = {'op': 'add', 'position': position, 'task': task}
+        if restored:
+            event['restored'] = True
+        self._mark_changed(event, self._tasks_file)
+        return task
+
+    def delete(self, position):
+        tasks = self.tasks
+        deleted_task = tasks.pop(position)
+        self._renumber(tasks, position)
+        self._mark_changed({'op': 'delete', 'position': position, 'task': deleted_task}, self._tasks_file)
+        return deleted_task
+
+    def complete(self, position, completed_at=None):
+        tasks, complete_tasks = self.tasks, self.complete_tasks
+
+        # Move task from active to completed, priority is no longer needed
+        completed_task = tasks.pop(position)
+        completed_task['completed_at'] = completed_at or now_timestamp()
+        priority = completed_task.pop('priority', None)
+        complete_tasks.append(completed_task)
+
+        self._renumber(tasks, position)
+        self._mark_changed({'op': 'complete', 'position': position, 'complete_position': len(complete_tasks) - 1,
+                            'priority': priority, 'task': completed_task},
+                           self._tasks_file, self._complete_tasks_file)
+        return completed_task
+
+    def uncomplete(self, complete_position, position, priority):
+        # Inverse of complete(): move a completed task back into the active list
+        tasks = self.tasks
+        task = self.complete_tasks.pop(complete_position)
+        completed_at = task.pop('completed_at', None)
+        task['priority'] = priority
+        tasks.insert(position, task)
+
+        self._renumber(tasks, position)
+        self._mark_changed({'op': 'uncomplete', 'position': position, 'complete_position': complete_position,
+                            'completed_at': completed_at, 'task': task},
+                           self._tasks_file, self._complete_tasks_file)
+        return task
+
+    def edit(self, position, text=None, priority=None, **optional):
+        # An empty optional field (due_at, tags, ...) removes it, None keeps it
+        self._check_optional(optional)
+        task = self.tasks[position]
+        old = {'task': task['task'], 'priority': task.get('priority')}
+        old.update({field: task.get(field) or '' for field in self.OPTIONAL_FIELDS})
+        if text:
+            task['task'] = text
+        if priority:
+            task['priority'] = priority
+        for field, value in optional.items():
+            if value is not None:
+                task[field] = value
+        self._mark_changed({'op': 'edit', 'position': position, 'old': old, 'task': task}, self._tasks_file)
+        return task
+
+    def clear(self):
+        tasks = self.tasks
+        cleared_tasks = tasks[:]
+        tasks.clear()
+        self._mark_changed({'op': 'clear', 'tasks': cleared_tasks}, self._tasks_file)
+        return cleared_tasks
+
+    def restore(self, cleared_tasks):
+        # Inverse of clear(): only valid while the active list is still empty
+        tasks = self.tasks
+        tasks.extend(cleared_tasks)
+        self._renumber(tasks, 0)
+        self._mark_changed({'op': 'restore', 'tasks': cleared_tasks}, self._tasks_file)
+        return cleared_tasks
+
+    def delete_many(self, positions):
+        # Delete every selected task in one pass over the list
+        tasks = self.tasks
+        positions = sorted(set(positions))
+        selected = set(positions)
+
+        with self.batch(bulk='delete'):
+            # Positions as seen by sequential deletes in ascending order
+            deleted_tasks = []
+            for shift, position in enumerate(positions):
+                deleted_tasks.append(tasks[position])
+                self._mark_changed({'op': 'delete', 'position': position - shift, 'task': tasks[position]},
+                                   self._tasks_file)
+
+            tasks[:] = [task for position, task in enumerate(tasks) if position not in selected]
+            self._renumber(tasks, positions[0] if positions else len(tasks))
+        return deleted_tasks
+
+    def insert_many(self, positioned_tasks):
+        # Inverse of delete_many(): (original position, task) pairs in ascending order
+        tasks = self.tasks
+        merged, source = [], iter(tasks)
+
+        with self.batch():
+            for position, task in positioned_tasks:
+                while len(merged) < position:
+                    merged.append(next(source))
+                merged.append(task)
+                self._mark_changed({'op': 'add', 'position': position, 'task': task, 'restored': True},
+                                   self._tasks_file)
+
+            merged.extend(source)
+            tasks[:] = merged
+            self._renumber(tasks, positioned_tasks[0][0] if positioned_tasks else len(tasks))
+        return [task for _, task in positioned_tasks]
+
+    def complete_many(self, positions, completed_at=None):
+        # Move every selected task to the completed list in one pass
+        tasks, complete_tasks = self.tasks, self.complete_tasks
+        positions = sorted(set(positions))
+        selected = set(positions)
+        completed_at = completed_at or now_timestamp()
+
+        with self.batch(bulk='complete'):
+            completed_tasks = []
+            for shift, position in enumerate(positions):
+                completed_task = tasks[position]
+                completed_task['completed_at'] = completed_at
+                priority = completed_task.pop('priority', None)
+                complete_tasks.append(completed_task)
+                completed_tasks.append(completed_task)
+                self._mark_changed({'op': 'complete', 'position': position - shift,
+                                    'complete_position': len(complete_tasks) - 1, 'priority': priority,
+                                    'task': completed_task},
+                                   self._tasks_file, self._complete_tasks_file)
+
+            tasks[:] = [task for position, task in enumerate(tasks) if position not in selected]
+            self._renumber(tasks, positions[0] if positions else len(tasks))
+        return completed_tasks
+
+    def uncomplete_many(self, entries):
+        # Inverse of complete_many(): (original position, priority) pairs for the last completed tasks
+        tasks, complete_tasks = self.tasks, self.complete_tasks
+        start = len(complete_tasks) - len(entries)
+        restored = complete_tasks[start:]
+        del complete_tasks[start:]
+
+        merged, source = [], iter(tasks)
+        with self.batch():
+            for offset, ((position, priority), task) in enumerate(zip(entries, restored)):
+                completed_at = task.pop('completed_at', None)
+                task['priority'] = priority
+                while len(merged) < position:
+                    merged.append(next(source))
+                merged.append(task)
+                self._mark_changed({'op': 'uncomplete', 'position': position, 'complete_position': start + offset,
+                                    'completed_at': completed_at, 'task': task},
+                                   self._tasks_file, self._complete_tasks_file)
+
+            merged.extend(source)
+            tasks[:] = merged
+            self._renumber(tasks, entries[0][0] if entries else len(tasks))
+        return restored
+
+    def edit_many(self, positions, text=None, priority=None, **optional):
+        with self.batch():
+            return [self.edit(position, text=text, priority=priority, **optional)
+                    for position in sorted(set(positions))]
+
+    @contextmanager
+    def batch(self, bulk=None):
+        """
+        Group mutations into one change: listeners get a single
+        {'op': 'batch', 'events': [...]} event and autocommit writes once.
+        `bulk` tags batches made by delete_many() / complete_many(), whose
+        events hold ascending positions shifted by the rows removed before them.
+        """
+        if self._batch_events is not None:
+            yield  # Already inside a batch
+            return
+
+        self._batch_events = []
+        try:
+            yield
+        finally:
+            events, self._batch_events = self._batch_events, None
+            if events:
+                self._notify({'op': 'batch', 'bulk': bulk, 'events': events})
+                if self.autocommit:
+                    self.commit()
+
+    def subscribe(self, listener):
+        # listener(event) is called after every mutation with a dict describing it,
+        # and with {'op': 'reload'} whenever a list is (re)loaded from disk
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def add_commit_hook(self, hook):
+        # hook() runs once the lists are written, by commit() or sync(), and returns the files it wrote;
+        # they are made as durable as the lists (e.g. the change feed, see changefeed.py)
+        self._commit_hooks.append(hook)
+
+    def remove_commit_hook(self, hook):
+        self._commit_hooks.remove(hook)
+
+    def commit(self):
+        # Write every file touched since the last commit
+        match self.durability:
+            case 'none':
+                return  # Kept in memory until sync()
+            case 'fsync':
+                from durability import fsync_paths
+                fsync_paths(self._write())
+            case 'group':
+                changes = self._uncommitted
+                written = self._write()
+                if written:
+                    self.group_commit.written(written, changes)
+            case _:
+                self._write()
+
+    def sync(self):
+        """Write whatever is pending, also in durability 'none', and fsync it unless the mode is 'flush'."""
+        from durability import fsync_paths
+
+        written = self._write()
+        if self.durability == 'flush':
+            return
+        if self.group_commit is not None:
+            self.group_commit.sync()
+        if self._journal is not None:
+            self._journal.sync()
+            fsync_paths(written)
+        else:
+            fsync_paths(sorted({self._tasks_file, self._complete_tasks_file, *written}))
+
+    def _write(self):
+        # Write the dirty lists, returns the files written
+        self._uncommitted = 0
+        if self._journal is not None:
+            # Only the changes are appended
+            written = self._journal.commit()
+            self._dirty.clear()
+            self._rollups.flush()
+            self._completions.flush()
+            return ([written] if written else []) + self._run_commit_hooks()
+        written = sorted(self._dirty)
+        for filename in written:
+            if filename == self._tasks_file:
+                self._save(filename, self._tasks, TASK_FIELDS)
+            else:
+                self._save(filename, self._complete_tasks, COMPLETE_TASK_FIELDS)
+        self._dirty.clear()
+        self._rollups.flush()
+        self._completions.flush()
+        return written + self._run_commit_hooks()
+
+    def _run_commit_hooks(self):
+        return [path for hook in self._commit_hooks for path in hook()]
+
+    @classmethod
+    def _check_optional(cls, optional):
+        unknown = optional.keys() - set(cls.OPTIONAL_FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown task fields: {', '.join(sorted(unknown))}")
+
+    @staticmethod
+    def _renumber(tasks, start):
+        # Reassign task IDs to maintain sequence
+        for idx in range(start, len(tasks)):
+            tasks[idx]['task_id'] = idx + 1
+
+    def _mark_changed(self, event, *filenames):
+        self.generation += 1
+        self._uncommitted += 1
+        self._dirty.update(filenames)
+
+        # Stamp rows that now exist in their changed form, for incremental exports
+        if event['op'] == 'restore':
+            updated_at = now_timestamp()
+            for task in event['tasks']:
+                task['updated_at'] = updated_at
+        elif 'task' in event and event['op'] != 'delete':
+            event['task']['updated_at'] = now_timestamp()
+
+        # Inside batch() listeners and commits wait for the end of the batch
+        if self._batch_events is not None:
+            self._batch_events.append(event)
+            return
+
+        self._notify(event)
+        if self.autocommit:
+            self.commit()
+
+    def _paging_in(self, filename):
+        # A list paged out and unchanged on disk since comes back as it was
+        page_in = filename in self._paged_out and not self._changed_on_disk(filename)
+        self._paged_out.discard(filename)
+        return page_in
+
+    def _loaded(self, segment, filename, page_in):
+        # Listeners keep their state over a page in, the rows are the same
+        if not page_in:
+            self._notify({'op': 'reload', 'file': filename})
+        self._charge(segment, page_in)
+
+    def _charge(self, segment, page_in=False):
+        if self.budget is not None:
+            self.budget.charge(self, segment, self.segment_size(segment), page_in)
+
+    def _notify(self, event):
+        for listener in self._listeners:
+            listener(event)
+
+    @staticmethod
+    def _file_state(filename):
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _changed_on_disk(self, filename):
+        # Unsaved changes win over whatever is on disk; a journaled store is the only writer of its journal
+        if filename in self._dirty or self._journal is not None:
+            return False
+        return self._file_states.get(filename) != self._file_state(filename)
+
+    def _load(self, filename):
+        self._file_states[filename] = self._file_state(filename)
+        self.generation += 1
+
+        if self._journal is not None:
+            return self._journal.load(completed=filename == self._complete_tasks_file)
+
+        if not os.path.exists(filename):
+            return []
+
+        with open(filename, 'r', newline='') as file:
+            reader = csv.DictReader(file)
+            return [row for row in reader]  # dictionaries add to my list
+
+    def _save(self, filename, tasks_list, fieldnames):
+        with open(filename, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(tasks_list)
+        self._file_states[filename] = self._file_state(filename)
@@ -0,0 +1,61 @@
+"""
+Regression checks for the dependency graph (python -m pytest test_dependencies.py).
+"""
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dependencies import add_blocker, remove_blocker  # noqa: E402
+from exceptions import DependencyCycleError  # noqa: E402
+from store import TaskStore  # noqa: E402
+
+
+def legacy_store(directory, texts):
+    # Tasks written before the uid, parent and blocked_by columns existed
+    tasks_file = os.path.join(directory, 'tasks.csv')
+    with open(tasks_file, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=['task_id', 'task', 'created_at', 'priority'])
+        writer.writeheader()
+        for number, text in enumerate(texts, start=1):
+            writer.writerow({'task_id': number, 'task': text, 'created_at': '2024-01-01 09:00:00', 'priority': 'low'})
+    return TaskStore(tasks_file, os.path.join(directory, 'complete_tasks.csv'))
+
+
+def test_unblocking_legacy_rows(tmp_path):
+    # Linking a row without a uid edits it twice in one batch (uid, then blocked_by)
+    store = legacy_store(tmp_path, ['write report', 'collect numbers'])
+    graph = store.graph
+    add_blocker(store, 0, 1)
+    assert graph.pending(store.tasks[0]) == 1
+
+    remove_blocker(store, 0, 1)
+    assert graph.pending(store.tasks[0]) == 0
+    assert [task['task'] for task in graph.ready()] == ['collect numbers', 'write report']
+
+
+def test_blocking_legacy_rows_in_a_batch(tmp_path):
+    store = legacy_store(tmp_path, ['write report', 'collect numbers', 'book room'])
+    graph = store.graph
+    with store.batch():
+        add_blocker(store, 0, 1)
+        add_blocker(store, 0, 2)
+    assert graph.pending(store.tasks[0]) == 2
+
+    remove_blocker(store, 0, 1)
+    remove_blocker(store, 0, 2)
+    assert graph.pending(store.tasks[0]) == 0
+    assert store.tasks[0] in graph.ready()
+
+
+def test_cycle_within_a_batch(tmp_path):
+    # The graph hears of the first link when the batch ends, the check must not miss it
+    store = legacy_store(tmp_path, ['write report', 'collect numbers'])
+    with pytest.raises(DependencyCycleError):
+        with store.batch():
+            add_blocker(store, 0, 1)
+            add_blocker(store, 1, 0)
+    assert store.graph.ready()
@@ -0,0 +1,414 @@
+"""
+Streaming export / import of task stores.
+
+Sources are the V3 CSV files or the V2 `.txt` files; every format is read
+and written row by row (the columnar format one row group at a time), so
+memory stays constant however large the store is.
+
+    python transfer.py export --format jsonl --out tasks.jsonl
+    python transfer.py export --format columnar --out tasks.tdc --watermark-file sync.watermark
+    python transfer.py export --format csv --delimiter ';' --source v2 --v2-dir ../ToDoListV2
+    python transfer.py import --format jsonl --in tasks.jsonl --duplicates reject
+
+With --since / --watermark-file only rows changed since the watermark are
+exported and the newest change time seen is reported (and saved) as the next
+watermark. Change times go down to the second, so rows changed in the
+watermark's second are exported again by the next run: consumers keep the
+last row per uid. Deleted tasks leave no row behind, so they are not part of
+an incremental export. A store kept in a journal (see journal.py) is exported
+as of the journal's last commit.
+"""
+import argparse
+import csv
+import json
+import os
+import struct
+import sys
+import zlib
+
+from dedupe import DUPLICATE_POLICIES, normalize_text
+from journal import read_journal
+from store import TASK_FIELDS, COMPLETE_TASK_FIELDS, journal_dir, journaled
+
+
+EXPORT_FIELDS = ['status', 'task_id', 'task', 'created_at', 'priority', 'due_at', 'recurrence', 'tags', 'project',
+                 'uid', 'parent', 'blocked_by', 'completed_at', 'updated_at']
+FORMATS = ('jsonl', 'csv', 'columnar')
+QUOTING = {'minimal': csv.QUOTE_MINIMAL, 'all': csv.QUOTE_ALL, 'nonnumeric': csv.QUOTE_NONNUMERIC, 'none': csv.QUOTE_NONE}
+
+COLUMNAR_MAGIC = b'TDCOL1'
+ROW_GROUP_SIZE = 4096
+
+
+def changed_at(row):
+    # Newest timestamp known for a row; older files have no updated_at column
+    return row.get('updated_at') or row.get('completed_at') or row.get('created_at') or ''
+
+
+def iter_store_rows(tasks_file, complete_tasks_file, since=None):
+    """Yield active then completed rows of a V3 store, optionally only those changed since `since`."""
+    if journaled(tasks_file):
+        # The CSV files stopped changing when the journal took over
+        tasks, complete_tasks = read_journal(tasks_file)
+        sources = (('active', tasks), ('completed', complete_tasks))
+    else:
+        sources = (('active', _iter_csv(tasks_file)), ('completed', _iter_csv(complete_tasks_file)))
+
+    for status, rows in sources:
+        for row in rows:
+            # Same second as the watermark: maybe changed after it was taken, export it again
+            if since and changed_at(row) < since:
+                continue
+            row['status'] = status
+            yield row
+
+
+def _iter_csv(filename):
+    if not os.path.exists(filename):
+        return
+    with open(filename, 'r', newline='') as file:
+        yield from csv.DictReader(file)
+
+
+def iter_v2_rows(tasks_file, completed_tasks_file):
+    """Yield rows from the V2 text files (one task per line, '----' separators)."""
+    for status, filename in (('active', tasks_file), ('completed', completed_tasks_file)):
+        if not os.path.exists(filename):
+            continue
+        with open(filename, 'r') as file:
+            task_id = 0
+            for line in file:
+                if line.strip() and not line.startswith('----'):
+                    task_id += 1
+                    yield {'status': status, 'task_id': task_id, 'task': line.strip()}
+
+
+# -- JSON Lines ---------------------------------------------------------------
+
+class JsonLinesWriter:
+    def __init__(self, file, fields=EXPORT_FIELDS):
+        self._file = file
+        self._fields = fields
+
+    def write(self, row):
+        record = {field: row[field] for field in self._fields if row.get(field) not in (None, '')}
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._file.flush()
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+# -- CSV ----------------------------------------------------------------------
+
+class CsvWriter:
+    def __init__(self, file, fields=EXPORT_FIELDS, **dialect):
+        self._writer = csv.DictWriter(file, fieldnames=fields, extrasaction='ignore', **dialect)
+        self._writer.writeheader()
+        self._file = file
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def close(self):
+        self._file.flush()
+
+
+def read_csv(file, **dialect):
+    for row in csv.DictReader(file, **dialect):
+        yield {field: value for field, value in row.items() if value not in (None, '')}
+
+
+# -- Columnar -----------------------------------------------------------------
+#
+# magic | u32 header length | JSON list of field names
+# row group: u32 row count, then per field: u32 chunk length | zlib(column chunk)
+# end: u32 0
+#
+# A column chunk is dictionary encoded ('D') when it has few distinct values
+# (status, priority, dates) and plain ('P') otherwise. Strings are stored as
+# varint length + UTF-8 bytes.
+
+def _write_varint(out, number):
+    while number >= 0x80:
+        out.append((number & 0x7F) | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+def _read_varint(data, offset):
+    number, shift = 0, 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, offset
+        shift += 7
+
+
+def _write_strings(out, values):
+    for value in values:
+        encoded = value.encode()
+        _write_varint(out, len(encoded))
+        out += encoded
+
+
+def _read_strings(data, offset, count):
+    values = []
+    for _ in range(count):
+        length, offset = _read_varint(data, offset)
+        values.append(data[offset:offset + length].decode())
+        offset += length
+    return values, offset
+
+
+def _encode_column(values):
+    distinct = list(dict.fromkeys(values))
+    out = bytearray()
+    if len(distinct) <= 255:
+        lookup = {value: code for code, value in enumerate(distinct)}
+        out += b'D'
+        _write_varint(out, len(distinct))
+        _write_strings(out, distinct)
+        out += bytes(lookup[value] for value in values)
+    else:
+        out += b'P'
+        _write_strings(out, values)
+    return zlib.compress(bytes(out))
+
+
+def _decode_column(chunk, count):
+    data = zlib.decompress(chunk)
+    if data[:1] == b'D':
+        size, offset = _read_varint(data, 1)
+        distinct, offset = _read_strings(data, offset, size)
+        return [distinct[code] for code in data[offset:offset + count]]
+    return _read_strings(data, 1, count)[0]
+
+
+class ColumnarWriter:
+    def __init__(self, file, fields=EXPORT_FIELDS, row_group_size=ROW_GROUP_SIZE):
+        self._file = file
+        self._fields = fields
+        self._row_group_size = row_group_size
+        self._columns = [[] for _ in fields]
+
+        header = json.dumps(fields).encode()
+        file.write(COLUMNAR_MAGIC + struct.pack('<I', len(header)) + header)
+
+    def write(self, row):
+        for column, field in zip(self._columns, self._fields):
+            value = row.get(field)
+            column.append('' if value is None else str(value))
+        if len(self._columns[0]) >= self._row_group_size:
+            self._write_row_group()
+
+    def close(self):
+        self._write_row_group()
+        self._file.write(struct.pack('<I', 0))
+        self._file.flush()
+
+    def _write_row_group(self):
+        count = len(self._columns[0])
+        if not count:
+            return
+        self._file.write(struct.pack('<I', count))
+        for column in self._columns:
+            chunk = _encode_column(column)
+            self._file.write(struct.pack('<I', len(chunk)) + chunk)
+            column.clear()
+
+
+def read_columnar(file):
+    if file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError('Not a columnar task export.')
+    (header_length,) = struct.unpack('<I', file.read(4))
+    fields = json.loads(file.read(header_length))
+
+    while True:
+        (count,) = struct.unpack('<I', file.read(4))
+        if not count:
+            return
+        columns = []
+        for _ in fields:
+            (length,) = struct.unpack('<I', file.read(4))
+            columns.append(_decode_column(file.read(length), count))
+        for values in zip(*columns):
+            yield {field: value for field, value in zip(fields, values) if value}
+
+
+# -- Export / import ----------------------------------------------------------
+
+def open_writer(fmt, path, **dialect):
+    if fmt == 'columnar':
+        file = open(path, 'wb')
+        return file, ColumnarWriter(file)
+    file = open(path, 'w', newline='' if fmt == 'csv' else None, encoding='utf-8')
+    return file, (CsvWriter(file, **dialect) if fmt == 'csv' else JsonLinesWriter(file))
+
+
+def open_reader(fmt, path, **dialect):
+    if fmt == 'columnar':
+        file = open(path, 'rb')
+        return file, read_columnar(file)
+    file = open(path, 'r', newline='' if fmt == 'csv' else None, encoding='utf-8')
+    return file, (read_csv(file, **dialect) if fmt == 'csv' else read_jsonl(file))
+
+
+def export_rows(rows, fmt, path, **dialect):
+    """Write rows to `path`; returns (row count, newest change time seen)."""
+    count, watermark = 0, ''
+    file, writer = open_writer(fmt, path, **dialect)
+    with file:
+        for row in rows:
+            writer.write(row)
+            count += 1
+            watermark = max(watermark, changed_at(row))
+        writer.close()
+    return count, watermark
+
+
+def _append_rows(filename, default_fields):
+    # Existing files keep their header; new ones get the current schema
+    if os.path.exists(filename) and os.path.getsize(filename):
+        with open(filename, 'r', newline='') as file:
+            reader = csv.reader(file)
+            fields = next(reader)
+            count = sum(1 for _ in reader)
+        file = open(filename, 'a', newline='')
+    else:
+        fields, count = default_fields, 0
+        file = open(filename, 'w', newline='')
+        csv.writer(file).writerow(fields)
+    return file, csv.DictWriter(file, fieldnames=fields, extrasaction='ignore'), count
+
+
+def _existing_texts(*filenames):
+    # Folded texts of the tasks already in the files, in one pass
+    texts = set()
+    for filename in filenames:
+        if os.path.exists(filename):
+            with open(filename, 'r', newline='') as file:
+                texts.update(normalize_text(row['task'] or '') for row in csv.DictReader(file))
+    return texts
+
+
+def import_rows(rows, tasks_file, complete_tasks_file, duplicates='allow'):
+    """
+    Append rows to a V3 store, numbering them after the existing tasks.
+    Rows with status 'completed' go to the completed file. Rows duplicating
+    a task already in the store or imported before them (see dedupe.py) are
+    imported and counted ('warn') or skipped ('reject').
+    Returns the imported and the duplicate row counts.
+    """
+    files = {}
+    imported = found = 0
+    texts = None
+    if duplicates != 'allow':
+        texts = _existing_texts(tasks_file, complete_tasks_file)
+    try:
+        for row in rows:
+            if texts is not None:
+                text = normalize_text(row.get('task') or '')
+                if text in texts:
+                    found += 1
+                    if duplicates == 'reject':
+                        continue
+                texts.add(text)
+
+            status = 'completed' if row.get('status') == 'completed' else 'active'
+            if status not in files:
+                if status == 'active':
+                    files[status] = list(_append_rows(tasks_file, TASK_FIELDS))
+                else:
+                    files[status] = list(_append_rows(complete_tasks_file, COMPLETE_TASK_FIELDS))
+
+            entry = files[status]
+            entry[2] += 1
+            row = dict(row, task_id=entry[2])
+            if status == 'active':
+                row.setdefault('priority', 'medium')
+            entry[1].writerow(row)
+            imported += 1
+    finally:
+        for file, _, _ in files.values():
+            file.close()
+    return imported, found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('direction', choices=('export', 'import'))
+    parser.add_argument('--format', choices=FORMATS, default='jsonl')
+    parser.add_argument('--out', help='Export destination')
+    parser.add_argument('--in', dest='source_path', help='Import source')
+    parser.add_argument('--tasks-file', default='tasks.csv')
+    parser.add_argument('--complete-tasks-file', default='complete_tasks.csv')
+    parser.add_argument('--source', choices=('v3', 'v2'), default='v3', help='Store to export from')
+    parser.add_argument('--v2-dir', default='.', help='Directory holding the V2 tasks.txt / completed_tasks.txt')
+    parser.add_argument('--since', help="Only export rows changed since this 'YYYY-MM-DD HH:MM:SS' timestamp")
+    parser.add_argument('--watermark-file', help='Read --since from and save the new watermark to this file')
+    parser.add_argument('--delimiter', default=',')
+    parser.add_argument('--quotechar', default='"')
+    parser.add_argument('--quoting', choices=QUOTING, default='minimal')
+    parser.add_argument('--lineterminator', default='\r\n')
+    parser.add_argument('--duplicates', choices=DUPLICATE_POLICIES, default='warn',
+                        help='Imported tasks duplicating one in the store: import them, import and count them, or skip them')
+    args = parser.parse_args(argv)
+
+    dialect = {}
+    if args.format == 'csv':
+        dialect = {'delimiter': args.delimiter, 'quotechar': args.quotechar, 'quoting': QUOTING[args.quoting]}
+        if args.direction == 'export':
+            dialect['lineterminator'] = args.lineterminator.encode().decode('unicode_escape')
+
+    if args.direction == 'import':
+        if not args.source_path:
+            parser.error('import needs --in')
+        if journaled(args.tasks_file):
+            # Rows appended to the CSV files would never be read
+            parser.error(f'{args.tasks_file} is kept in the journal {journal_dir(args.tasks_file)}, '
+                         f"stop the daemon and run 'python journal.py release' first")
+        file, rows = open_reader(args.format, args.source_path, **dialect)
+        with file:
+            count, found = import_rows(rows, args.tasks_file, args.complete_tasks_file, duplicates=args.duplicates)
+        print(f'Imported {count} tasks into {args.tasks_file} / {args.complete_tasks_file}')
+        if found:
+            print(f"{found} duplicate tasks {'skipped' if args.duplicates == 'reject' else 'imported'}, "
+                  f"'python daemon.py dedupe' lists them")
+        return 0
+
+    if not args.out:
+        parser.error('export needs --out')
+
+    since = args.since
+    if args.watermark_file and not since and os.path.exists(args.watermark_file):
+        with open(args.watermark_file) as file:
+            since = file.read().strip() or None
+
+    if args.source == 'v2':
+        if since:
+            parser.error('V2 stores carry no timestamps, incremental export is not possible')
+        rows = iter_v2_rows(os.path.join(args.v2_dir, 'tasks.txt'), os.path.join(args.v2_dir, 'completed_tasks.txt'))
+    else:
+        rows = iter_store_rows(args.tasks_file, args.complete_tasks_file, since=since)
+
+    count, watermark = export_rows(rows, args.format, args.out, **dialect)
+    watermark = watermark or since or ''
+
+    if args.watermark_file and watermark:
+        with open(args.watermark_file, 'w') as file:
+            file.write(watermark + '\n')
+
+    print(f'Exported {count} tasks to {args.out}' + (f' (watermark {watermark})' if watermark else ''))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
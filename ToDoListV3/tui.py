@@ -0,0 +1,443 @@
+"""
+Full-screen task list on curses: python main.py --tui
+
+Only what changed reaches the terminal: every screen line remembers what it
+last showed and is only written again when that differs, and curses sends
+just the changed cells of the lines written. Lists of any size scroll
+virtually, only the rows on screen are ever formatted.
+
+Typing after '/' filters the list as you type, with the query syntax of the
+search menu. A search (IncrementalSearch) runs in slices of SEARCH_SLICE
+seconds: one slice per keystroke, usually enough to fill the screen, then
+more slices while no key is pending, so a keystroke is answered within a
+frame on any list. A query that narrows the previous one (more letters,
+another word) filters the previous matches instead of the whole list, and
+tag, project, priority and date terms start from the store's index when it
+is current.
+"""
+import curses
+import time
+from bisect import bisect_left
+from itertools import chain, islice
+
+from exceptions import InvalidDateError, QuerySyntaxError
+from query import parse_query
+
+
+# Seconds of searching per keystroke or idle turn, well inside a 60 Hz frame
+SEARCH_SLICE = 0.008
+# Rows tested between clock checks
+SEARCH_CHUNK = 2048
+# Terms the store's index answers without a scan
+INDEXED_FIELDS = ('tag', 'project', 'priority', 'created', 'completed')
+HELP = {
+    'browse': '/ search  a add  e edit  c complete  d delete  u undo  r redo  Tab active/completed  q quit',
+    'search': 'type to filter  Enter keep  Esc clear',
+}
+PRIORITY_KEYS = {'h': 'high', 'm': 'medium', 'l': 'low', '': 'medium'}
+
+
+def _implies(new, old):
+    # Every task matching `new` also matches `old`
+    if str(new) == str(old):
+        return True
+    return new.field == old.field == 'text' and new.op == old.op == '=' and old.value in new.value
+
+
+class IncrementalSearch:
+    """Positions in one list matching a query, found a slice at a time (see run())."""
+
+    __slots__ = ('text', 'view', 'generation', 'predicates', 'matches', 'done', '_source', '_test')
+
+    def __init__(self, store, view, text, previous=None):
+        predicates = parse_query(text)  # QuerySyntaxError while a term is unfinished
+        self.text = text
+        self.view = view
+        self.predicates = predicates
+        self.generation = store.generation
+        self.matches = []
+        self.done = False
+        tasks = store.tasks if view == 'active' else store.complete_tasks
+
+        if (previous is not None and previous.view == view and previous.generation == store.generation
+                and all(any(_implies(new, old) for new in predicates) for old in previous.predicates)):
+            # Narrower than the previous query: only its matches (and what it has not scanned) can match
+            self._source = chain(previous.matches, previous._source)
+        else:
+            self._source, predicates = self._candidates(store, view, tasks, predicates)
+
+        if predicates and all(p.field == 'text' and p.op == '=' for p in predicates):
+            words = [p.value for p in predicates]
+            self._test = lambda position: all(word in tasks[position]['task'].lower() for word in words)
+        else:
+            self._test = lambda position: all(p.matches(view, tasks[position]) for p in predicates)
+
+    def run(self, deadline, want=None):
+        """Scan until `want` matches are known, the list is done or the clock passes `deadline`."""
+        matches, test = self.matches, self._test
+        while not self.done and (want is None or len(matches) < want) and time.perf_counter() < deadline:
+            chunk = list(islice(self._source, SEARCH_CHUNK))
+            if not chunk:
+                self.done = True
+            matches.extend(filter(test, chunk))
+        return self
+
+    @staticmethod
+    def _candidates(store, view, tasks, predicates):
+        # (positions to test, predicates left to test them with); a current index narrows the positions
+        indexed = [p for p in predicates if p.field in INDEXED_FIELDS]
+        if not indexed or not store.indexed:
+            return iter(range(len(tasks))), predicates
+
+        index = store.index
+        best = min(indexed, key=index.estimate)
+        row_ids = index.lookup(best)
+        if best.field in ('created', 'completed'):
+            row_ids = sorted(row_ids)  # Date ranges come in date order
+        # Active tasks are the first rows of the index, completed ones follow
+        offset = 0 if view == 'active' else index.active_count
+        start, end = bisect_left(row_ids, offset), bisect_left(row_ids, offset + len(tasks))
+        positions = islice(row_ids, start, end) if not offset else (row_id - offset for row_id in
+                                                                    islice(row_ids, start, end))
+        return positions, [p for p in predicates if p is not best]
+
+
+class _Lines:
+    """The screen, written line by line and only where a line changed."""
+
+    __slots__ = ('window', '_shown')
+
+    def __init__(self, window):
+        self.window = window
+        # y -> (text, attribute) last written there
+        self._shown = {}
+
+    @property
+    def size(self):
+        return self.window.getmaxyx()
+
+    def put(self, y, text, attribute=0):
+        height, width = self.window.getmaxyx()
+        if y >= height:
+            return
+        # The bottom right cell cannot be written without scrolling
+        text = text[:width - 1].ljust(width - 1)
+        if self._shown.get(y) == (text, attribute):
+            return
+        self._shown[y] = (text, attribute)
+        try:
+            self.window.addstr(y, 0, text, attribute)
+        except curses.error:
+            pass  # Wide characters past the edge
+
+    def reset(self):
+        # Forget what is on screen, e.g. after a resize
+        self._shown.clear()
+        self.window.erase()
+
+    def show(self):
+        self.window.noutrefresh()
+        curses.doupdate()
+
+
+class TaskScreen:
+    """The full-screen list of one ToDoList, see the module docstring."""
+
+    __slots__ = ('_app', '_lines', '_colors', '_view', '_mode', '_query', '_search', '_error', '_cursor', '_top',
+                 '_message')
+
+    def __init__(self, app, window):
+        self._app = app
+        self._lines = _Lines(window)
+        self._colors = self._init_colors()
+        self._view = 'active'
+        self._mode = 'browse'
+        self._query = ''
+        self._search = None
+        # Why the query is not applied, while it does not parse
+        self._error = ''
+        self._cursor = 0
+        self._top = 0
+        self._message = ''
+        window.keypad(True)
+        curses.curs_set(0)
+        curses.set_escdelay(25)  # Esc is a key here, not the start of a sequence typed by hand
+
+    @property
+    def _store(self):
+        return self._app.store
+
+    @property
+    def _list(self):
+        return self._store.tasks if self._view == 'active' else self._store.complete_tasks
+
+    @property
+    def _page(self):
+        # Rows of tasks on screen: title, column header, query and help lines are not
+        return max(self._lines.size[0] - 4, 1)
+
+    def run(self):
+        window = self._lines.window
+        self.draw()
+        while True:
+            busy = self._search is not None and not self._search.done
+            # Between keystrokes an unfinished search carries on a slice at a time
+            window.timeout(0 if busy else -1)
+            try:
+                key = window.get_wch()
+            except curses.error:
+                self._search.run(time.perf_counter() + SEARCH_SLICE)
+                self.draw()
+                continue
+            if not self.press(key):
+                return
+
+    def press(self, key):
+        """Handle one key and draw the result; False once the user quits."""
+        self._message = ''
+        if key == curses.KEY_RESIZE:
+            self._lines.reset()
+        elif self._mode == 'search':
+            self._press_search(key)
+        elif key in ('q', '\x1b'):
+            return False
+        else:
+            self._press_browse(key)
+        self._refresh_search()
+        self.draw()
+        return True
+
+    def _press_search(self, key):
+        match key:
+            case '\n' | curses.KEY_ENTER:
+                self._mode = 'browse'
+            case '\x1b':
+                self._mode, self._query = 'browse', ''
+            case curses.KEY_BACKSPACE | '\x7f' | '\b':
+                self._query = self._query[:-1]
+            case str() if key.isprintable():
+                self._query += key
+            case _:
+                self._move(key)
+
+    def _press_browse(self, key):
+        match key:
+            case '/':
+                self._mode = 'search'
+            case '\t':
+                self._view = 'completed' if self._view == 'active' else 'active'
+                self._cursor = self._top = 0
+            case 'a':
+                self._add()
+            case 'e' if self._view == 'active':
+                self._edit()
+            case 'c' | ' ' if self._view == 'active':
+                self._complete()
+            case 'd' if self._view == 'active':
+                self._delete()
+            case 'u' | 'r':
+                oplog = self._app.oplog
+                entry = oplog.undo() if key == 'u' else oplog.redo()
+                if entry is None:
+                    self._message = 'Nothing to undo.' if key == 'u' else 'Nothing to redo.'
+                else:
+                    self._message = ('Undone: ' if key == 'u' else 'Redone: ') + oplog.describe(entry)
+            case _:
+                self._move(key)
+
+    def _move(self, key):
+        page = self._page
+        match key:
+            case curses.KEY_UP | 'k':
+                self._cursor -= 1
+            case curses.KEY_DOWN | 'j':
+                self._cursor += 1
+            case curses.KEY_PPAGE:
+                self._cursor -= page
+            case curses.KEY_NPAGE:
+                self._cursor += page
+            case curses.KEY_HOME | 'g':
+                self._cursor = 0
+            case curses.KEY_END | 'G':
+                if self._search is not None:
+                    self._search.run(float('inf'))  # The last match needs the whole list scanned
+                self._cursor = self._count() - 1
+
+    def _refresh_search(self):
+        # Follow the query and the lists; the screen only waits for the rows it shows
+        if not self._query:
+            self._search, self._error = None, ''
+        elif (self._search is None or self._search.text != self._query or self._search.view != self._view
+              or self._search.generation != self._store.generation):
+            try:
+                self._search = IncrementalSearch(self._store, self._view, self._query, self._search)
+                self._error = ''
+            except QuerySyntaxError as e:
+                self._error = e.message  # Keep showing the last matches while a term is typed
+        if self._search is not None:
+            wanted = max(self._top + self._page, self._cursor + 1)
+            self._search.run(time.perf_counter() + SEARCH_SLICE, want=wanted)
+
+    def _count(self):
+        # Rows known so far
+        return len(self._search.matches) if self._search is not None else len(self._list)
+
+    def _position(self):
+        # List position of the row under the cursor, None on an empty list
+        if not self._count():
+            return None
+        return self._search.matches[self._cursor] if self._search is not None else self._cursor
+
+    def draw(self):
+        lines, colors, page = self._lines, self._colors, self._page
+        tasks, count = self._list, self._count()
+        self._cursor = max(0, min(self._cursor, count - 1))
+        self._top = max(0, min(self._top, self._cursor), self._cursor - page + 1)
+
+        total = len(tasks)
+        if self._search is None:
+            shown = f'{total} tasks'
+        else:
+            shown = f"{count}{'' if self._search.done else '+'} of {total} tasks match"
+        title = f" To-Do List — {self._app.namespace or 'default'} — {self._view} ({shown})"
+        lines.put(0, title, colors['title'])
+        date_column = 'Due' if self._view == 'active' else 'Completed'
+        lines.put(1, f"{'#':>7}  {'Priority':<9}{date_column:<21}Task", colors['header'])
+
+        for row in range(page):
+            index = self._top + row
+            if index >= count:
+                lines.put(2 + row, '')
+                continue
+            position = self._search.matches[index] if self._search is not None else index
+            lines.put(2 + row, self._format(tasks[position], position),
+                      colors['cursor'] if index == self._cursor else colors.get(tasks[position].get('priority'), 0))
+
+        query = f'/{self._query}' + ('_' if self._mode == 'search' else '')
+        if self._error:
+            lines.put(page + 2, f'{query}  ({self._error})', colors['error'])
+        else:
+            lines.put(page + 2, query if self._query or self._mode == 'search' else '', colors['query'])
+        lines.put(page + 3, self._message or HELP[self._mode], colors['help'])
+        lines.show()
+
+    def _format(self, task, position):
+        date = task.get('due_at') if self._view == 'active' else task.get('completed_at')
+        # Task text followed by its #tags and @project, like the menu's listing
+        label = task['task'] + ''.join(f' #{tag}' for tag in (task.get('tags') or '').split())
+        label += f" @{task['project']}" if task.get('project') else ''
+        return f"{position + 1:>7}  {task.get('priority') or '':<9}{date or '-':<21}{label}"
+
+    def _prompt(self, label, text='', complete=False):
+        """A line typed at the bottom of the screen, None on Esc; with `complete` Tab completes task texts."""
+        lines = self._lines
+        y = self._page + 3
+        curses.curs_set(1)
+        try:
+            while True:
+                lines.put(y, f'{label}{text}', self._colors['query'])
+                lines.window.move(y, min(len(label) + len(text), lines.size[1] - 2))
+                lines.show()
+                key = lines.window.get_wch()
+                match key:
+                    case '\n' | curses.KEY_ENTER:
+                        return text.strip()
+                    case '\x1b':
+                        return None
+                    case curses.KEY_BACKSPACE | '\x7f' | '\b':
+                        text = text[:-1]
+                    case '\t' if complete:
+                        suggestions = self._store.completions.suggest(text, 1)
+                        text = suggestions[0] if suggestions else text
+                    case curses.KEY_RESIZE:
+                        lines.reset()
+                    case str() if key.isprintable():
+                        text += key
+        finally:
+            curses.curs_set(0)
+
+    def _confirm(self, question):
+        return (self._prompt(f'{question} (y/n): ') or '').lower() in ('y', 'yes')
+
+    def _allowed_duplicate(self, text, ignore=None):
+        duplicate = self._store.duplicates.check(text, ignore)
+        if duplicate is None:
+            return True
+        from dedupe import describe_duplicate
+        return self._confirm(f'Duplicates {describe_duplicate(duplicate)}. Save anyway?')
+
+    def _add(self):
+        text = self._prompt('Task (Tab completes): ', complete=True)
+        if not text or not self._allowed_duplicate(text):
+            self._message = 'Task not added.'
+            return
+        priority = PRIORITY_KEYS.get((self._prompt('Priority h/m/l (Enter: medium): ') or '')[:1].lower())
+        if priority is None:
+            self._message = 'Invalid priority, task not added.'
+            return
+        due = self._prompt('Due (e.g. tomorrow, +3d; Enter for none): ') or ''
+        try:
+            if due:
+                from scheduler import parse_due
+                due = parse_due(due)
+        except InvalidDateError as e:
+            self._message = e.message
+            return
+        self._store.add(text, priority, due_at=due)
+        self._message = f"Added '{text}'."
+        if self._search is None and self._view == 'active':
+            self._cursor = len(self._store.tasks) - 1
+
+    def _edit(self):
+        position = self._position()
+        if position is None:
+            return
+        task = self._store.tasks[position]
+        text = self._prompt('Task (Tab completes): ', task['task'], complete=True)
+        if not text or text == task['task'] or not self._allowed_duplicate(text, ignore=task):
+            self._message = 'Task not changed.'
+            return
+        self._store.edit(position, text=text)
+        self._message = f"Edited '{text}'."
+
+    def _complete(self):
+        position = self._position()
+        if position is None:
+            return
+        from recurrence import complete_tasks
+        completed, = complete_tasks(self._store, [position])
+        following = ', next occurrence added' if completed.get('recurrence') else ''
+        self._message = f"Completed '{completed['task']}'{following}."
+
+    def _delete(self):
+        position = self._position()
+        if position is None:
+            return
+        task = self._store.tasks[position]
+        if self._confirm(f"Delete '{task['task']}'?"):
+            self._store.delete(position)
+            self._message = f"Deleted '{task['task']}'."
+
+    @staticmethod
+    def _init_colors():
+        colors = {'title': curses.A_REVERSE | curses.A_BOLD, 'header': curses.A_BOLD, 'cursor': curses.A_REVERSE,
+                  'query': 0, 'help': curses.A_DIM, 'error': curses.A_BOLD}
+        if not curses.has_colors():
+            return colors
+        curses.start_color()
+        curses.use_default_colors()
+        for number, (name, color) in enumerate((('high', curses.COLOR_RED), ('medium', curses.COLOR_YELLOW),
+                                                ('low', curses.COLOR_GREEN), ('header', curses.COLOR_CYAN),
+                                                ('query', curses.COLOR_MAGENTA)), start=1):
+            curses.init_pair(number, color, -1)
+            colors[name] = curses.color_pair(number) | colors.get(name, 0)
+        colors['error'] = curses.color_pair(1) | curses.A_BOLD
+        return colors
+
+
+def run(app):
+    """Show `app` (a ToDoList) full screen until the user quits, then save what is pending."""
+    try:
+        curses.wrapper(lambda window: TaskScreen(app, window).run())
+    finally:
+        app.store.sync()
@@ -0,0 +1,182 @@
+"""
+Saved searches kept as materialized views.
+
+A saved search is a named query (see query.py), e.g.
+
+    stale-high     priority:high status:active created<-7d
+    done-this-week status:completed completed>=week
+
+Definitions live in `<tasks file stem>.searches.json`. Their result sets are
+built once, when a store's `views` are first used, and then kept current
+from the store's change events, so opening a view costs O(result size)
+rather than a scan of both lists. Views using relative dates are rebuilt
+once a day, when 'today' moves on.
+"""
+import datetime
+import json
+import os
+
+from exceptions import QuerySyntaxError
+from namespaces import NAME_PATTERN
+from query import parse_query
+
+
+def searches_file(tasks_file):
+    return os.path.splitext(tasks_file)[0] + '.searches.json'
+
+
+class SavedView:
+    """One saved search and its current results."""
+
+    __slots__ = ('name', 'query', '_predicates', '_day', '_active', '_completed')
+
+    def __init__(self, name, query):
+        self.name = name
+        self.query = query
+        self._predicates = None
+        self._day = None
+        # id(task) -> task; completed ones stay in archive order
+        self._active = {}
+        self._completed = {}
+
+    def __len__(self):
+        return len(self._active) + len(self._completed)
+
+    @property
+    def relative(self):
+        return any(predicate.relative for predicate in self._predicates)
+
+    def build(self, tasks, complete_tasks):
+        self._predicates = parse_query(self.query)
+        self._day = datetime.date.today()
+        self._active = {id(task): task for task in tasks if self.matches('active', task)}
+        self._completed = {id(task): task for task in complete_tasks if self.matches('completed', task)}
+
+    def stale(self):
+        # Relative dates resolved on another day
+        return self._day != datetime.date.today() and self.relative
+
+    def matches(self, status, task):
+        return all(predicate.matches(status, task) for predicate in self._predicates)
+
+    def results(self):
+        # (status, task) pairs in list order, like a query's results
+        active = sorted(self._active.values(), key=lambda task: int(task['task_id']))
+        return [('active', task) for task in active] + [('completed', task) for task in self._completed.values()]
+
+    def update(self, status, task):
+        rows = self._active if status == 'active' else self._completed
+        if self.matches(status, task):
+            rows[id(task)] = task
+        else:
+            rows.pop(id(task), None)
+
+    def discard(self, status, task):
+        (self._active if status == 'active' else self._completed).pop(id(task), None)
+
+    def clear_active(self):
+        self._active.clear()
+
+
+class SavedSearches:
+    """
+    The saved searches of one store, maintained incrementally.
+
+    Like the scheduler it listens to the store's change events: an add or
+    edit re-checks the one task, a delete drops it, a complete moves it from
+    the active to the completed side of every view it still matches.
+    """
+
+    __slots__ = ('_store', '_path', '_views')
+
+    def __init__(self, store):
+        self._store = store
+        self._path = searches_file(store.tasks_file)
+        self._views = {}
+
+        definitions = {}
+        if os.path.exists(self._path):
+            with open(self._path) as file:
+                definitions = json.load(file)
+        for name, query in definitions.items():
+            self._views[name] = SavedView(name, query)
+        self._rebuild()
+        store.subscribe(self._apply)
+
+    def __len__(self):
+        # Rows held, for the memory budget
+        return sum(len(view) for view in self._views.values())
+
+    def __contains__(self, name):
+        return name in self._views
+
+    def names(self):
+        return sorted(self._views)
+
+    def view(self, name):
+        return self._views[name]
+
+    def counts(self):
+        # name -> (query, number of results)
+        return {name: (view.query, len(view)) for name, view in sorted(self._views.items())}
+
+    def open(self, name):
+        """The results of a saved search, see SavedView.results()."""
+        view = self._views[name]
+        if view.stale():
+            view.build(self._store.tasks, self._store.complete_tasks)
+        return view.results()
+
+    def save(self, name, query):
+        # Add or replace a saved search; raises QuerySyntaxError for a bad name or query
+        if not NAME_PATTERN.match(name):
+            raise QuerySyntaxError(message=f"Invalid name '{name}', use letters, digits, '.', '_' or '-'.")
+        view = SavedView(name, query.strip())
+        view.build(self._store.tasks, self._store.complete_tasks)
+        self._views[name] = view
+        self._write()
+        return view
+
+    def remove(self, name):
+        del self._views[name]
+        self._write()
+
+    def _write(self):
+        temporary = self._path + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({name: view.query for name, view in sorted(self._views.items())}, file, indent=2)
+        os.replace(temporary, self._path)
+
+    def _rebuild(self):
+        tasks, complete_tasks = self._store.tasks, self._store.complete_tasks
+        for view in self._views.values():
+            view.build(tasks, complete_tasks)
+
+    def _apply(self, event):
+        match event['op']:
+            case 'batch':
+                for child in event['events']:
+                    self._apply(child)
+            case 'add' | 'edit':
+                for view in self._views.values():
+                    view.update('active', event['task'])
+            case 'uncomplete':
+                for view in self._views.values():
+                    view.discard('completed', event['task'])
+                    view.update('active', event['task'])
+            case 'complete':
+                for view in self._views.values():
+                    view.discard('active', event['task'])
+                    view.update('completed', event['task'])
+            case 'delete':
+                for view in self._views.values():
+                    view.discard('active', event['task'])
+            case 'clear':
+                for view in self._views.values():
+                    view.clear_active()
+            case 'restore':
+                for task in event['tasks']:
+                    for view in self._views.values():
+                        view.update('active', task)
+            case 'reload':
+                self._rebuild()